@@ -0,0 +1,357 @@
+# 檔案路徑: app/cache.py
+
+"""
+兩層式共享快取
+
+各 worker 行程內的快取在多節點部署時是 N 份各自冷啟動的快取。這裡提供統一的快取介面：
+    - 第一層：行程內 LRU（含到期時間），命中時不需網路往返
+    - 第二層：Redis 通訊協定的共享快取（設定 CACHE_URL 時啟用），所有節點共用
+
+值以精簡的二進位格式序列化（見 dumps / loads），支援 None、bool、int、float、str、bytes、
+list / tuple 與 dict，較大的內容以 zlib 壓縮。
+
+鍵的格式固定為 "{CACHE_KEY_PREFIX}:{namespace}:{generation}:{key}"：
+    - namespace 區分用途，例如 usda_nutrition、classification
+    - generation 為命名空間的世代，clear() 遞增後舊的鍵不再被讀取（由到期時間自然淘汰），
+      各節點最多在 CACHE_GENERATION_TTL 秒後看到新世代
+    - 過長的鍵以 SHA-1 雜湊縮短
+
+共享快取無法連線時不影響功能：該次查詢視為未命中，並在 CACHE_REMOTE_RETRY_SECONDS 秒內只使用第一層。
+
+設定：
+    CACHE_URL: 共享快取位址，例如 redis://:password@cache:6379/0（未設定時只使用行程內快取）
+    CACHE_KEY_PREFIX: 鍵的前綴（預設 health_assistant）
+    CACHE_LOCAL_MAXSIZE: 每個命名空間的行程內快取筆數（預設 1024）
+    CACHE_DEFAULT_TTL: 預設到期秒數（預設 3600）
+    CACHE_TIMEOUT_SECONDS: 共享快取的連線與讀取逾時（預設 0.2）
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .metrics import record_cache
+from .resp import RespClient
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "health_assistant")
+CACHE_LOCAL_MAXSIZE = int(os.getenv("CACHE_LOCAL_MAXSIZE", "1024"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "3600"))
+CACHE_TIMEOUT_SECONDS = float(os.getenv("CACHE_TIMEOUT_SECONDS", "0.2"))
+CACHE_REMOTE_RETRY_SECONDS = float(os.getenv("CACHE_REMOTE_RETRY_SECONDS", "5"))
+CACHE_GENERATION_TTL = float(os.getenv("CACHE_GENERATION_TTL", "1"))
+
+# 鍵超過此長度時以雜湊縮短
+MAX_KEY_LENGTH = 128
+
+
+# --- 序列化 ---
+
+_FORMAT_VERSION = 1
+_FLAG_ZLIB = 1
+# 超過此大小才嘗試壓縮
+_COMPRESS_THRESHOLD = 512
+_DOUBLE = struct.Struct(">d")
+
+
+def _write_varint(out: bytearray, value: int):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _encode(value: Any, out: bytearray):
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        out += b"i"
+        _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))  # zigzag
+    elif isinstance(value, float):
+        out += b"d" + _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out += b"s"
+        _write_varint(out, len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        out += b"b"
+        _write_varint(out, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out += b"l"
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out += b"m"
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    elif hasattr(value, "item"):
+        # numpy 純量
+        _encode(value.item(), out)
+    else:
+        raise TypeError(f"無法序列化 {type(value).__name__}")
+
+
+def _decode(data: bytes, pos: int) -> Tuple[Any, int]:
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b"N":
+        return None, pos
+    if tag == b"T":
+        return True, pos
+    if tag == b"F":
+        return False, pos
+    if tag == b"i":
+        raw, pos = _read_varint(data, pos)
+        return (raw >> 1) if not raw & 1 else -((raw + 1) >> 1), pos
+    if tag == b"d":
+        return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+    if tag in (b"s", b"b"):
+        length, pos = _read_varint(data, pos)
+        chunk = data[pos:pos + length]
+        return (chunk.decode("utf-8") if tag == b"s" else bytes(chunk)), pos + length
+    if tag == b"l":
+        count, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == b"m":
+        count, pos = _read_varint(data, pos)
+        mapping = {}
+        for _ in range(count):
+            key, pos = _decode(data, pos)
+            mapping[key], pos = _decode(data, pos)
+        return mapping, pos
+    raise ValueError(f"無法辨識的型別標記 {tag!r}")
+
+
+def dumps(value: Any) -> bytes:
+    """序列化為精簡的二進位格式：版本、旗標，接著是（可能壓縮的）內容"""
+    body = bytearray()
+    _encode(value, body)
+    flags = 0
+    if len(body) > _COMPRESS_THRESHOLD:
+        compressed = zlib.compress(bytes(body), 6)
+        if len(compressed) < len(body):
+            body, flags = compressed, _FLAG_ZLIB
+    return bytes((_FORMAT_VERSION, flags)) + bytes(body)
+
+
+def loads(data: bytes) -> Any:
+    if len(data) < 3 or data[0] != _FORMAT_VERSION:
+        raise ValueError("不支援的快取格式版本")
+    body = zlib.decompress(data[2:]) if data[1] & _FLAG_ZLIB else data[2:]
+    value, _ = _decode(body, 0)
+    return value
+
+
+# --- 第一層：行程內 LRU ---
+
+class LRUCache:
+    """有筆數上限與到期時間的 LRU 快取，可在多執行緒中共用"""
+
+    def __init__(self, maxsize: int = CACHE_LOCAL_MAXSIZE):
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """回傳 (是否命中, 值)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            value, expires_at = item
+            if expires_at and time.monotonic() >= expires_at:
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# --- 兩層式快取 ---
+
+class TieredCache:
+    """一個命名空間的快取：先查行程內 LRU，再查共享快取，共享快取命中時回填第一層"""
+
+    def __init__(self, namespace: str, remote: Optional[RespClient] = None, ttl: float = CACHE_DEFAULT_TTL,
+                 local_maxsize: int = CACHE_LOCAL_MAXSIZE, key_prefix: str = CACHE_KEY_PREFIX):
+        self.namespace = namespace
+        self.remote = remote
+        self.ttl = ttl
+        self.local = LRUCache(local_maxsize)
+        self._prefix = f"{key_prefix}:{namespace}"
+        self._generation = 0
+        self._generation_checked = 0.0
+        self._remote_down_until = 0.0
+        self._lock = threading.Lock()
+
+    # 共享快取的存取：失敗時暫停使用，不影響呼叫端
+
+    def _remote_call(self, func: Callable, *args) -> Tuple[bool, Any]:
+        if self.remote is None or time.monotonic() < self._remote_down_until:
+            return False, None
+        try:
+            return True, func(*args)
+        except Exception as e:
+            self._remote_down_until = time.monotonic() + CACHE_REMOTE_RETRY_SECONDS
+            logger.warning("共享快取 %s 無法使用，%s 秒內只使用行程內快取: %s",
+                           self.namespace, CACHE_REMOTE_RETRY_SECONDS, e)
+            return False, None
+
+    def _current_generation(self) -> int:
+        if self.remote is None or time.monotonic() - self._generation_checked < CACHE_GENERATION_TTL:
+            return self._generation
+        ok, value = self._remote_call(self.remote.get, f"{self._prefix}:generation")
+        with self._lock:
+            if ok:
+                self._generation = int(value or 0)
+            self._generation_checked = time.monotonic()
+            return self._generation
+
+    def full_key(self, key: str) -> str:
+        if len(key) > MAX_KEY_LENGTH:
+            key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"{self._prefix}:{self._current_generation()}:{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        full_key = self.full_key(key)
+        hit, value = self.local.get(full_key)
+        record_cache(f"{self.namespace}_local", hit)
+        if hit:
+            return value
+        if self.remote is None:
+            return default
+
+        ok, data = self._remote_call(self.remote.get, full_key)
+        hit = ok and data is not None
+        record_cache(f"{self.namespace}_remote", hit)
+        if not hit:
+            return default
+        try:
+            value = loads(data)
+        except Exception as e:
+            logger.warning("快取 %s 的值無法解析，視為未命中: %s", full_key, e)
+            return default
+        self.local.set(full_key, value, self.ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        full_key = self.full_key(key)
+        self.local.set(full_key, value, ttl)
+        if self.remote is not None:
+            self._remote_call(self.remote.set, full_key, dumps(value), ttl)
+
+    def delete(self, key: str):
+        full_key = self.full_key(key)
+        self.local.delete(full_key)
+        if self.remote is not None:
+            self._remote_call(self.remote.delete, full_key)
+
+    def get_or_set(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """快取未命中時呼叫 compute() 並存入結果（None 不存入）"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def clear(self):
+        """使整個命名空間失效：遞增世代，所有節點在 CACHE_GENERATION_TTL 秒內改用新的鍵"""
+        with self._lock:
+            ok, generation = (self._remote_call(self.remote.incr, f"{self._prefix}:generation")
+                              if self.remote is not None else (False, None))
+            self._generation = generation if ok else self._generation + 1
+            self._generation_checked = time.monotonic()
+        self.local.clear()
+
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+_remote_client: Optional[RespClient] = None
+
+
+def _get_remote() -> Optional[RespClient]:
+    global _remote_client
+    if CACHE_URL and _remote_client is None:
+        _remote_client = RespClient.from_url(CACHE_URL, timeout=CACHE_TIMEOUT_SECONDS)
+        logger.info("共享快取: %s", CACHE_URL.split("@")[-1])
+    return _remote_client
+
+
+def get_cache(namespace: str, ttl: float = CACHE_DEFAULT_TTL, local_maxsize: int = CACHE_LOCAL_MAXSIZE) -> TieredCache:
+    """取得命名空間的快取；同一個命名空間回傳同一個實例，所有命名空間共用一個共享快取連線池"""
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = TieredCache(namespace, _get_remote(), ttl=ttl, local_maxsize=local_maxsize)
+    return cache
+
+
+def reset_caches():
+    """清除已建立的快取實例（設定變更或測試時使用）"""
+    global _remote_client
+    with _caches_lock:
+        _caches.clear()
+        if _remote_client is not None:
+            _remote_client.close()
+        _remote_client = None
+
+
+__all__ = ["dumps", "loads", "LRUCache", "TieredCache", "get_cache", "reset_caches"]
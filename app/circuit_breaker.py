@@ -0,0 +1,121 @@
+# 檔案路徑: app/circuit_breaker.py
+
+"""
+外部服務的斷路器
+
+外部服務（例如 USDA API）連續失敗時，繼續呼叫只會讓每個請求都等到逾時或被限流。
+斷路器有三種狀態：
+    - closed：正常呼叫，連續失敗達 failure_threshold 次即轉為 open
+    - open：不呼叫外部服務，呼叫端直接改用本地資料；經過 reset_timeout 秒後轉為 half_open
+    - half_open：放行最多 half_open_max_calls 個試探請求，成功即恢復 closed，失敗則重新 open
+
+用法:
+    if not breaker.allow():
+        return local_fallback()
+    try:
+        result = call_remote()
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .metrics import CIRCUIT_BREAKER_EVENTS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """連續失敗後暫停呼叫外部服務，並以試探請求判斷是否恢復"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._last_error: Optional[str] = None
+        self._short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        logger.warning("斷路器 %s: %s → %s", self.name, self._state, state)
+        self._state = state
+        CIRCUIT_BREAKER_EVENTS.inc(breaker=self.name, event=state)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+
+    def allow(self) -> bool:
+        """是否可以呼叫外部服務；False 時呼叫端應直接改用本地資料"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self._short_circuited += 1
+        CIRCUIT_BREAKER_EVENTS.inc(breaker=self.name, event="short_circuit")
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._transition(CLOSED)
+
+    def record_failure(self, error: Any = None):
+        with self._lock:
+            self._failures += 1
+            if error is not None:
+                self._last_error = str(error)
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def reset(self):
+        """手動恢復為 closed"""
+        with self._lock:
+            self._failures = 0
+            self._transition(CLOSED)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """供健康檢查使用的狀態"""
+        with self._lock:
+            state = self._current_state()
+            retry_in = self.reset_timeout - (time.monotonic() - self._opened_at) if state == OPEN else 0.0
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_seconds": round(max(0.0, retry_in), 1),
+                "short_circuited": self._short_circuited,
+                "last_error": self._last_error,
+            }
+
+
+__all__ = ["CircuitBreaker", "CLOSED", "OPEN", "HALF_OPEN"]
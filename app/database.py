@@ -3,6 +3,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
+from .metrics import instrument_db_writes
+
 # 確保資料庫目錄存在
 DB_DIR = "/tmp/health_assistant_data"
 os.makedirs(DB_DIR, exist_ok=True)
@@ -16,6 +18,9 @@ engine = create_engine(
     connect_args={"check_same_thread": False}  # SQLite 特定配置
 )
 
+# 記錄寫入語句的耗時，輸出於 /metrics
+instrument_db_writes(engine)
+
 # 創建 SessionLocal 類
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
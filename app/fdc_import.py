@@ -0,0 +1,276 @@
+# 檔案路徑: app/fdc_import.py
+
+"""
+USDA FoodData Central 大量資料匯入
+
+將 FDC 的 CSV 資料包（解壓後的目錄或原始 zip）或 JSON 資料檔匯入本地資料庫：
+    - nutrition: 每個食物一列，常用營養素（熱量、蛋白質...）寫入既有欄位
+    - food_nutrients: 每個食物的完整營養素
+匯入後 /api/nutrition/lookup 直接以本地全文檢索查詢，不必呼叫 USDA API。
+
+檔案以串流方式逐列讀取並分批寫入，記憶體用量與檔案大小無關。
+JSON 資料檔需要安裝 ijson。
+
+用法:
+    python -m app.fdc_import /path/to/FoodData_Central_csv_2024-10-31.zip
+    python -m app.fdc_import /path/to/FoodData_Central_csv_2024-10-31 --data-types foundation_food,sr_legacy_food
+    python -m app.fdc_import /path/to/FoodData_Central_foundation_food_json.json
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import re
+import sys
+import time
+import zipfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import text
+
+from .database import engine
+from .services.nutrition_search_service import ensure_search_index, rebuild_search_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.getenv("FDC_IMPORT_BATCH_SIZE", "5000"))
+
+# nutrition 表的欄位對應的 FDC nutrient_nbr，依優先順序排列
+# 熱量：208 = Energy (kcal)，957/958 = Atwater 係數計算的熱量（Foundation Foods 使用）
+NUTRIENT_COLUMNS = {
+    "calories": ("208", "958", "957"),
+    "protein": ("203",),
+    "fat": ("204",),
+    "carbs": ("205",),
+    "fiber": ("291",),
+    "sugar": ("269", "269.3"),
+    "sodium": ("307",),
+}
+
+# JSON 資料檔最外層的陣列名稱
+JSON_ROOT_KEYS = ("FoundationFoods", "SRLegacyFoods", "SurveyFoods", "BrandedFoods")
+
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+def _insert_food_sql(dialect: str) -> str:
+    # 食物名稱重複時保留第一筆（nutrition.food_name 為唯一值）
+    columns = "(food_name, fdc_id, data_type) VALUES (:food_name, :fdc_id, :data_type)"
+    if dialect == "sqlite":
+        return f"INSERT OR IGNORE INTO nutrition {columns}"
+    return f"INSERT INTO nutrition {columns} ON CONFLICT DO NOTHING"
+
+
+# 透過 fdc_id 對應 nutrition.id；名稱重複而未匯入的食物自然被略過
+_INSERT_NUTRIENT_SQL = (
+    "INSERT INTO food_nutrients (nutrition_id, nutrient_number, name, unit_name, amount) "
+    "SELECT n.id, :number, :name, :unit_name, :amount FROM nutrition n WHERE n.fdc_id = :fdc_id"
+)
+
+
+class FdcImporter:
+    """分批將 FDC 資料寫入資料庫"""
+
+    def __init__(self, bind=None, batch_size: int = DEFAULT_BATCH_SIZE, data_types: Optional[Set[str]] = None):
+        self.bind = bind or engine
+        self.batch_size = max(1, batch_size)
+        self.data_types = data_types
+        self.food_count = 0
+        self.nutrient_count = 0
+        self._insert_food = text(_insert_food_sql(self.bind.dialect.name))
+        self._insert_nutrient = text(_INSERT_NUTRIENT_SQL)
+
+    def import_path(self, path: str) -> Dict[str, Any]:
+        """匯入 CSV 目錄、CSV zip 或 JSON 資料檔，回傳匯入統計"""
+        start = time.perf_counter()
+        ensure_search_index(self.bind)
+        with self.bind.connect() as conn:
+            # 重新匯入時以新資料取代舊的 FDC 營養素
+            conn.execute(text(
+                "DELETE FROM food_nutrients WHERE nutrition_id IN (SELECT id FROM nutrition WHERE fdc_id IS NOT NULL)"
+            ))
+            conn.commit()
+            if path.lower().endswith(".json"):
+                self._import_json(conn, path)
+            else:
+                self._import_csv(conn, path)
+            self._fill_nutrition_columns(conn)
+        rebuild_search_index(self.bind)
+
+        stats = {
+            "foods": self.food_count,
+            "nutrients": self.nutrient_count,
+            "seconds": round(time.perf_counter() - start, 1),
+        }
+        logger.info("FDC 匯入完成: %s", stats)
+        return stats
+
+    # --- CSV 資料包 ---
+
+    def _import_csv(self, conn, path: str):
+        with _open_member(path, "nutrient.csv") as f:
+            nutrients = {
+                row["id"]: {"number": row["nutrient_nbr"], "name": row["name"], "unit_name": row["unit_name"]}
+                for row in csv.DictReader(f)
+            }
+
+        with _open_member(path, "food.csv") as f:
+            foods = (
+                {"food_name": row["description"].strip(), "fdc_id": int(row["fdc_id"]), "data_type": row["data_type"]}
+                for row in csv.DictReader(f)
+                if row["description"].strip() and self._wanted(row["data_type"])
+            )
+            for batch in _batched(foods, self.batch_size):
+                self._write(conn, self._insert_food, batch)
+                self.food_count += len(batch)
+                if self.food_count % (self.batch_size * 20) < self.batch_size:
+                    logger.info("已處理 %s 筆食物", self.food_count)
+
+        with _open_member(path, "food_nutrient.csv") as f:
+            rows = (
+                {"fdc_id": int(row["fdc_id"]), "amount": float(row["amount"]), **nutrients[row["nutrient_id"]]}
+                for row in csv.DictReader(f)
+                if row["amount"] and row["nutrient_id"] in nutrients
+            )
+            for batch in _batched(rows, self.batch_size):
+                self._write(conn, self._insert_nutrient, batch)
+                self.nutrient_count += len(batch)
+                if self.nutrient_count % (self.batch_size * 100) < self.batch_size:
+                    logger.info("已處理 %s 筆營養素", self.nutrient_count)
+
+    # --- JSON 資料檔 ---
+
+    def _import_json(self, conn, path: str):
+        try:
+            import ijson
+        except ImportError:
+            raise RuntimeError("匯入 FDC JSON 資料檔需要 ijson 套件：pip install ijson")
+
+        with open(path, "rb") as f:
+            root_key = _detect_json_root(f.read(4096))
+            f.seek(0)
+            foods: List[Dict[str, Any]] = []
+            nutrients: List[Dict[str, Any]] = []
+            for food in ijson.items(f, f"{root_key}.item"):
+                description = (food.get("description") or "").strip()
+                data_type = _normalize_data_type(food.get("dataType", ""))
+                if not description or not self._wanted(data_type):
+                    continue
+                fdc_id = int(food["fdcId"])
+                foods.append({"food_name": description, "fdc_id": fdc_id, "data_type": data_type})
+                for item in food.get("foodNutrients", []):
+                    nutrient = item.get("nutrient") or {}
+                    if item.get("amount") is None or not nutrient.get("number"):
+                        continue
+                    nutrients.append({
+                        "fdc_id": fdc_id, "amount": float(item["amount"]), "number": nutrient["number"],
+                        "name": nutrient.get("name"), "unit_name": nutrient.get("unitName"),
+                    })
+                if len(foods) >= self.batch_size:
+                    self._flush_json(conn, foods, nutrients)
+            self._flush_json(conn, foods, nutrients)
+
+    def _flush_json(self, conn, foods: List[Dict[str, Any]], nutrients: List[Dict[str, Any]]):
+        # 營養素依 fdc_id 對應，必須在食物寫入之後
+        if foods:
+            self._write(conn, self._insert_food, foods)
+            self.food_count += len(foods)
+        for start in range(0, len(nutrients), self.batch_size):
+            self._write(conn, self._insert_nutrient, nutrients[start:start + self.batch_size])
+        self.nutrient_count += len(nutrients)
+        foods.clear()
+        nutrients.clear()
+
+    # --- 共用 ---
+
+    def _wanted(self, data_type: str) -> bool:
+        return self.data_types is None or data_type in self.data_types
+
+    @staticmethod
+    def _write(conn, statement, batch: List[Dict[str, Any]]):
+        conn.execute(statement, batch)
+        conn.commit()
+
+    def _fill_nutrition_columns(self, conn):
+        """將常用營養素從 food_nutrients 填回 nutrition 的欄位"""
+        assignments = []
+        for column, numbers in NUTRIENT_COLUMNS.items():
+            lookups = [
+                "(SELECT fn.amount FROM food_nutrients fn "
+                f"WHERE fn.nutrition_id = nutrition.id AND fn.nutrient_number = '{number}' LIMIT 1)"
+                for number in numbers
+            ]
+            assignments.append(f"{column} = COALESCE({', '.join(lookups)}, 0)")
+        conn.execute(text(f"UPDATE nutrition SET {', '.join(assignments)} WHERE fdc_id IS NOT NULL"))
+        conn.commit()
+
+
+def _batched(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def _open_member(path: str, name: str):
+    """開啟資料包中的 CSV，path 可為解壓後的目錄或 zip 檔"""
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            if name in files:
+                with open(os.path.join(root, name), newline="", encoding="utf-8") as f:
+                    yield f
+                return
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if os.path.basename(member) == name:
+                    with archive.open(member) as raw:
+                        yield io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                    return
+    raise FileNotFoundError(f"在 {path} 中找不到 {name}")
+
+
+def _detect_json_root(head: bytes) -> str:
+    match = re.search(rb'"(\w+)"\s*:\s*\[', head)
+    if not match or match.group(1).decode() not in JSON_ROOT_KEYS:
+        raise ValueError(f"無法辨識的 FDC JSON 格式，最外層應為 {JSON_ROOT_KEYS} 之一")
+    return match.group(1).decode()
+
+
+def _normalize_data_type(data_type: str) -> str:
+    """JSON 的 dataType（例如 "Foundation"、"SR Legacy"）轉為 CSV 的 data_type 格式"""
+    normalized = re.sub(r"\W+", "_", data_type.strip().lower()).strip("_")
+    return normalized if normalized.endswith("_food") else f"{normalized}_food"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .logging_config import configure_logging
+
+    parser = argparse.ArgumentParser(description="匯入 USDA FoodData Central 資料")
+    parser.add_argument("path", help="CSV 資料包目錄、zip 檔或 JSON 資料檔")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批寫入筆數")
+    parser.add_argument("--data-types", default=None,
+                        help="只匯入指定資料類型，逗號分隔，例如 foundation_food,sr_legacy_food")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    data_types = {t.strip() for t in args.data_types.split(",") if t.strip()} if args.data_types else None
+    FdcImporter(batch_size=args.batch_size, data_types=data_types).import_path(args.path)
+
+    # 本地資料更新後，重新解析分類標籤對應的營養資料
+    from .services.label_nutrition_service import build_label_mapping
+
+    build_label_mapping()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
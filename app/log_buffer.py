@@ -0,0 +1,130 @@
+# 檔案路徑: app/log_buffer.py
+
+"""
+記憶體內的日誌環形緩衝區
+
+保留最近 N 筆結構化日誌，供 /api/logs 查詢；超過容量時自動丟棄最舊的紀錄。
+每筆紀錄有遞增的序號 (seq)，客戶端帶上次回應的 next_cursor 即可只取得新增的日誌。
+
+設定：
+    LOG_BUFFER_SIZE: 緩衝區保留的紀錄數（預設 2000）
+"""
+
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "2000"))
+
+
+class RingBufferHandler(logging.Handler):
+    """將日誌紀錄保存在固定大小環形緩衝區的 logging handler"""
+
+    def __init__(self, capacity: int = LOG_BUFFER_SIZE, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.capacity = max(1, capacity)
+        self._records: deque = deque(maxlen=self.capacity)
+        self._seq = itertools.count(1)
+        self._buffer_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            entry = {
+                "created": record.created,
+                "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+                "level": record.levelname,
+                "levelno": record.levelno,
+                "type": record.levelname.lower(),
+                "logger": record.name,
+                "message": record.getMessage(),
+                "thread": record.threadName,
+            }
+            if record.exc_info:
+                entry["exception"] = logging.Formatter().formatException(record.exc_info)
+            with self._buffer_lock:
+                entry["seq"] = next(self._seq)
+                self._records.append(entry)
+        except Exception:
+            self.handleError(record)
+
+    def query(self,
+              level: Optional[str] = None,
+              logger_name: Optional[str] = None,
+              since: Optional[float] = None,
+              cursor: int = 0,
+              limit: int = 200) -> Dict[str, Any]:
+        """
+        查詢緩衝區中的日誌
+
+        Args:
+            level: 最低日誌等級，例如 "WARNING"
+            logger_name: logger 名稱，包含其子 logger（例如 "app.services"）
+            since: 只回傳此時間（epoch 秒）之後的紀錄
+            cursor: 只回傳序號大於此值的紀錄，通常為上次回應的 next_cursor
+            limit: 最多回傳筆數
+
+        Returns:
+            {"logs", "next_cursor", "truncated", "buffered"}；truncated 表示 cursor 之後有紀錄已被丟棄
+        """
+        min_level = logging.getLevelName(level.upper()) if level else logging.NOTSET
+        if not isinstance(min_level, int):
+            raise ValueError(f"未知的日誌等級: {level}")
+        limit = max(1, limit)
+
+        with self._buffer_lock:
+            records = list(self._records)
+
+        matched: List[Dict[str, Any]] = []
+        next_cursor = cursor
+        for entry in records:
+            if entry["seq"] <= cursor:
+                continue
+            if len(matched) >= limit:
+                break
+            # 即使不符合篩選條件也推進游標，下次輪詢不必重新掃描
+            next_cursor = entry["seq"]
+            if entry["levelno"] < min_level:
+                continue
+            if logger_name and entry["logger"] != logger_name and not entry["logger"].startswith(logger_name + "."):
+                continue
+            if since is not None and entry["created"] <= since:
+                continue
+            matched.append(entry)
+
+        return {
+            "logs": matched,
+            "next_cursor": next_cursor,
+            "truncated": bool(records) and records[0]["seq"] > cursor + 1,
+            "buffered": len(records),
+        }
+
+
+_log_buffer: Optional[RingBufferHandler] = None
+
+
+def install_log_buffer(capacity: int = LOG_BUFFER_SIZE, attach: bool = True) -> RingBufferHandler:
+    """
+    建立全域環形緩衝區 handler（重複呼叫時回傳同一個）
+
+    Args:
+        capacity: 保留的紀錄數
+        attach: 是否直接掛到 root logger；由 logging_config 掛在佇列之後時為 False
+    """
+    global _log_buffer
+    if _log_buffer is None:
+        _log_buffer = RingBufferHandler(capacity)
+        if attach:
+            logging.getLogger().addHandler(_log_buffer)
+    return _log_buffer
+
+
+def get_log_buffer() -> Optional[RingBufferHandler]:
+    """取得已安裝的環形緩衝區，未安裝時回傳 None"""
+    return _log_buffer
+
+
+__all__ = ["RingBufferHandler", "install_log_buffer", "get_log_buffer"]
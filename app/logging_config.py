@@ -0,0 +1,145 @@
+# 檔案路徑: app/logging_config.py
+
+"""
+集中式日誌設定
+
+所有模組只使用 logging.getLogger(__name__)，不再各自呼叫 basicConfig。
+root logger 只掛一個 QueueHandler，請求執行緒只把紀錄放進佇列；
+格式化與輸出由 QueueListener 的背景執行緒完成，不會因 I/O 阻塞請求。
+
+設定：
+    LOG_LEVEL: root 日誌等級（預設 INFO）
+    LOG_LEVELS: 個別模組的等級，例如 "app.services.ai_service=DEBUG,uvicorn.access=WARNING"
+    LOG_FORMAT: json（預設）或 text
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+from .log_buffer import install_log_buffer
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord 的標準屬性，其餘屬性視為透過 extra= 傳入的結構化欄位
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_settings: Optional[tuple] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """將紀錄輸出為單行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    同一行程內的 QueueHandler
+
+    預設的 prepare() 會在呼叫端執行緒先格式化訊息；佇列只在行程內使用，
+    因此直接傳遞原始紀錄，把 % 格式化也延後到背景執行緒。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_module_levels(spec: str) -> Dict[str, str]:
+    """解析 "模組=等級,模組=等級" 格式的設定"""
+    levels = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, level = part.split("=", 1)
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: str = LOG_LEVEL,
+                      module_levels: Optional[Dict[str, str]] = None,
+                      log_format: str = LOG_FORMAT) -> None:
+    """
+    設定 root logger（可重複呼叫，只會設定一次）
+
+    Args:
+        level: root 日誌等級
+        module_levels: {logger 名稱: 等級}，預設讀取 LOG_LEVELS
+        log_format: "json" 或 "text"
+    """
+    global _listener, _settings
+    if _listener is not None:
+        return
+    _settings = (level, module_levels, log_format)
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "text":
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    # /api/logs 的環形緩衝區也放在佇列之後
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(
+        log_queue, stream_handler, install_log_buffer(attach=False), respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_InProcessQueueHandler(log_queue))
+    root.setLevel(level)
+
+    for name, module_level in (module_levels if module_levels is not None else parse_module_levels(LOG_LEVELS)).items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def shutdown_logging() -> None:
+    """停止背景輸出執行緒，並寫出佇列中剩餘的紀錄"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork() -> None:
+    # fork 出的子行程不會繼承背景輸出執行緒，需以相同設定重新建立
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging(*_settings)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+__all__ = ["configure_logging", "shutdown_logging", "JsonFormatter", "parse_module_levels"]
@@ -1,18 +1,36 @@
-from fastapi import FastAPI
+# 日誌設定必須在匯入其他模組前完成
+from app.logging_config import configure_logging
+configure_logging()
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import ai_router, meal_router
-# from app.routers import ai_router_v2  # 暫時註釋掉有問題的路由器
+from app.routers import ai_router_v2  # 模型改為延遲載入後，匯入此路由器不再載入任何模型
 from app.database import engine, Base
 from app.routers import nutrition_router  # 引入新的營養路由器
+from app.routers import job_router
+from app.runtime_config import configure_runtime
+from app.metrics import render_prometheus
+from app.log_buffer import install_log_buffer
+from app.services.nutrition_search_service import ensure_search_index
+from app.services.inference_worker import start_inference_pool, stop_inference_pool
+from app.services.analysis_job_service import start_job_queue, stop_job_queue
+from app.services.label_nutrition_service import ensure_label_mapping
+from app.services.food_suggest_service import load_suggest_index
 import logging
 from datetime import datetime
+from typing import Optional
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 最近的日誌保存在記憶體環形緩衝區，供 /api/logs 查詢（已由 configure_logging 掛在日誌佇列之後）
+log_buffer = install_log_buffer()
+
 # 創建資料庫表
 Base.metadata.create_all(bind=engine)
+# 營養資料的全文檢索索引（並補上舊資料庫缺少的 FDC 欄位）
+ensure_search_index(engine)
 
 app = FastAPI(title="Health Assistant API")
 
@@ -27,7 +45,8 @@ app.add_middleware(
 
 # 註冊路由
 app.include_router(ai_router.router)
-# app.include_router(ai_router_v2.router)  # 暫時註釋掉有問題的路由器
+app.include_router(ai_router_v2.router)
+app.include_router(job_router.router)
 app.include_router(meal_router.router)
 app.include_router(nutrition_router.router, prefix="/api/nutrition", tags=["nutrition"]) # 註冊新的營養路由器
 
@@ -39,48 +58,80 @@ async def root():
 async def startup_event():
     """應用程序啟動時的事件"""
     logger.info("Health Assistant API 正在啟動...")
+    # 在載入任何模型前設定執行緒數與 CPU 綁定，避免多個 worker 互搶核心
+    app.state.runtime_settings = configure_runtime()
+    # INFERENCE_WORKERS > 0 時，模型推論改由獨立行程執行
+    start_inference_pool()
+    start_job_queue()
+    # 分類標籤的營養對應表在啟動時載入（尚未建立時建立），請求期間只讀取
+    ensure_label_mapping()
+    # 食物名稱前綴索引在啟動時載入（需在標籤對應表之後，才能讀到標籤別名），第一次查詢不必等待
+    try:
+        load_suggest_index()
+    except Exception as e:
+        logger.warning("食物名稱前綴索引載入失敗，將於第一次查詢時重試: %s", e)
     logger.info("AI 模型將在首次使用時載入，以節省啟動時間")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """應用程序關閉時的事件"""
     logger.info("Health Assistant API 正在關閉...")
+    stop_job_queue()
+    stop_inference_pool()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 格式的執行期指標"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def health_check():
     """健康檢查端點"""
     return {
         "status": "healthy",
-        "routers": ["ai_router", "meal_router", "nutrition_router"],
+        "routers": ["ai_router", "ai_router_v2", "job_router", "meal_router", "nutrition_router"],
         "endpoints": [
             "/ai/analyze-food-image/",
             "/ai/analyze-food-image-with-weight/",
             "/ai/health",
+            "/ai/v2/analyze-food",
+            "/ai/v2/analyze-food/stream",
+            "/ai/jobs",
             "/api/nutrition/lookup",
+            "/api/nutrition/search",
+            "/api/nutrition/suggest",
+            "/metrics",
             "/api/logs"
         ]
     }
 
 @app.get("/api/logs")
-async def get_logs():
-    """獲取系統日誌"""
+async def get_logs(
+    level: Optional[str] = Query(default=None, description="最低日誌等級，例如 WARNING"),
+    logger_name: Optional[str] = Query(default=None, alias="logger", description="logger 名稱（含子 logger）"),
+    since: Optional[datetime] = Query(default=None, description="只回傳此時間之後的日誌"),
+    cursor: int = Query(default=0, ge=0, description="上次回應的 next_cursor，只取得新增的日誌"),
+    limit: int = Query(default=200, ge=1, le=1000)
+):
+    """
+    獲取系統日誌
+
+    從記憶體內的環形緩衝區讀取最近的日誌；輪詢時帶上次回應的 next_cursor，
+    只會收到新增的紀錄。
+    """
     try:
-        return {
-            "logs": [
-                f"系統啟動時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                "API 狀態: 正常運行",
-                "後端服務: FastAPI",
-                "前端服務: React + Vite",
-                "AI 模型: 延遲載入模式",
-                "資料庫: SQLAlchemy"
-            ],
-            "total_lines": 6,
-            "timestamp": datetime.now().isoformat(),
-            "environment": "local-development"
-        }
-    except Exception as e:
-        return {
-            "logs": [f"日誌查詢錯誤: {str(e)}"],
-            "total_lines": 0,
-            "timestamp": datetime.now().isoformat()
-        }
+        result = log_buffer.query(
+            level=level,
+            logger_name=logger_name,
+            since=since.timestamp() if since else None,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        **result,
+        "total_lines": len(result["logs"]),
+        "timestamp": datetime.now().isoformat(),
+    }
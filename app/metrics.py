@@ -0,0 +1,294 @@
+# 檔案路徑: app/metrics.py
+
+"""
+輕量化的執行期指標
+
+提供直方圖與計數器，以 Prometheus 文字格式輸出於 /metrics。
+不依賴 prometheus_client；每個 worker 行程各自統計，由 Prometheus 分別抓取。
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 延遲直方圖的預設區間（秒），CPU 推論可能長達數十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"指標 {self.name} 需要標籤 {self.label_names}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+_INF_LABEL = 'le="+Inf"'
+
+
+class Histogram(_Metric):
+    """累積區間直方圖"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # 每組標籤: [各區間計數..., 總和, 次數]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """量測 with 區塊的執行時間"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, _INF_LABEL)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {state[-1]}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文字格式輸出所有指標"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- 應用程式指標 ---
+
+ANALYSIS_STAGE_SECONDS = Histogram(
+    "food_analysis_stage_seconds",
+    "Latency of each food analysis stage.",
+    ["stage"],
+)
+DB_WRITE_SECONDS = Histogram(
+    "db_write_seconds",
+    "Latency of database write statements.",
+    ["operation", "table"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and result (hit or miss).",
+    ["cache", "result"],
+)
+MODEL_LOADS = Counter(
+    "model_loads_total",
+    "Model loads by model and weight source.",
+    ["model", "source"],
+)
+ANALYSIS_FALLBACKS = Counter(
+    "analysis_fallbacks_total",
+    "Times a fallback path was taken during food analysis.",
+    ["path"],
+)
+CIRCUIT_BREAKER_EVENTS = Counter(
+    "circuit_breaker_events_total",
+    "Circuit breaker state transitions (closed, open, half_open) and short-circuited calls.",
+    ["breaker", "event"],
+)
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Calls through a single-flight group by role (leader computed, follower awaited an in-flight call).",
+    ["group", "role"],
+)
+ANALYSIS_PATHS = Counter(
+    "food_analysis_path_total",
+    "Completed food analyses by pipeline path (fast cascade or full).",
+    ["path"],
+)
+CONFIG_SWITCHES = Counter(
+    "adaptive_config_switches_total",
+    "Times the adaptive scheduler switched the default pipeline, by the config switched to.",
+    ["config"],
+)
+
+
+# 模型比較等基準測試的執行緒不計入線上的分析指標
+_suppressed = threading.local()
+
+
+@contextmanager
+def suppress_analysis_metrics():
+    """在目前執行緒內暫停記錄分析階段延遲與分析流程，重複執行的基準測試不影響線上的統計"""
+    previous = getattr(_suppressed, "active", False)
+    _suppressed.active = True
+    try:
+        yield
+    finally:
+        _suppressed.active = previous
+
+
+def _analysis_metrics_suppressed() -> bool:
+    return getattr(_suppressed, "active", False)
+
+
+def stage_timer(stage: str):
+    """量測一個分析階段的耗時：with stage_timer("detection"): ..."""
+    if _analysis_metrics_suppressed():
+        return nullcontext()
+    return ANALYSIS_STAGE_SECONDS.time(stage=stage)
+
+
+def timed_stage(stage: str):
+    """裝飾器：量測函數的耗時並記為指定的分析階段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    """記錄一次快取查詢結果"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_fallback(path: str):
+    """記錄一次後備路徑"""
+    ANALYSIS_FALLBACKS.inc(path=path)
+
+
+def record_singleflight(group: str, coalesced: bool):
+    """記錄一次合併請求的呼叫：coalesced=True 表示等待了進行中的相同呼叫"""
+    SINGLEFLIGHT_CALLS.inc(group=group, role="follower" if coalesced else "leader")
+
+
+def record_analysis_path(path: str):
+    """記錄一次完成的分析所走的流程（fast 或 full）"""
+    if not _analysis_metrics_suppressed():
+        ANALYSIS_PATHS.inc(path=path)
+
+
+_WRITE_OPERATIONS = ("INSERT", "UPDATE", "DELETE")
+
+
+def _write_target(statement: str) -> Optional[Tuple[str, str]]:
+    """從 SQL 取出寫入操作與資料表名稱，非寫入語句回傳 None"""
+    words = statement.lstrip().split(None, 3)
+    if not words or words[0].upper() not in _WRITE_OPERATIONS:
+        return None
+    operation = words[0].upper()
+    # INSERT INTO t / UPDATE t / DELETE FROM t
+    table_index = 1 if operation == "UPDATE" else 2
+    table = words[table_index].strip('"`[]') if len(words) > table_index else "unknown"
+    return operation.lower(), table
+
+
+def instrument_db_writes(engine):
+    """為 SQLAlchemy engine 掛上寫入語句的耗時統計"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _write_target(statement) is not None:
+            conn.info["metrics_write_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("metrics_write_start", None)
+        target = _write_target(statement)
+        if start is not None and target is not None:
+            DB_WRITE_SECONDS.observe(time.perf_counter() - start, operation=target[0], table=target[1])
+
+
+__all__ = [
+    "Counter", "Histogram", "render_prometheus", "stage_timer", "timed_stage", "record_cache", "record_fallback",
+    "instrument_db_writes", "ANALYSIS_STAGE_SECONDS", "DB_WRITE_SECONDS", "CACHE_REQUESTS",
+    "MODEL_LOADS", "ANALYSIS_FALLBACKS", "ANALYSIS_PATHS", "record_analysis_path",
+    "CONFIG_SWITCHES", "suppress_analysis_metrics",
+]
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from ..database import Base
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # uuid hex
+    status = Column(String, index=True)  # queued, running, succeeded, failed
+    owner = Column(String)  # 執行中任務所屬的行程 "主機名稱:pid"
+    priority = Column(String)  # interactive, batch
+    config = Column(JSON)  # 模型配置
+    debug = Column(Integer, default=0)
+    image_path = Column(String)  # 待分析圖片的暫存路徑
+    callback_url = Column(String)
+    callback_status = Column(String)  # 回呼結果: delivered, failed
+    result = Column(JSON)  # 分析結果
+    error = Column(String)
+    created_at = Column(DateTime, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -1,5 +1,5 @@
 # backend/app/models/nutrition.py
-from sqlalchemy import Column, Integer, String, Float, JSON
+from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime
 from ..database import Base
 
 class Nutrition(Base):
@@ -7,6 +7,8 @@ class Nutrition(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     food_name = Column(String, unique=True, index=True, nullable=False)
+    fdc_id = Column(Integer, unique=True, index=True)  # USDA FoodData Central 編號，由 fdc_import 匯入
+    data_type = Column(String)  # FDC 資料類型，例如 foundation_food, branded_food
     chinese_name = Column(String)
     calories = Column(Float)
     protein = Column(Float)
@@ -19,4 +21,34 @@ class Nutrition(Base):
     details = Column(JSON)
     health_score = Column(Integer)
     recommendations = Column(JSON)
-    warnings = Column(JSON) 
\ No newline at end of file
+    warnings = Column(JSON) 
+
+
+class FoodNutrient(Base):
+    """FDC 匯入的完整營養素資料（nutrition 表只保留常用的幾項）"""
+    __tablename__ = "food_nutrients"
+
+    id = Column(Integer, primary_key=True)
+    nutrition_id = Column(Integer, ForeignKey("nutrition.id"), index=True, nullable=False)
+    nutrient_number = Column(String)  # FDC nutrient_nbr，例如 208 = Energy
+    name = Column(String)
+    unit_name = Column(String)
+    amount = Column(Float)
+
+
+class FoodLabelNutrition(Base):
+    """分類模型標籤對應的營養資料，由 label_nutrition_service 預先解析一次"""
+    __tablename__ = "food_label_nutrition"
+
+    label = Column(String, primary_key=True)  # 正規化的標籤，例如 "apple pie"
+    food_name = Column(String)  # 對應到的營養資料名稱
+    fdc_id = Column(Integer)
+    source = Column(String)  # local, usda, builtin
+    calories = Column(Float)
+    protein = Column(Float)
+    fat = Column(Float)
+    carbs = Column(Float)
+    fiber = Column(Float)
+    sugar = Column(Float)
+    sodium = Column(Float)
+    resolved_at = Column(DateTime)
@@ -0,0 +1,92 @@
+# 檔案路徑: app/preload.py
+
+"""
+模型預載與記憶體量測
+
+在主行程中先載入所有模型權重，再 fork 出 worker，
+讓各 worker 以 copy-on-write 的方式共享唯讀的權重記憶體。
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def preload_models(include_v2: bool = True) -> Dict[str, float]:
+    """
+    載入所有 AI 模型（YOLO、SAM、DPT、food101），以及分類標籤對應表與食物名稱前綴索引
+
+    注意：只載入權重，不在主行程中執行推論。
+    torch 的 OpenMP 執行緒池一旦啟動，fork 後的子行程可能會卡死。
+
+    Args:
+        include_v2: 是否載入 V2 的偵測、分割與深度模型。啟用推論池時 V2 分析在 spawn 的推論行程中執行，
+            這些行程不繼承預載的權重，web 行程預載 V2 模型只會多佔記憶體。
+
+    Returns:
+        各模型的載入時間（秒）
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    from .services import ai_service
+    ai_service.load_model()
+    timings["classifier"] = time.perf_counter() - start
+
+    if include_v2:
+        start = time.perf_counter()
+        from .services.weight_estimation_service_v2 import weight_service_v2
+        weight_service_v2.model_service.load_all_models()
+        timings["lightweight_models"] = time.perf_counter() - start
+
+    # 分類標籤的營養對應表在 fork 前建立並載入，worker 之間共用
+    start = time.perf_counter()
+    from .services.label_nutrition_service import ensure_label_mapping
+    ensure_label_mapping()
+    timings["label_mapping"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from .services.food_suggest_service import load_suggest_index
+    load_suggest_index()
+    timings["suggest_index"] = time.perf_counter() - start
+
+    from .services.model_cache import get_cold_start_timings
+    logger.info("模型預載完成: %s", {k: round(v, 2) for k, v in timings.items()})
+    logger.info("各模型冷啟動紀錄: %s", get_cold_start_timings())
+    return timings
+
+
+def read_memory_usage(pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    讀取行程的記憶體使用量（MB）
+
+    rss 包含與其他行程共享的頁面；pss 將共享頁面按共享行程數平均分攤，
+    加總所有 worker 的 pss 才是實際佔用的記憶體。
+    """
+    pid = pid or os.getpid()
+    usage: Dict[str, Any] = {"pid": pid}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[key.lower()] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        # 非 Linux 平台，退回 resource 模組的峰值 RSS
+        try:
+            import resource
+            usage["rss"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            pass
+    return usage
+
+
+if __name__ == "__main__":
+    # 部署前執行一次：下載所有權重並轉存為本地 safetensors 快取
+    from .logging_config import configure_logging
+
+    configure_logging()
+    preload_models()
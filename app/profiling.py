@@ -0,0 +1,221 @@
+# 檔案路徑: app/profiling.py
+
+"""
+單一請求的效能剖析
+
+在設定允許時，請求可帶 X-Profile: 1 標頭或 ?profile=true 參數，為該次分析啟用：
+    - 取樣式剖析：背景執行緒定期讀取處理請求的執行緒堆疊，統計各函數與類別
+      （model / numpy / io / python）所佔的時間比例
+    - torch 運算子剖析：有安裝 torch 時以 torch.profiler 記錄各運算子的 CPU 時間
+
+結果透過除錯輸出寫入器存放在 debug_output 中（與除錯圖片同一層目錄），
+輸出目錄會放在回應標頭 X-Profile-Output。
+
+設定：
+    PROFILING_ENABLED: 是否允許請求啟用剖析（預設 false）
+    PROFILE_SAMPLE_INTERVAL_MS: 取樣間隔毫秒（預設 5）
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter
+from typing import Any, Dict, Optional, Tuple
+
+from .services.debug_writer import get_debug_writer
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_HEADER = "X-Profile"
+PROFILE_OUTPUT_HEADER = "X-Profile-Output"
+
+MAX_STACK_DEPTH = 64
+
+# 依檔案路徑歸類堆疊最內層的函式庫；由最內層往外找，第一個符合的決定類別
+_CATEGORY_MARKERS = (
+    ("model", ("torch", "ultralytics", "transformers", "segment_anything", "mobile_sam", "timm", "safetensors")),
+    ("numpy", ("numpy", "cv2", "scipy")),
+    ("io", ("PIL", "sqlite3", "sqlalchemy", "requests", "urllib3", "httpx", "socket", "ssl", "zipfile", "json")),
+)
+
+
+def should_profile(header_value: Optional[str] = None, query_flag: bool = False) -> bool:
+    """請求要求剖析且設定允許時回傳 True"""
+    requested = query_flag or (header_value or "").lower() in ("1", "true", "yes")
+    if requested and not PROFILING_ENABLED:
+        logger.debug("請求要求剖析，但 PROFILING_ENABLED 未開啟，忽略")
+    return requested and PROFILING_ENABLED
+
+
+def _frame_category(filename: str) -> Optional[str]:
+    parts = filename.replace("\\", "/").split("/")
+    for category, markers in _CATEGORY_MARKERS:
+        for marker in markers:
+            if marker in parts or f"{marker}.py" in parts:
+                return category
+    return None
+
+
+class SamplingProfiler:
+    """以背景執行緒定期取樣指定執行緒的堆疊"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = max(0.001, interval)
+        self.stacks: TallyCounter = TallyCounter()
+        self.categories: TallyCounter = TallyCounter()
+        self.samples = 0
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        labels = []
+        category = None
+        depth = 0
+        while frame is not None and depth < MAX_STACK_DEPTH:
+            code = frame.f_code
+            if category is None:
+                category = _frame_category(code.co_filename)
+            labels.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+            depth += 1
+        labels.reverse()
+        self.stacks[tuple(labels)] += 1
+        self.categories[category or "python"] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """輸出 flamegraph.pl / speedscope 可讀取的 collapsed stack 格式"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        """各類別與最常出現的函數（以堆疊最內層計）所佔的比例"""
+        leaf_counts: TallyCounter = TallyCounter()
+        for stack, count in self.stacks.items():
+            if stack:
+                leaf_counts[stack[-1]] += count
+        total = max(1, self.samples)
+        return {
+            "duration_seconds": round(self.duration, 4),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "categories": {name: round(count / total, 4) for name, count in self.categories.most_common()},
+            "top_functions": [
+                {"function": name, "fraction": round(count / total, 4)}
+                for name, count in leaf_counts.most_common(top)
+            ],
+        }
+
+
+def _start_torch_profiler():
+    """有安裝 torch 時啟動運算子剖析，否則回傳 None"""
+    try:
+        from torch.profiler import profile, ProfilerActivity
+    except ImportError:
+        return None
+    torch_profiler = profile(activities=[ProfilerActivity.CPU])
+    torch_profiler.__enter__()
+    return torch_profiler
+
+
+class RequestProfiler:
+    """
+    為單一請求收集取樣剖析與 torch 運算子剖析
+
+    取樣的對象是進入 with 區塊的執行緒，須在實際執行分析的執行緒（例如 threadpool 的 worker）中使用，
+    不要在事件迴圈執行緒中同步執行分析。
+
+    用法：
+        with RequestProfiler("v2_analyze") as profiler:
+            ...
+        profiler.output_dir  # 剖析結果的輸出目錄
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.output_dir: Optional[str] = None
+        self.summary: Dict[str, Any] = {}
+        self._sampler: Optional[SamplingProfiler] = None
+        self._torch_profiler = None
+
+    def __enter__(self) -> "RequestProfiler":
+        self._torch_profiler = _start_torch_profiler()
+        self._sampler = SamplingProfiler()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._sampler.stop()
+        torch_table, torch_trace = self._stop_torch_profiler(exc_type, exc, tb)
+
+        self.summary = {"name": self.name, "torch_profiler": torch_table is not None, **self._sampler.summary()}
+        self._write_artifacts(torch_table, torch_trace)
+        logger.info("請求剖析 %s 完成：%.2f 秒，%s 個樣本，類別比例 %s，輸出 %s",
+                    self.name, self.summary["duration_seconds"], self.summary["samples"],
+                    self.summary["categories"], self.output_dir)
+        return False
+
+    def _stop_torch_profiler(self, exc_type, exc, tb) -> Tuple[Optional[str], Optional[str]]:
+        if self._torch_profiler is None:
+            return None, None
+        try:
+            self._torch_profiler.__exit__(exc_type, exc, tb)
+            events = self._torch_profiler.key_averages()
+            table = events.table(sort_by="self_cpu_time_total", row_limit=40)
+            trace_path = os.path.join(get_debug_writer().output_dir, f".torch_trace_{id(self)}.json")
+            os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+            self._torch_profiler.export_chrome_trace(trace_path)
+            return table, trace_path
+        except Exception as e:
+            logger.warning("torch 運算子剖析失敗: %s", e)
+            return None, None
+
+    def _write_artifacts(self, torch_table: Optional[str], torch_trace: Optional[str]):
+        writer = get_debug_writer()
+        self.output_dir = writer.new_run_dir()
+        sampler = self._sampler
+        summary = dict(self.summary)
+
+        def write_text(content: str):
+            def render(path: str):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(content)
+            return render
+
+        writer.submit(self.output_dir, "profile_summary.json",
+                      write_text(json.dumps(summary, ensure_ascii=False, indent=2)))
+        writer.submit(self.output_dir, "profile_stacks.collapsed", write_text(sampler.collapsed()))
+        if torch_table is not None:
+            writer.submit(self.output_dir, "torch_ops.txt", write_text(torch_table))
+        if torch_trace is not None:
+            writer.submit(self.output_dir, "torch_trace.json", lambda path: os.replace(torch_trace, path))
+
+
+__all__ = [
+    "RequestProfiler", "SamplingProfiler", "should_profile", "PROFILE_HEADER", "PROFILE_OUTPUT_HEADER",
+    "PROFILING_ENABLED",
+]
@@ -0,0 +1,295 @@
+# 檔案路徑: app/resp.py
+
+"""
+Redis 通訊協定 (RESP) 的精簡用戶端與測試用的本地伺服器
+
+只實作共享快取需要的指令，不依賴 redis 套件：
+    - RespClient：GET / SET（含到期時間）/ DEL / INCR / PING，附連線池，可在多執行緒中共用
+    - FakeRespServer：在本機執行緒中提供相同指令的記憶體伺服器，離線測試與本機開發時代替 Redis
+
+用法:
+    client = RespClient.from_url("redis://:password@cache:6379/0")
+    client.set("key", b"value", ttl=60)
+
+    with FakeRespServer() as server:
+        client = RespClient.from_url(server.url)
+"""
+
+import logging
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class RespError(Exception):
+    """伺服器回傳的錯誤回應（-ERR ...）"""
+
+
+def encode_command(*args: Any) -> bytes:
+    """將指令編碼為 RESP 陣列"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode("utf-8")
+        else:
+            data = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    """從檔案物件讀取一個回應"""
+    line = stream.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("連線中斷")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode("utf-8")
+    if prefix == b"-":
+        return RespError(payload.decode("utf-8"))
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("連線中斷")
+        return data[:-2]
+    if prefix == b"*":
+        count = int(payload)
+        return None if count < 0 else [read_reply(stream) for _ in range(count)]
+    raise ConnectionError(f"無法辨識的回應: {line[:20]!r}")
+
+
+class _Connection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+
+    def execute(self, *args: Any) -> Any:
+        self.sock.sendall(encode_command(*args))
+        return read_reply(self.stream)
+
+    def close(self):
+        try:
+            self.stream.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespClient:
+    """RESP 用戶端；連線失敗或逾時時拋出 ConnectionError / OSError，由呼叫端決定如何降級"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, password: Optional[str] = None,
+                 timeout: float = 0.5, pool_size: int = 8):
+        self.host, self.port, self.db = host, port, db
+        self.password = password
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[_Connection]" = queue.LifoQueue(maxsize=pool_size)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RespClient":
+        """解析 redis://[:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        return cls(parsed.hostname or "127.0.0.1", parsed.port or 6379, db=db, password=parsed.password, **kwargs)
+
+    def _connect(self) -> _Connection:
+        conn = _Connection(self.host, self.port, self.timeout)
+        try:
+            for command in ((("AUTH", self.password),) if self.password else ()) + \
+                    ((("SELECT", self.db),) if self.db else ()):
+                reply = conn.execute(*command)
+                if isinstance(reply, RespError):
+                    raise reply
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def execute(self, *args: Any) -> Any:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            reply = conn.execute(*args)
+        except Exception:
+            # 回應可能只讀了一半，這條連線不能再使用
+            conn.close()
+            raise
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def ping(self) -> bool:
+        return self.execute("PING") == "PONG"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self.execute("SET", key, value, "PX", max(1, int(ttl * 1000)))
+        else:
+            self.execute("SET", key, value)
+
+    def delete(self, *keys: str) -> int:
+        return self.execute("DEL", *keys) if keys else 0
+
+    def incr(self, key: str) -> int:
+        return self.execute("INCR", key)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# --- 測試用的本地伺服器 ---
+
+class _FakeHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            name = command[0].decode("ascii", "replace").upper()
+            self.wfile.write(self.server.store.dispatch(name, command[1:]))
+
+
+class _FakeStore:
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self.commands: List[str] = []
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    def dispatch(self, name: str, args: List[bytes]) -> bytes:
+        with self._lock:
+            self.commands.append(name)
+            if name == "PING":
+                return b"+PONG\r\n"
+            if name in ("AUTH", "SELECT"):
+                return b"+OK\r\n"
+            if name == "GET" and len(args) == 1:
+                value = self._live(args[0])
+                return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+            if name == "SET" and len(args) >= 2:
+                expires_at = None
+                options = [arg.upper() for arg in args[2:]]
+                if "NX" in options and self._live(args[0]) is not None:
+                    return b"$-1\r\n"
+                for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+                    if unit in options:
+                        expires_at = time.monotonic() + float(args[2 + options.index(unit) + 1]) * scale
+                self._data[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if name == "DEL":
+                removed = sum(1 for key in args if self._live(key) is not None and self._data.pop(key, None))
+                return b":%d\r\n" % removed
+            if name == "EXISTS":
+                return b":%d\r\n" % sum(1 for key in args if self._live(key) is not None)
+            if name == "INCR" and len(args) == 1:
+                current = self._live(args[0])
+                try:
+                    value = int(current or 0) + 1
+                except ValueError:
+                    return b"-ERR value is not an integer or out of range\r\n"
+                expires_at = self._data.get(args[0], (None, None))[1]
+                self._data[args[0]] = (str(value).encode(), expires_at)
+                return b":%d\r\n" % value
+            if name == "DBSIZE":
+                return b":%d\r\n" % sum(1 for key in list(self._data) if self._live(key) is not None)
+            if name == "FLUSHDB":
+                self._data.clear()
+                return b"+OK\r\n"
+            return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+
+class FakeRespServer:
+    """記憶體內的 RESP 伺服器，在背景執行緒中監聽本機的隨機埠"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), _FakeHandler)
+        self._server.daemon_threads = True
+        self._server.store = _FakeStore()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    @property
+    def commands(self) -> List[str]:
+        """收到的指令名稱，測試用"""
+        return self._server.store.commands
+
+    def start(self) -> "FakeRespServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-resp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeRespServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+__all__ = ["RespClient", "RespError", "FakeRespServer", "encode_command", "read_reply"]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .logging_config import configure_logging
+
+    parser = argparse.ArgumentParser(description="啟動本機用的記憶體 RESP 伺服器（代替 Redis）")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    configure_logging()
+    server = FakeRespServer(port=args.port).start()
+    logger.info("本機 RESP 伺服器已啟動: %s", server.url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
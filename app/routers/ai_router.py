@@ -1,9 +1,10 @@
 # 檔案路徑: app/routers/ai_router.py
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, File, UploadFile, HTTPException, Header, Query, Response
 from ..services.ai_service import classify_food_image  # 直接引入分類函式
-from ..services.nutrition_api_service import fetch_nutrition_data  # 匯入營養查詢函式
+from ..services.nutrition_api_service import fetch_nutrition_data, usda_breaker  # 匯入營養查詢函式
 from app.services.weight_estimation_service import estimate_food_weight
+from ..profiling import RequestProfiler, should_profile, PROFILE_HEADER, PROFILE_OUTPUT_HEADER
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 
@@ -40,29 +41,44 @@ async def analyze_food_image_endpoint(file: UploadFile = File(...)):
     return {"food_name": "測試食物", "nutrition_info": {"calories": 100}}
 
 @router.post("/analyze-food-image-with-weight/", response_model=WeightEstimationResponse)
-async def analyze_food_image_with_weight_endpoint(file: UploadFile = File(...)):
+async def analyze_food_image_with_weight_endpoint(
+    response: Response,
+    file: UploadFile = File(...),
+    profile: bool = Query(default=False),
+    x_profile: Optional[str] = Header(default=None, alias=PROFILE_HEADER),
+):
     """
     整合食物辨識、重量估算與營養分析的端點。
     包含信心度與誤差範圍，支援參考物偵測。
+    PROFILING_ENABLED 開啟時，可帶 X-Profile: 1 或 ?profile=true 剖析此次請求。
     """
     # 檢查上傳的檔案是否為圖片格式
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="上傳的檔案不是圖片格式。")
     
     image_bytes = await file.read()
-    result = await estimate_food_weight(image_bytes)
+    if not should_profile(x_profile, profile):
+        return await estimate_food_weight(image_bytes)
+
+    with RequestProfiler("v1_analyze_with_weight") as profiler:
+        result = await estimate_food_weight(image_bytes)
+    response.headers[PROFILE_OUTPUT_HEADER] = profiler.output_dir
     return result
 
 @router.get("/health")
 async def health_check():
     """
     健康檢查端點，確認 AI 服務是否正常運作
+    USDA 斷路器開啟時 nutrition_api 為 degraded，營養查詢暫時只使用本地資料
     """
+    breaker = usda_breaker.snapshot()
+    nutrition_status = "available" if breaker["state"] == "closed" else "degraded"
     return {
-        "status": "healthy",
+        "status": "healthy" if nutrition_status == "available" else "degraded",
         "services": {
             "food_classification": "available",
             "weight_estimation": "available",
-            "nutrition_api": "available"
-        }
+            "nutrition_api": nutrition_status
+        },
+        "circuit_breakers": {"usda": breaker}
     }
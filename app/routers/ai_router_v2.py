@@ -1,27 +1,106 @@
 # 檔案路徑: app/routers/ai_router_v2.py
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 import logging
-from typing import Dict, Any, Optional
-import io
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import os
+import time
+import zipfile
 from PIL import Image
 import numpy as np
 
-from ..services.weight_estimation_service_v2 import estimate_food_weight_v2, WeightEstimationServiceV2
-from ..services.lightweight_model_service import get_available_models, create_model_service_with_config
+from ..services.weight_estimation_service_v2 import (
+    analyze_food_image_v2, iter_analysis_events_v2, iter_batch_analysis_v2,
+    compare_model_configs, decode_image, get_cascade_stats, WeightEstimationServiceV2
+)
+from ..services.lightweight_model_service import (
+    get_available_models, create_model_service_with_config, RECOMMENDED_CONFIGS
+)
+from ..services.model_cache import get_cold_start_timings
+from ..services.inference_worker import InferenceWorkerDied, get_inference_pool
+from ..services.adaptive_scheduler import scheduler
+from ..profiling import RequestProfiler, should_profile, PROFILE_HEADER, PROFILE_OUTPUT_HEADER
+from ..singleflight import SingleFlight, content_key
+from ..metrics import record_analysis_path
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai/v2", tags=["AI Analysis V2"])
 
+# 批次分析單次請求的圖片數量上限
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", "200"))
+# 單張圖片與整個批次（multipart 與 zip 解壓縮後合計）的大小上限（位元組）
+MAX_BATCH_IMAGE_BYTES = int(os.getenv("MAX_BATCH_IMAGE_BYTES", str(20 * 1024 * 1024)))
+MAX_BATCH_TOTAL_BYTES = int(os.getenv("MAX_BATCH_TOTAL_BYTES", str(512 * 1024 * 1024)))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+# 模型比較每組配置的重複次數上限
+MAX_COMPARE_REPETITIONS = int(os.getenv("MAX_COMPARE_REPETITIONS", "50"))
+
+_analysis_flight = SingleFlight("food_analysis")
+
+
+def _profiled_analysis(image_bytes: bytes, parsed_config: Optional[Dict[str, str]], debug: bool,
+                       cascade: Optional[bool]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """在執行緒池的 worker 執行緒中剖析一次分析，取樣器與 torch 剖析都以該執行緒為對象"""
+    with RequestProfiler("v2_analyze") as profiler:
+        result = analyze_food_image_v2(image_bytes=image_bytes, model_config=parsed_config, debug=debug, cascade=cascade)
+    return result, profiler.output_dir
+
+
+async def _analyze(image_bytes: bytes, parsed_config: Optional[Dict[str, str]], debug: bool,
+                   cascade: Optional[bool] = None, selected_config: Optional[str] = None,
+                   profile: bool = False) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    進行食物分析：有推論 worker 池時，解碼後的圖片經共享記憶體交給獨立行程；
+    否則在 threadpool 中執行，事件迴圈才能在分析期間接收相同的請求並合併
+
+    profile=True 時不使用 worker 池，在 threadpool 中剖析本行程內的分析，才能取樣到模型與 NumPy 的堆疊。
+    selected_config 為負載排程選出的配置名稱時，記錄耗時供排程器計算 p95，並附在 model_info 中
+
+    Returns:
+        (分析結果, 剖析輸出目錄)；未剖析時輸出目錄為 None
+    """
+    start = time.perf_counter()
+    pool = get_inference_pool()
+    profile_dir = None
+    if profile:
+        result, profile_dir = await run_in_threadpool(_profiled_analysis, image_bytes, parsed_config, debug, cascade)
+    elif pool is not None:
+        image_array = np.array(decode_image(image_bytes))
+        result = await pool.analyze(image_array, model_config=parsed_config, debug=debug, cascade=cascade)
+    else:
+        result = await run_in_threadpool(
+            analyze_food_image_v2, image_bytes=image_bytes, model_config=parsed_config, debug=debug, cascade=cascade
+        )
+    # worker 行程的指標不會回到 web 行程，流程統計在這裡記錄
+    if result.get("pipeline"):
+        record_analysis_path(result["pipeline"])
+    if selected_config:
+        scheduler.record_latency(time.perf_counter() - start)
+        result.setdefault("model_info", {})["selected_config"] = selected_config
+    return result, profile_dir
+
+def _schedule_config(parsed_config: Optional[Dict[str, str]]) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """用戶端未指定配置時，依推論佇列深度與延遲選擇預設配置；回傳 (模型配置, 配置名稱)"""
+    if parsed_config:
+        return parsed_config, None
+    pool = get_inference_pool()
+    queue_depth = pool.queue_depth() if pool is not None else _analysis_flight.in_flight()
+    name, config = scheduler.select(queue_depth)
+    return config, name
+
 @router.post("/analyze-food")
 async def analyze_food_v2(
     image: UploadFile = File(...),
-    model_config: Optional[str] = Form(default=None),  # JSON 字符串格式的模型配置
-    debug: bool = Form(default=False)
+    # pydantic v2 保留了 model_config 這個名稱，參數改名並以 alias 維持原本的表單欄位名稱
+    model_config_json: Optional[str] = Form(default=None, alias="model_config"),  # JSON 字符串格式的模型配置
+    debug: bool = Form(default=False),
+    cascade: Optional[bool] = Form(default=None),
+    profile: bool = Query(default=False),
+    x_profile: Optional[str] = Header(default=None, alias=PROFILE_HEADER),
 ) -> Dict[str, Any]:
     """
     使用可配置的輕量化模型進行食物分析 V2
@@ -30,7 +109,10 @@ async def analyze_food_v2(
         image: 上傳的圖片文件
         model_config: 可選的模型配置 JSON 字符串，例如：
             '{"detection": "yolov5n", "segmentation": "mobilesam", "depth": "dpt_swinv2_tiny"}'
+            未指定時由負載排程選擇，所選配置名稱見結果的 model_info.selected_config
         debug: 是否啟用調試模式
+        cascade: 是否啟用串接模式（單一食物且分類可信時略過分割與深度估計），未指定時依 CASCADE_ENABLED
+        profile / X-Profile: PROFILING_ENABLED 開啟時剖析此次請求，輸出目錄見回應標頭 X-Profile-Output
     
     Returns:
         包含食物分析結果的字典
@@ -45,27 +127,170 @@ async def analyze_food_v2(
         
         # 解析模型配置
         parsed_config = None
-        if model_config:
+        if model_config_json:
             try:
                 import json
-                parsed_config = json.loads(model_config)
-                logger.info(f"使用自定義模型配置: {parsed_config}")
+                parsed_config = json.loads(model_config_json)
+                logger.info("使用自定義模型配置: %s", parsed_config)
             except json.JSONDecodeError:
-                logger.warning(f"模型配置 JSON 解析失敗: {model_config}，使用預設配置")
+                logger.warning("模型配置 JSON 解析失敗: %s，使用預設配置", model_config_json)
         
-        # 進行食物分析
-        result = await estimate_food_weight_v2(
-            image_bytes=image_bytes,
-            model_config=parsed_config,
-            debug=debug
+        # 未指定配置時由負載排程選擇 balanced 或 speed_optimized
+        parsed_config, selected_config = _schedule_config(parsed_config)
+
+        profile_requested = should_profile(x_profile, profile)
+
+        # 相同圖片與配置的並行請求（多人同時拍同一道菜、前端重試）只分析一次；剖析的請求只與剖析的請求合併
+        result, profile_dir = await _analysis_flight.do_async(
+            content_key(image_bytes, parsed_config, debug, cascade, selected_config, profile_requested),
+            lambda: _analyze(image_bytes, parsed_config, debug, cascade, selected_config, profile_requested),
         )
-        
+        if profile_dir is not None:
+            return JSONResponse(content=result, headers={PROFILE_OUTPUT_HEADER: profile_dir})
         return JSONResponse(content=result)
         
+    except InferenceWorkerDied as e:
+        # 推論行程意外結束，請求本身沒有問題，讓用戶端重試
+        logger.warning("食物分析失敗: %s", str(e))
+        raise HTTPException(status_code=503, detail=f"分析失敗: {str(e)}", headers={"Retry-After": "1"})
     except Exception as e:
-        logger.error(f"食物分析失敗: {str(e)}")
+        logger.error("食物分析失敗: %s", str(e))
         raise HTTPException(status_code=500, detail=f"分析失敗: {str(e)}")
 
+@router.post("/analyze-food/stream")
+async def analyze_food_stream_v2(
+    image: UploadFile = File(...),
+    model_config_json: Optional[str] = Form(default=None, alias="model_config"),
+    debug: bool = Form(default=False)
+) -> StreamingResponse:
+    """
+    串流版食物分析 V2（Server-Sent Events）
+
+    每完成一個分析階段就送出一個事件，前端可先顯示偵測框與辨識結果，
+    不必等待深度估計與營養計算完成。
+
+    事件依序為：
+        objects: {"image_size", "objects"}
+        reference: {"reference_object", "pixel_to_cm_ratio", "candidates"}
+        item: {"index", "label", "bbox", "food_name", "mask"}，mask 為逐列掃描的 RLE
+        result: 與 /ai/v2/analyze-food 相同格式的最終結果
+        error: 分析失敗時的結果
+    """
+    if not image.content_type or not image.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="只支持圖片文件")
+
+    image_bytes = await image.read()
+
+    parsed_config = None
+    if model_config_json:
+        try:
+            parsed_config = json.loads(model_config_json)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="模型配置 JSON 格式錯誤")
+
+    def generate():
+        # 同步產生器由 StreamingResponse 放在執行緒池中迭代，不會阻塞事件迴圈
+        for event, data in iter_analysis_events_v2(image_bytes, model_config=parsed_config, debug=debug):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _extract_archive(file, max_images: int, max_total_bytes: int) -> List[Tuple[str, bytes]]:
+    """
+    讀出 zip 檔內的圖片
+
+    解壓縮前先以中央目錄記錄的大小檢查張數、單張與總大小（ZipExtFile 最多只會解出 file_size 位元組），
+    超過上限時回傳 400 而不截斷批次。
+    """
+    try:
+        # 上傳檔已暫存於 SpooledTemporaryFile，直接讀取，不另外複製到記憶體
+        with zipfile.ZipFile(file) as zf:
+            entries = [
+                info for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            if len(entries) > max_images:
+                raise HTTPException(status_code=400, detail=f"單次最多分析 {MAX_BATCH_IMAGES} 張圖片")
+            total_bytes = 0
+            for info in entries:
+                if info.file_size > MAX_BATCH_IMAGE_BYTES:
+                    raise HTTPException(status_code=400, detail=f"zip 內的圖片 '{info.filename}' 超過大小上限")
+                total_bytes += info.file_size
+            if total_bytes > max_total_bytes:
+                raise HTTPException(status_code=400, detail="批次圖片解壓縮後的總大小超過上限")
+            return [(info.filename, zf.read(info)) for info in entries]
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="zip 檔格式錯誤")
+
+@router.post("/analyze-food/batch")
+async def analyze_food_batch_v2(
+    images: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(default=None),  # 包含多張圖片的 zip 檔
+    model_config_json: Optional[str] = Form(default=None, alias="model_config"),
+    batch_size: int = Form(default=8)
+) -> StreamingResponse:
+    """
+    批次食物分析 V2
+
+    接受多個圖片檔案（multipart）或一個 zip 檔，跨圖片批次執行偵測、深度估計與辨識，
+    並以 NDJSON 逐行串流回傳每張圖片的結果（完成一張回傳一張，順序不保證與上傳順序相同）。
+    圖片張數、單張大小（MAX_BATCH_IMAGE_BYTES）與總大小（MAX_BATCH_TOTAL_BYTES）超過上限時回傳 400。
+
+    Args:
+        images: 上傳的圖片文件列表
+        archive: 可選的 zip 檔，內含的圖片會接在 images 之後
+        model_config: 可選的模型配置 JSON 字符串
+        batch_size: 每組跨圖片批次處理的圖片數量
+
+    Returns:
+        application/x-ndjson 串流，每行為 {"index", "filename", "status", "result" | "error"}
+    """
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"單次最多分析 {MAX_BATCH_IMAGES} 張圖片")
+
+    named_images: List[Tuple[str, bytes]] = []
+    total_bytes = 0
+    for upload in images:
+        if not upload.content_type or not upload.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"檔案 '{upload.filename}' 不是圖片格式")
+        # 最多讀取上限加一個位元組，超過上限的圖片不必整個讀入記憶體
+        data = await upload.read(MAX_BATCH_IMAGE_BYTES + 1)
+        if len(data) > MAX_BATCH_IMAGE_BYTES:
+            raise HTTPException(status_code=400, detail=f"圖片 '{upload.filename}' 超過大小上限")
+        total_bytes += len(data)
+        if total_bytes > MAX_BATCH_TOTAL_BYTES:
+            raise HTTPException(status_code=400, detail="批次圖片的總大小超過上限")
+        named_images.append((upload.filename, data))
+
+    if archive is not None:
+        # 解壓縮可能長達數百 MB，在執行緒池中進行，不阻塞事件迴圈
+        named_images.extend(await run_in_threadpool(
+            _extract_archive, archive.file, MAX_BATCH_IMAGES - len(named_images), MAX_BATCH_TOTAL_BYTES - total_bytes
+        ))
+
+    if not named_images:
+        raise HTTPException(status_code=400, detail="未提供任何圖片")
+
+    parsed_config = None
+    if model_config_json:
+        try:
+            parsed_config = json.loads(model_config_json)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="模型配置 JSON 格式錯誤")
+
+    logger.info("收到批次分析請求，共 %s 張圖片，batch_size=%s", len(named_images), batch_size)
+
+    def generate():
+        # 同步產生器由 StreamingResponse 放在執行緒池中迭代，不會阻塞事件迴圈
+        for entry in iter_batch_analysis_v2(named_images, model_config=parsed_config, batch_size=batch_size):
+            yield json.dumps(entry, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.get("/available-models")
 async def get_models() -> Dict[str, Any]:
     """
@@ -99,37 +324,18 @@ async def get_models() -> Dict[str, Any]:
         result = {
             "available_models": available_models,
             "descriptions": model_descriptions,
-            "recommended_configs": {
-                "balanced": {
-                    "detection": "yolov5n",
-                    "segmentation": "mobilesam", 
-                    "depth": "dpt_swinv2_tiny",
-                    "description": "平衡配置 - 速度與準確度的最佳平衡"
-                },
-                "speed_optimized": {
-                    "detection": "yolov5n",
-                    "segmentation": "slimsam",
-                    "depth": "mininet",
-                    "description": "速度優化 - 極致輕量化，適合資源受限環境"
-                },
-                "accuracy_optimized": {
-                    "detection": "yolov8n",
-                    "segmentation": "efficientvit_sam",
-                    "depth": "dpt_large",
-                    "description": "準確度優化 - 更高準確度，但需要更多資源"
-                }
-            }
+            "recommended_configs": RECOMMENDED_CONFIGS
         }
         
         return JSONResponse(content=result)
         
     except Exception as e:
-        logger.error(f"獲取可用模型失敗: {str(e)}")
+        logger.error("獲取可用模型失敗: %s", str(e))
         raise HTTPException(status_code=500, detail=f"獲取模型列表失敗: {str(e)}")
 
 @router.post("/test-model-config")
 async def test_model_config(
-    model_config: str = Form(...)  # JSON 字符串格式的模型配置
+    model_config_json: str = Form(..., alias="model_config")  # JSON 字符串格式的模型配置
 ) -> Dict[str, Any]:
     """
     測試指定的模型配置
@@ -142,7 +348,7 @@ async def test_model_config(
     """
     try:
         import json
-        parsed_config = json.loads(model_config)
+        parsed_config = json.loads(model_config_json)
         
         # 創建測試圖片
         test_image = Image.fromarray(np.random.randint(0, 255, (512, 512, 3), dtype=np.uint8))
@@ -164,9 +370,19 @@ async def test_model_config(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="模型配置 JSON 格式錯誤")
     except Exception as e:
-        logger.error(f"模型配置測試失敗: {str(e)}")
+        logger.error("模型配置測試失敗: %s", str(e))
         raise HTTPException(status_code=500, detail=f"測試失敗: {str(e)}")
 
+@router.get("/cascade/stats")
+async def cascade_stats() -> Dict[str, Any]:
+    """
+    串接模式的統計
+
+    Returns:
+        設定值、快速路徑 (fast) 與完整流程 (full) 的分析數，以及快速路徑所佔比例
+    """
+    return get_cascade_stats()
+
 @router.get("/model-info")
 async def get_current_model_info() -> Dict[str, Any]:
     """
@@ -181,103 +397,76 @@ async def get_current_model_info() -> Dict[str, Any]:
         
         result = {
             "current_config": model_info,
+            "cold_start_timings": get_cold_start_timings(),
+            "adaptive_scheduler": scheduler.snapshot(),
             "timestamp": "2024-01-01T00:00:00Z"  # 可以添加實際時間戳
         }
         
         return JSONResponse(content=result)
         
     except Exception as e:
-        logger.error(f"獲取模型資訊失敗: {str(e)}")
+        logger.error("獲取模型資訊失敗: %s", str(e))
         raise HTTPException(status_code=500, detail=f"獲取模型資訊失敗: {str(e)}")
 
 @router.post("/compare-models")
 async def compare_models(
     image: UploadFile = File(...),
-    configs: str = Form(...)  # JSON 數組格式的模型配置列表
+    configs: str = Form(...),  # JSON 數組格式的模型配置列表
+    repetitions: int = Form(default=5),  # 每組配置計入統計的重複次數
+    max_parallel: Optional[int] = Form(default=None)  # 同時執行的配置數上限
 ) -> Dict[str, Any]:
     """
     比較不同模型配置的性能
     
+    各配置在 CPU 配額內同時執行，共用同一張已解碼的圖片與已載入的子模型，
+    每組重複執行 repetitions 次（另有一次暖機），回報各階段延遲的 p50 / p95。
+    
     Args:
         image: 上傳的圖片文件
         configs: 模型配置列表的 JSON 字符串，例如：
             '[{"detection": "yolov5n", "segmentation": "mobilesam", "depth": "dpt_swinv2_tiny"}, 
               {"detection": "yolov8n", "segmentation": "slimsam", "depth": "mininet"}]'
+        repetitions: 重複次數
+        max_parallel: 同時執行的配置數上限
     
     Returns:
         比較結果
     """
     try:
-        import json
-        import time
-        
         # 驗證圖片格式
         if not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="只支持圖片文件")
+        if repetitions < 1 or repetitions > MAX_COMPARE_REPETITIONS:
+            raise HTTPException(status_code=400, detail=f"repetitions 必須介於 1 到 {MAX_COMPARE_REPETITIONS}")
         
-        # 讀取圖片
+        # 讀取並解碼一次圖片，所有配置共用
         image_bytes = await image.read()
-        image_pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        image_pil = decode_image(image_bytes)
         
         # 解析配置列表
         parsed_configs = json.loads(configs)
         if not isinstance(parsed_configs, list):
             raise HTTPException(status_code=400, detail="配置必須是數組格式")
         
-        comparison_results = []
-        
-        for i, config in enumerate(parsed_configs):
-            try:
-                start_time = time.time()
-                
-                # 創建服務
-                service = WeightEstimationServiceV2(config)
-                
-                # 測試性能
-                performance = service.test_model_performance(image_pil)
-                
-                # 進行食物分析
-                result = await estimate_food_weight_v2(
-                    image_bytes=image_bytes,
-                    model_config=config,
-                    debug=False
-                )
-                
-                end_time = time.time()
-                total_time = end_time - start_time
-                
-                comparison_results.append({
-                    "config_index": i,
-                    "config": config,
-                    "performance": performance,
-                    "analysis_result": {
-                        "detected_foods_count": len(result.get("detected_foods", [])),
-                        "total_weight": result.get("total_estimated_weight", 0),
-                        "has_reference_object": result.get("reference_object") is not None
-                    },
-                    "total_time": total_time,
-                    "status": "success"
-                })
-                
-            except Exception as e:
-                comparison_results.append({
-                    "config_index": i,
-                    "config": config,
-                    "error": str(e),
-                    "status": "failed"
-                })
+        # 比較在執行緒池中進行，不阻塞事件迴圈
+        comparison_results = await run_in_threadpool(
+            compare_model_configs, image_pil, image_bytes, parsed_configs, repetitions, max_parallel
+        )
         
         return JSONResponse(content={
             "comparison_results": comparison_results,
             "summary": {
                 "total_configs": len(parsed_configs),
                 "successful_configs": len([r for r in comparison_results if r["status"] == "success"]),
-                "failed_configs": len([r for r in comparison_results if r["status"] == "failed"])
+                "failed_configs": len([r for r in comparison_results if r["status"] == "failed"]),
+                "repetitions": repetitions
             }
         })
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="配置 JSON 格式錯誤")
     except Exception as e:
-        logger.error(f"模型比較失敗: {str(e)}")
+        logger.error("模型比較失敗: %s", str(e))
         raise HTTPException(status_code=500, detail=f"比較失敗: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,78 @@
+# 檔案路徑: app/routers/job_router.py
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import json
+import logging
+from typing import Dict, Any, Optional
+
+from ..services.analysis_job_service import (
+    get_job_queue, job_to_dict, ANALYSIS_JOB_MAX_IMAGE_BYTES, PRIORITY_LANES
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ai/jobs", tags=["AI Analysis Jobs"])
+
+@router.post("", status_code=202)
+async def submit_analysis_job(
+    image: UploadFile = File(...),
+    model_config_json: Optional[str] = Form(default=None, alias="model_config"),
+    priority: str = Form(default="interactive"),  # interactive 或 batch
+    callback_url: Optional[str] = Form(default=None),  # 完成後 POST 結果的本機網址
+    debug: bool = Form(default=False)
+) -> Dict[str, Any]:
+    """
+    提交食物分析任務，立即回傳任務 ID
+
+    任務由背景 worker 執行 V2 分析流程；互動式任務優先於批次任務。
+    可輪詢 GET /ai/jobs/{job_id}，或提供 callback_url 於完成時接收結果。
+    圖片超過 ANALYSIS_JOB_MAX_IMAGE_BYTES 時回傳 400。
+    """
+    job_queue = get_job_queue()
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="分析任務佇列尚未啟動")
+
+    if not image.content_type or not image.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="只支持圖片文件")
+    if priority not in PRIORITY_LANES:
+        raise HTTPException(status_code=400, detail=f"priority 必須是 {list(PRIORITY_LANES)} 之一")
+
+    parsed_config = None
+    if model_config_json:
+        try:
+            parsed_config = json.loads(model_config_json)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="模型配置 JSON 格式錯誤")
+
+    # 最多讀取上限加一個位元組，超過上限的圖片不必整個讀入記憶體
+    image_bytes = await image.read(ANALYSIS_JOB_MAX_IMAGE_BYTES + 1)
+    if len(image_bytes) > ANALYSIS_JOB_MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail=f"圖片超過大小上限 {ANALYSIS_JOB_MAX_IMAGE_BYTES} 位元組")
+    try:
+        # 寫入圖片檔與資料庫會阻塞，在執行緒池中進行
+        job = await run_in_threadpool(
+            job_queue.submit, image_bytes, parsed_config, priority=priority, callback_url=callback_url, debug=debug
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(status_code=202, content={
+        "job_id": job.id,
+        "status": job.status,
+        "priority": job.priority,
+        "poll_url": f"/ai/jobs/{job.id}"
+    })
+
+@router.get("/{job_id}")
+async def get_analysis_job(job_id: str) -> Dict[str, Any]:
+    """查詢分析任務的狀態與結果"""
+    job_queue = get_job_queue()
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="分析任務佇列尚未啟動")
+
+    job = await run_in_threadpool(job_queue.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"找不到分析任務 {job_id}")
+    return job_to_dict(job)
@@ -1,19 +1,31 @@
 import logging
 from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, Any
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List
 
 from app.services.nutrition_api_service import fetch_nutrition_data
+from app.services.nutrition_search_service import search_nutrition
+from app.services.food_suggest_service import suggest_foods
+from app.services.nutrition_batch_service import NUTRITION_BATCH_MAX_ITEMS, lookup_nutrition_batch
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+
+class NutritionBatchRequest(BaseModel):
+    food_names: List[str] = Field(..., min_length=1, max_length=NUTRITION_BATCH_MAX_ITEMS)
+
+
 @router.get("/lookup", response_model=Dict[str, Any])
 async def lookup_nutrition(food_name: str = Query(..., min_length=1, description="要查詢的食物名稱")):
     """
     根據食物名稱查詢其每 100g 的營養資訊。
+    優先使用本地資料庫的全文檢索結果，本地找不到時才查詢 USDA API。
     """
-    logger.info(f"收到手動營養查詢請求：{food_name}")
-    nutrition_info = fetch_nutrition_data(food_name)
+    logger.info("收到手動營養查詢請求：%s", food_name)
+    # 在 threadpool 中執行，避免阻塞事件迴圈，也讓相同名稱的並行查詢能合併
+    nutrition_info = await run_in_threadpool(fetch_nutrition_data, food_name)
     
     if nutrition_info is None:
         raise HTTPException(
@@ -27,4 +39,38 @@ async def lookup_nutrition(food_name: str = Query(..., min_length=1, description
             detail=f"查詢 '{food_name}' 營養資訊時發生問題。可能是暫時的網路錯誤或 API 請求次數達到上限。"
         )
 
-    return nutrition_info 
\ No newline at end of file
+    return nutrition_info 
+
+
+@router.get("/search", response_model=List[Dict[str, Any]])
+def search_local_nutrition(
+    q: str = Query(..., min_length=1, description="食物名稱或關鍵字"),
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    """
+    依相關度列出本地營養資料庫中符合的食物（每 100g 的營養資訊）。
+    SQLite 查詢會阻塞，以一般函數定義讓 FastAPI 在執行緒池中執行。
+    """
+    return search_nutrition(q, limit=limit)
+
+
+@router.get("/suggest", response_model=List[Dict[str, Any]])
+def suggest_food_names(
+    q: str = Query(..., min_length=1, description="已輸入的食物名稱前綴（英文或中文）"),
+    limit: int = Query(default=8, ge=1, le=20)
+):
+    """
+    食物名稱自動完成：回傳以輸入開頭的英文名稱、中文名稱或別名，
+    以及名稱中間有單字以輸入開頭的食物。
+    """
+    return suggest_foods(q, limit=limit)
+
+
+@router.post("/batch", response_model=Dict[str, Any])
+async def lookup_nutrition_in_batch(request: NutritionBatchRequest):
+    """
+    批次查詢多種食物每 100g 的營養資訊。
+    名稱會去除重複；本地完全相符的食物以一次查詢取得，其餘以有上限的並行數查詢。
+    回傳以輸入名稱為鍵的結果，每筆的 status 為 ok、not_found 或 error（空白名稱為 error）。
+    """
+    return await lookup_nutrition_batch(request.food_names)
@@ -0,0 +1,311 @@
+# 檔案路徑: app/runtime_config.py
+
+"""
+執行期資源配置
+
+多個 uvicorn worker 各自載入 torch 時，每個行程預設都會使用全部 CPU 核心，
+同時推論時會互相搶核心。這裡透過環境變數統一設定：
+
+- TORCH_NUM_THREADS:     torch intra-op 執行緒數（預設為 CPU 核心數 / worker 數）
+- TORCH_INTEROP_THREADS: torch inter-op 執行緒數（預設 1）
+- OPENCV_NUM_THREADS:    OpenCV 執行緒數（預設與 TORCH_NUM_THREADS 相同）
+- CPU_AFFINITY:          "auto" 依 worker 編號平均切分核心，或明確的核心列表如 "0-3,8"；未設定則不綁定
+- WEB_CONCURRENCY:       uvicorn worker 數量（由 start_server.py 使用）
+- WORKER_INDEX:          手動指定 worker 編號；未設定時自動搶佔一個空閒的編號
+"""
+
+import os
+import sys
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# worker 編號鎖檔目錄，用於多個 worker 間分配唯一編號
+WORKER_SLOT_DIR = "/tmp/health_assistant_data/worker_slots"
+
+# 保持鎖檔開啟，行程結束時由作業系統自動釋放
+_slot_handle = None
+_worker_index: Optional[int] = None
+
+# 目前 worker 的設定，以及已套用執行緒設定的函式庫
+_runtime_settings: Optional[Dict[str, Any]] = None
+_applied_libraries = set()
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    """讀取整數環境變數，格式錯誤時回退到預設值"""
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("環境變數 %s=%r 不是整數，使用預設值 %s", name, value, default)
+        return default
+
+
+def get_cpu_count() -> int:
+    """取得目前行程可使用的 CPU 核心數"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_worker_count() -> int:
+    """取得 uvicorn worker 數量"""
+    return max(1, _env_int("WEB_CONCURRENCY", 1))
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """
+    解析核心列表字串
+
+    Args:
+        spec: 例如 "0-3,8,10-11"
+
+    Returns:
+        排序後的核心編號列表
+    """
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def claim_worker_index(worker_count: int) -> int:
+    """
+    取得目前 worker 的編號
+
+    uvicorn 不會告訴 worker 自己的編號，因此在 WORKER_SLOT_DIR 中以檔案鎖搶佔
+    第一個空閒的編號；行程結束時鎖自動釋放，重啟的 worker 可以接手同一個編號。
+    """
+    global _slot_handle, _worker_index
+
+    if _worker_index is not None:
+        return _worker_index
+
+    explicit = _env_int("WORKER_INDEX")
+    if explicit is not None:
+        _worker_index = explicit
+        return _worker_index
+
+    try:
+        import fcntl
+    except ImportError:
+        # 非 POSIX 平台無法使用檔案鎖，以 pid 分配
+        _worker_index = os.getpid() % worker_count
+        return _worker_index
+
+    os.makedirs(WORKER_SLOT_DIR, exist_ok=True)
+    for index in range(worker_count):
+        handle = open(os.path.join(WORKER_SLOT_DIR, f"slot_{index}.lock"), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_handle = handle
+        _worker_index = index
+        return _worker_index
+
+    # 所有編號都被佔用（例如 worker 數量設定與實際不符），以 pid 分配
+    _worker_index = os.getpid() % worker_count
+    return _worker_index
+
+
+def resolve_runtime_settings(worker_index: Optional[int] = None) -> Dict[str, Any]:
+    """
+    根據環境變數計算目前 worker 應使用的執行緒與核心設定
+
+    Args:
+        worker_index: worker 編號；未提供時自動取得
+
+    Returns:
+        設定字典
+    """
+    cpu_count = get_cpu_count()
+    worker_count = get_worker_count()
+    if worker_index is None:
+        worker_index = claim_worker_index(worker_count)
+
+    affinity_spec = os.getenv("CPU_AFFINITY", "").strip()
+    affinity: Optional[List[int]] = None
+    if affinity_spec.lower() == "auto":
+        # 依 worker 編號將可用核心平均切分
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(cpu_count))
+        per_worker = max(1, len(available) // worker_count)
+        start = (worker_index % worker_count) * per_worker
+        affinity = available[start:start + per_worker] or available
+    elif affinity_spec:
+        try:
+            affinity = parse_cpu_list(affinity_spec)
+        except ValueError:
+            logger.warning("無法解析 CPU_AFFINITY=%r，不進行核心綁定", affinity_spec)
+
+    usable_cpus = len(affinity) if affinity else max(1, cpu_count // worker_count)
+    torch_threads = _env_int("TORCH_NUM_THREADS", usable_cpus)
+    interop_threads = _env_int("TORCH_INTEROP_THREADS", 1)
+    opencv_threads = _env_int("OPENCV_NUM_THREADS", torch_threads)
+
+    return {
+        "worker_index": worker_index,
+        "worker_count": worker_count,
+        "cpu_count": cpu_count,
+        "cpu_affinity": affinity,
+        "torch_num_threads": max(1, torch_threads),
+        "torch_interop_threads": max(1, interop_threads),
+        "opencv_num_threads": max(0, opencv_threads),
+    }
+
+
+def apply_runtime_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    套用執行緒與核心設定，並回傳實際生效的設定
+
+    torch 與 cv2 只在已被匯入時才設定，避免啟動時就付出匯入成本；
+    尚未匯入時由 apply_ml_thread_settings() 在第一次載入模型時補上。
+    """
+    global _runtime_settings
+    _runtime_settings = settings
+
+    effective: Dict[str, Any] = {
+        "worker_index": settings["worker_index"],
+        "worker_count": settings["worker_count"],
+        "pid": os.getpid(),
+    }
+
+    # OpenMP / MKL 在第一次使用時讀取這些變數，須在 torch 執行運算前設定
+    os.environ.setdefault("OMP_NUM_THREADS", str(settings["torch_num_threads"]))
+    os.environ.setdefault("MKL_NUM_THREADS", str(settings["torch_num_threads"]))
+
+    if settings["cpu_affinity"] and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, settings["cpu_affinity"])
+        except OSError as e:
+            logger.warning("設定 CPU 綁定失敗: %s", e)
+    if hasattr(os, "sched_getaffinity"):
+        effective["cpu_affinity"] = sorted(os.sched_getaffinity(0))
+
+    effective.update(_apply_loaded_library_settings(settings))
+    return effective
+
+
+def _apply_loaded_library_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """設定已匯入的 torch / cv2 執行緒數，尚未匯入的標記為 deferred"""
+    effective: Dict[str, Any] = {}
+
+    torch = sys.modules.get("torch")
+    if torch is not None and "torch" not in _applied_libraries:
+        torch.set_num_threads(settings["torch_num_threads"])
+        try:
+            torch.set_interop_threads(settings["torch_interop_threads"])
+        except RuntimeError:
+            # inter-op 執行緒池一旦啟動就無法再調整
+            logger.warning("torch inter-op 執行緒池已啟動，無法調整 TORCH_INTEROP_THREADS")
+        _applied_libraries.add("torch")
+    if torch is not None:
+        effective["torch_num_threads"] = torch.get_num_threads()
+        effective["torch_interop_threads"] = torch.get_num_interop_threads()
+    else:
+        effective["torch_num_threads"] = "deferred"
+        effective["torch_interop_threads"] = "deferred"
+
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None and "cv2" not in _applied_libraries:
+        cv2.setNumThreads(settings["opencv_num_threads"])
+        _applied_libraries.add("cv2")
+    effective["opencv_num_threads"] = cv2.getNumThreads() if cv2 is not None else "deferred"
+
+    return effective
+
+
+def apply_ml_thread_settings():
+    """
+    在第一次載入模型時（torch / cv2 已匯入後）套用執行緒設定
+
+    可重複呼叫，每個函式庫只會設定一次。
+    """
+    if _runtime_settings is None:
+        return
+    pending = {"torch", "cv2"} - _applied_libraries
+    if not any(name in sys.modules for name in pending):
+        return
+    effective = _apply_loaded_library_settings(_runtime_settings)
+    logger.info("已套用模型執行緒設定 (worker %s): %s", _runtime_settings['worker_index'], effective)
+
+
+def _usable_cpus() -> int:
+    settings = _runtime_settings or {}
+    if settings.get("cpu_affinity"):
+        return len(settings["cpu_affinity"])
+    return max(1, get_cpu_count() // get_worker_count())
+
+
+def split_inference_budget(tasks: int) -> Tuple[int, int]:
+    """
+    將目前 worker 的 CPU 配額分給 tasks 個同時執行的推論
+
+    明確設定 TORCH_NUM_THREADS 時，每個推論使用該執行緒數，同時執行數乘上執行緒數不超過可用核心數；
+    未設定時（預設每個推論使用全部核心）依任務數切分：同時執行 min(tasks, 核心數) 個，
+    每個推論使用 核心數 // 同時執行數 個執行緒。
+
+    Returns:
+        (同時執行數, 每個推論的 torch 執行緒數)
+    """
+    usable_cpus = _usable_cpus()
+    explicit = _env_int("TORCH_NUM_THREADS")
+    if explicit:
+        threads = max(1, min(explicit, usable_cpus))
+        return max(1, min(tasks, usable_cpus // threads)), threads
+    parallelism = max(1, min(tasks, usable_cpus))
+    return parallelism, max(1, usable_cpus // parallelism)
+
+
+# inference_threads 進入的次數與進入前的 torch 執行緒數
+_thread_budget_lock = threading.Lock()
+_thread_budget_users = 0
+_thread_budget_previous: Optional[int] = None
+
+
+@contextmanager
+def inference_threads(threads: int):
+    """
+    在區塊內將 torch intra-op 執行緒數限制為 threads，最後一個離開的區塊恢復原本的設定
+
+    torch 的執行緒數是行程層級的設定，同時執行的區塊應使用相同的 threads；尚未匯入 torch 時不做任何事。
+    """
+    global _thread_budget_users, _thread_budget_previous
+    torch = sys.modules.get("torch")
+    if torch is None:
+        yield
+        return
+    with _thread_budget_lock:
+        if _thread_budget_users == 0:
+            _thread_budget_previous = torch.get_num_threads()
+            torch.set_num_threads(threads)
+        _thread_budget_users += 1
+    try:
+        yield
+    finally:
+        with _thread_budget_lock:
+            _thread_budget_users -= 1
+            if _thread_budget_users == 0:
+                torch.set_num_threads(_thread_budget_previous)
+
+
+def configure_runtime(worker_index: Optional[int] = None) -> Dict[str, Any]:
+    """計算並套用目前 worker 的執行期設定，記錄實際生效的值"""
+    settings = resolve_runtime_settings(worker_index)
+    effective = apply_runtime_settings(settings)
+    logger.info("執行期設定 (worker %s/%s): %s", effective['worker_index'], effective['worker_count'], effective)
+    return effective
@@ -1,5 +1,11 @@
 # This file makes the services directory a Python package
-# Import the HybridFoodAnalyzer class to make it available when importing from app.services
-from .food_analyzer_service import HybridFoodAnalyzer
+# HybridFoodAnalyzer is imported lazily so that importing app.services does not pull in torch
 
 __all__ = ['HybridFoodAnalyzer']
+
+
+def __getattr__(name):
+    if name == 'HybridFoodAnalyzer':
+        from .food_analyzer_service import HybridFoodAnalyzer
+        return HybridFoodAnalyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,146 @@
+# 檔案路徑: app/services/adaptive_scheduler.py
+
+"""
+依負載自動切換預設模型配置
+
+用戶端未指定 model_config 時，預設使用 balanced 配置。負載升高時（推論佇列過長或
+最近分析的 p95 延遲過高）自動改用 speed_optimized，負載降低後再恢復 balanced。
+
+為避免在門檻附近來回切換（hysteresis）：
+    - 降級與恢復使用不同的門檻，恢復需佇列深度與 p95 同時低於較低的門檻
+    - 每次切換後至少維持 ADAPTIVE_MIN_HOLD_SECONDS 秒
+    - 切換後清空延遲樣本，p95 只以目前配置的延遲計算，樣本數不足時只看佇列深度
+
+設定：
+    ADAPTIVE_SCHEDULER_ENABLED: 是否啟用（預設 false）
+    ADAPTIVE_QUEUE_HIGH / ADAPTIVE_QUEUE_LOW: 降級 / 恢復的佇列深度門檻（預設 8 / 2）
+    ADAPTIVE_P95_HIGH_SECONDS / ADAPTIVE_P95_LOW_SECONDS: 降級 / 恢復的 p95 門檻（預設 6 / 3 秒）
+    ADAPTIVE_WINDOW: 計算 p95 的最近樣本數（預設 50）
+    ADAPTIVE_MIN_SAMPLES: 計算 p95 所需的最少樣本數（預設 10）
+    ADAPTIVE_MIN_HOLD_SECONDS: 兩次切換的最短間隔（預設 30 秒）
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from ..metrics import CONFIG_SWITCHES
+from .lightweight_model_service import get_recommended_config
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_SCHEDULER_ENABLED = os.getenv("ADAPTIVE_SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+ADAPTIVE_QUEUE_HIGH = int(os.getenv("ADAPTIVE_QUEUE_HIGH", "8"))
+ADAPTIVE_QUEUE_LOW = int(os.getenv("ADAPTIVE_QUEUE_LOW", "2"))
+ADAPTIVE_P95_HIGH_SECONDS = float(os.getenv("ADAPTIVE_P95_HIGH_SECONDS", "6"))
+ADAPTIVE_P95_LOW_SECONDS = float(os.getenv("ADAPTIVE_P95_LOW_SECONDS", "3"))
+ADAPTIVE_WINDOW = int(os.getenv("ADAPTIVE_WINDOW", "50"))
+ADAPTIVE_MIN_SAMPLES = int(os.getenv("ADAPTIVE_MIN_SAMPLES", "10"))
+ADAPTIVE_MIN_HOLD_SECONDS = float(os.getenv("ADAPTIVE_MIN_HOLD_SECONDS", "30"))
+
+NORMAL_CONFIG = "balanced"
+DEGRADED_CONFIG = "speed_optimized"
+
+
+class AdaptiveScheduler:
+    """依佇列深度與 p95 延遲在 balanced 與 speed_optimized 之間切換"""
+
+    def __init__(self,
+                 enabled: bool = ADAPTIVE_SCHEDULER_ENABLED,
+                 queue_high: int = ADAPTIVE_QUEUE_HIGH,
+                 queue_low: int = ADAPTIVE_QUEUE_LOW,
+                 p95_high: float = ADAPTIVE_P95_HIGH_SECONDS,
+                 p95_low: float = ADAPTIVE_P95_LOW_SECONDS,
+                 window: int = ADAPTIVE_WINDOW,
+                 min_samples: int = ADAPTIVE_MIN_SAMPLES,
+                 min_hold: float = ADAPTIVE_MIN_HOLD_SECONDS):
+        self.enabled = enabled
+        self.queue_high, self.queue_low = queue_high, min(queue_low, queue_high)
+        self.p95_high, self.p95_low = p95_high, min(p95_low, p95_high)
+        self.min_samples = max(1, min_samples)
+        self.min_hold = min_hold
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=max(1, window))
+        self._current = NORMAL_CONFIG
+        self._switched_at = float("-inf")
+        self._last_queue_depth = 0
+
+    @property
+    def current(self) -> str:
+        return self._current
+
+    def record_latency(self, seconds: float):
+        """記錄一次以排程配置完成的分析耗時"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _p95(self) -> Optional[float]:
+        if len(self._latencies) < self.min_samples:
+            return None
+        return float(np.percentile(np.fromiter(self._latencies, dtype=float), 95))
+
+    def select(self, queue_depth: int) -> Tuple[str, Optional[Dict[str, str]]]:
+        """
+        依目前負載選擇配置
+
+        Returns:
+            (配置名稱, 模型配置)；balanced 的模型配置為 None，即使用預設服務實例
+        """
+        if not self.enabled:
+            return NORMAL_CONFIG, None
+        with self._lock:
+            self._last_queue_depth = queue_depth
+            now = time.monotonic()
+            if now - self._switched_at >= self.min_hold:
+                p95 = self._p95()
+                if self._current == NORMAL_CONFIG:
+                    if queue_depth >= self.queue_high or (p95 is not None and p95 >= self.p95_high):
+                        self._switch(DEGRADED_CONFIG, now, queue_depth, p95)
+                elif queue_depth <= self.queue_low and (p95 is None or p95 <= self.p95_low):
+                    self._switch(NORMAL_CONFIG, now, queue_depth, p95)
+            name = self._current
+        return name, (None if name == NORMAL_CONFIG else get_recommended_config(name))
+
+    def _switch(self, name: str, now: float, queue_depth: int, p95: Optional[float]):
+        logger.warning("負載排程: %s → %s (佇列深度 %s, p95 %s)", self._current, name, queue_depth,
+                       "n/a" if p95 is None else f"{p95:.2f}s")
+        self._current = name
+        self._switched_at = now
+        # 新配置的延遲分布不同，重新累積樣本
+        self._latencies.clear()
+        CONFIG_SWITCHES.inc(config=name)
+
+    def reset(self):
+        """恢復 balanced 並清除樣本"""
+        with self._lock:
+            self._current = NORMAL_CONFIG
+            self._switched_at = float("-inf")
+            self._latencies.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前的配置、負載與門檻，供健康檢查與 /ai/v2/model-info 使用"""
+        with self._lock:
+            p95 = self._p95()
+            return {
+                "enabled": self.enabled,
+                "selected_config": self._current,
+                "queue_depth": self._last_queue_depth,
+                "p95_seconds": None if p95 is None else round(p95, 3),
+                "samples": len(self._latencies),
+                "thresholds": {
+                    "queue_high": self.queue_high, "queue_low": self.queue_low,
+                    "p95_high_seconds": self.p95_high, "p95_low_seconds": self.p95_low,
+                    "min_hold_seconds": self.min_hold,
+                },
+            }
+
+
+# 全域排程器
+scheduler = AdaptiveScheduler()
+
+__all__ = ["AdaptiveScheduler", "scheduler", "NORMAL_CONFIG", "DEGRADED_CONFIG"]
@@ -1,16 +1,20 @@
 # 檔案路徑: backend/app/services/ai_service.py
 
-from transformers.pipelines import pipeline
-from transformers.models.auto.modeling_auto import AutoModelForImageClassification
-from transformers.models.auto.image_processing_auto import AutoImageProcessor
 from PIL import Image
+import hashlib
 import io
 import logging
+from typing import List, Tuple
+
+from .model_cache import load_pretrained, load_processor
+from ..cache import get_cache
+from ..metrics import timed_stage
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 食物分類模型
+CLASSIFIER_MODEL_ID = "juliensimon/autotrain-food101-1471154053"
+
 # 全局變量
 image_classifier = None
 
@@ -18,16 +22,15 @@ def load_model():
     """載入模型的函數"""
     global image_classifier
     try:
+        # transformers 匯入成本高，延遲到第一次載入模型時才匯入
+        from transformers.pipelines import pipeline
+        from transformers.models.auto.modeling_auto import AutoModelForImageClassification
+        from transformers.models.auto.image_processing_auto import AutoImageProcessor
+
         logger.info("正在載入食物辨識模型...")
-        # 先載入 model 和 processor，分別傳入 cache_dir
-        model = AutoModelForImageClassification.from_pretrained(
-            "juliensimon/autotrain-food101-1471154053",
-            cache_dir="/tmp/huggingface"
-        )
-        processor = AutoImageProcessor.from_pretrained(
-            "juliensimon/autotrain-food101-1471154053",
-            cache_dir="/tmp/huggingface"
-        )
+        # 先載入 model 和 processor，權重第一次下載後轉存為本地 safetensors 快取
+        model = load_pretrained(AutoModelForImageClassification, CLASSIFIER_MODEL_ID)
+        processor = load_processor(AutoImageProcessor, CLASSIFIER_MODEL_ID)
         image_classifier = pipeline(
             "image-classification",
             model=model,
@@ -37,30 +40,69 @@ def load_model():
         logger.info("模型載入成功！")
         return True
     except Exception as e:
-        logger.error(f"模型載入失敗: {str(e)}")
+        logger.error("模型載入失敗: %s", str(e))
         image_classifier = None
         return False
 
+def _top_prediction(pipeline_output) -> Tuple[str, float]:
+    """將單張圖片的分類管線輸出轉為 (食物名稱, 信心度)"""
+    # 處理輸出結果
+    if not pipeline_output:
+        return "Unknown", 0.0
+    
+    # pipeline_output 通常是一個列表
+    if isinstance(pipeline_output, list) and len(pipeline_output) > 0:
+        result = pipeline_output[0]
+        if isinstance(result, dict) and 'label' in result:
+            label = result['label']
+            confidence = float(result.get('score', 0))
+            
+            logger.debug("辨識結果: %s, 信心度: %.2f", label, confidence)
+            
+            # 標籤可能包含底線，我們將其替換為空格，並讓首字母大寫
+            formatted_label = str(label).replace('_', ' ').title()
+            return formatted_label, confidence
+        
+    return "Unknown", 0.0
+
+def _format_pipeline_output(pipeline_output) -> str:
+    """將單張圖片的分類管線輸出轉為食物名稱"""
+    return _top_prediction(pipeline_output)[0]
+
 def classify_food_image(image_bytes: bytes) -> str:
     """
     接收圖片的二進位制數據，進行分類並返回可能性最高的食物名稱。
     """
+    return classify_food_image_with_score(image_bytes)[0]
+
+@timed_stage("classification")
+def classify_food_image_with_score(image_bytes: bytes) -> Tuple[str, float]:
+    """
+    分類圖片並回傳 (可能性最高的食物名稱, 信心度)；失敗時名稱為 "Error: ..."，信心度為 0
+    """
     global image_classifier
     
     # 如果模型未載入，嘗試重新載入
     if image_classifier is None:
         logger.warning("模型未載入，嘗試重新載入...")
         if not load_model():
-            return "Error: Model not loaded"
+            return "Error: Model not loaded", 0.0
     
     if image_classifier is None:
-        return "Error: Model could not be loaded"
+        return "Error: Model could not be loaded", 0.0
 
     try:
         # 驗證圖片數據
         if not image_bytes:
-            return "Error: Empty image data"
+            return "Error: Empty image data", 0.0
         
+        # 相同圖片（例如重試或多個節點收到同一張照片）直接使用共享快取的分類結果
+        cache = get_cache("classification")
+        cache_key = f"{CLASSIFIER_MODEL_ID}:{hashlib.sha256(image_bytes).hexdigest()}"
+        cached = cache.get(cache_key)
+        if isinstance(cached, list) and len(cached) == 2:
+            return cached[0], cached[1]
+
         # 從記憶體中的 bytes 打開圖片
         image = Image.open(io.BytesIO(image_bytes))
         
@@ -68,37 +110,69 @@ def classify_food_image(image_bytes: bytes) -> str:
         if image.mode != 'RGB':
             image = image.convert('RGB')
         
-        logger.info(f"處理圖片，尺寸: {image.size}")
+        logger.debug("處理圖片，尺寸: %s", image.size)
         
         # 使用模型管線進行分類
         pipeline_output = image_classifier(image)
         
-        logger.info(f"模型輸出: {pipeline_output}")
+        logger.debug("模型輸出: %s", pipeline_output)
         
-        # 處理輸出結果
-        if not pipeline_output:
-            return "Unknown"
-        
-        # pipeline_output 通常是一個列表
-        if isinstance(pipeline_output, list) and len(pipeline_output) > 0:
-            result = pipeline_output[0]
-            if isinstance(result, dict) and 'label' in result:
-                label = result['label']
-                confidence = result.get('score', 0)
-                
-                logger.info(f"辨識結果: {label}, 信心度: {confidence:.2f}")
-                
-            # 標籤可能包含底線，我們將其替換為空格，並讓首字母大寫
-                formatted_label = str(label).replace('_', ' ').title()
-                return formatted_label
-            
-        return "Unknown"
+        food_name, confidence = _top_prediction(pipeline_output)
+        if food_name != "Unknown":
+            cache.set(cache_key, [food_name, confidence])
+        return food_name, confidence
         
     except Exception as e:
-        logger.error(f"圖片分類過程中發生錯誤: {str(e)}")
-        return f"Error: {str(e)}"
+        logger.error("圖片分類過程中發生錯誤: %s", str(e))
+        return f"Error: {str(e)}", 0.0
+
+@timed_stage("classification_batch")
+def classify_food_images(images_bytes: List[bytes]) -> List[str]:
+    """
+    批次分類多張圖片，一次前向傳遞處理整批，回傳與輸入順序相同的食物名稱列表。
+    單張圖片無法解碼時，該位置回傳 "Error: ..."。
+    """
+    global image_classifier
+
+    if not images_bytes:
+        return []
+
+    if image_classifier is None:
+        logger.warning("模型未載入，嘗試重新載入...")
+        if not load_model():
+            return ["Error: Model not loaded"] * len(images_bytes)
+
+    results: List[str] = ["Unknown"] * len(images_bytes)
+    images = []
+    positions = []
+    for i, image_bytes in enumerate(images_bytes):
+        if not image_bytes:
+            results[i] = "Error: Empty image data"
+            continue
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            images.append(image)
+            positions.append(i)
+        except Exception as e:
+            results[i] = f"Error: {str(e)}"
+
+    if not images:
+        return results
+
+    try:
+        pipeline_outputs = image_classifier(images, batch_size=len(images))
+        for position, pipeline_output in zip(positions, pipeline_outputs):
+            results[position] = _format_pipeline_output(pipeline_output)
+    except Exception as e:
+        logger.error("批次圖片分類過程中發生錯誤: %s", str(e))
+        for position in positions:
+            results[position] = f"Error: {str(e)}"
+
+    return results
 
 # 延遲初始化 - 不在模塊載入時載入模型
 logger.info("AI 服務模塊已載入，模型將在首次使用時載入")
 
-__all__ = ["classify_food_image", "load_model"]
\ No newline at end of file
+__all__ = ["classify_food_image", "classify_food_images", "load_model"]
\ No newline at end of file
@@ -0,0 +1,392 @@
+# 檔案路徑: app/services/analysis_job_service.py
+
+"""
+非同步食物分析任務佇列
+
+提交分析請求後立即回傳任務 ID，由背景 worker 執行 V2 分析流程，
+任務狀態與結果保存在資料庫中，客戶端可輪詢或接收本機回呼。
+
+多個 web worker 共用同一個資料庫時，排隊與執行中的任務都記錄所屬行程（owner）。
+各行程在啟動時以及每 ANALYSIS_JOB_RECLAIM_SECONDS 秒檢查一次，所屬行程已不存在的任務
+以條件式 UPDATE 改為自己所有並排入佇列，只有一個行程能接手；執行前再以條件式 UPDATE
+（status='queued'）搶佔，同一個任務不會被執行兩次。
+
+設定：
+    ANALYSIS_JOB_WORKERS: 背景 worker 執行緒數（預設 2）
+    ANALYSIS_JOB_MAX_IMAGE_BYTES: 任務圖片大小上限（預設 20 MB）
+    ANALYSIS_JOB_RECLAIM_SECONDS: 接手所屬行程已結束之任務的檢查間隔（預設 60 秒）
+"""
+
+import asyncio
+import io
+import itertools
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from sqlalchemy import inspect, text
+
+from ..database import SessionLocal, DB_DIR, engine
+from ..models.analysis_job import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))
+ANALYSIS_JOB_MAX_IMAGE_BYTES = int(os.getenv("ANALYSIS_JOB_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+ANALYSIS_JOB_RECLAIM_SECONDS = float(os.getenv("ANALYSIS_JOB_RECLAIM_SECONDS", "60"))
+JOB_STORAGE_DIR = os.path.join(DB_DIR, "jobs")
+
+# 優先順序：數字越小越先執行，互動式請求永遠排在批次請求之前
+PRIORITY_LANES = {"interactive": 0, "batch": 1}
+
+# 目前行程的識別，寫入排隊與執行中任務的 owner 欄位
+PROCESS_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# 回呼只允許送往本機
+LOCAL_CALLBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+def validate_callback_url(callback_url: Optional[str]) -> bool:
+    """檢查回呼網址是否為本機 http(s) 網址"""
+    if not callback_url:
+        return True
+    parsed = urlparse(callback_url)
+    return parsed.scheme in ("http", "https") and parsed.hostname in LOCAL_CALLBACK_HOSTS
+
+
+def ensure_job_schema(bind=None):
+    """舊的資料庫沒有 owner 欄位時補上（create_all 不會修改既有資料表）"""
+    bind = bind or engine
+    AnalysisJob.metadata.create_all(bind=bind, tables=[AnalysisJob.__table__])
+    with bind.begin() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("analysis_jobs")}
+        if "owner" not in columns:
+            conn.execute(text("ALTER TABLE analysis_jobs ADD COLUMN owner VARCHAR"))
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """
+    任務所屬的行程是否仍在執行
+
+    只能檢查本機的行程；其他主機的任務一律視為仍在執行，由該主機自行恢復。
+    """
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+def _unchanged(job: AnalysisJob):
+    """條件式 UPDATE 的條件：任務的狀態與 owner 仍與讀取時相同"""
+    owner = AnalysisJob.owner.is_(None) if job.owner is None else AnalysisJob.owner == job.owner
+    return AnalysisJob.id == job.id, AnalysisJob.status == job.status, owner
+
+
+def job_to_dict(job: AnalysisJob) -> Dict[str, Any]:
+    """將任務轉為 API 回應格式"""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "priority": job.priority,
+        "model_config": job.config,
+        "result": job.result,
+        "error": job.error,
+        "callback_url": job.callback_url,
+        "callback_status": job.callback_status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class AnalysisJobQueue:
+    """以優先佇列分派分析任務的背景 worker 池"""
+
+    def __init__(self, num_workers: int = ANALYSIS_JOB_WORKERS,
+                 reclaim_interval: float = ANALYSIS_JOB_RECLAIM_SECONDS):
+        self.num_workers = max(1, num_workers)
+        self.reclaim_interval = reclaim_interval
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()  # 同優先順序內維持先進先出
+        self._threads = []
+        self._reclaim_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._running = False
+
+    def start(self):
+        """啟動 worker 執行緒，重新排入上次未完成的任務，並定期接手所屬行程已結束的任務"""
+        os.makedirs(JOB_STORAGE_DIR, exist_ok=True)
+        ensure_job_schema()
+        self._running = True
+        self._stop_event.clear()
+        self._recover_unfinished_jobs()
+        for index in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"analysis-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.reclaim_interval > 0:
+            self._reclaim_thread = threading.Thread(target=self._reclaim_loop, name="analysis-job-reclaim", daemon=True)
+            self._reclaim_thread.start()
+        logger.info("分析任務佇列已啟動，共 %s 個 worker", self.num_workers)
+
+    def stop(self):
+        """通知 worker 結束（正在執行的任務會先完成）"""
+        self._running = False
+        self._stop_event.set()
+        for _ in self._threads:
+            self._queue.put((len(PRIORITY_LANES), next(self._seq), None))
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._reclaim_thread is not None:
+            self._reclaim_thread.join(timeout=5)
+            self._reclaim_thread = None
+
+    def queue_depth(self) -> int:
+        """等待執行的任務數"""
+        return self._queue.qsize()
+
+    def submit(self,
+               image_bytes: bytes,
+               model_config: Optional[Dict[str, str]] = None,
+               priority: str = "interactive",
+               callback_url: Optional[str] = None,
+               debug: bool = False) -> AnalysisJob:
+        """
+        建立分析任務並排入佇列（寫入圖片檔與資料庫，請在執行緒池中呼叫）
+
+        Args:
+            image_bytes: 圖片位元組
+            model_config: 模型配置
+            priority: "interactive" 或 "batch"
+            callback_url: 任務完成後 POST 結果的本機網址
+            debug: 是否輸出除錯圖片
+
+        Returns:
+            已建立的任務
+        """
+        if priority not in PRIORITY_LANES:
+            raise ValueError(f"未知的優先順序: {priority}")
+        if not validate_callback_url(callback_url):
+            raise ValueError("回呼網址只允許本機 http(s) 位址")
+        if len(image_bytes) > ANALYSIS_JOB_MAX_IMAGE_BYTES:
+            raise ValueError(f"圖片超過大小上限 {ANALYSIS_JOB_MAX_IMAGE_BYTES} 位元組")
+
+        job_id = uuid.uuid4().hex
+        image_path = os.path.join(JOB_STORAGE_DIR, f"{job_id}.img")
+        with open(image_path, "wb") as f:
+            f.write(image_bytes)
+
+        db = SessionLocal()
+        try:
+            job = AnalysisJob(
+                id=job_id,
+                status="queued",
+                owner=PROCESS_OWNER,
+                priority=priority,
+                config=model_config,
+                debug=int(debug),
+                image_path=image_path,
+                callback_url=callback_url,
+                created_at=datetime.utcnow(),
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+        finally:
+            db.close()
+
+        self._queue.put((PRIORITY_LANES[priority], next(self._seq), job_id))
+        logger.info("已建立分析任務 %s (priority=%s)", job_id, priority)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[AnalysisJob]:
+        """查詢任務"""
+        db = SessionLocal()
+        try:
+            return db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        finally:
+            db.close()
+
+    def _recover_unfinished_jobs(self):
+        """
+        接手所屬行程已不存在的排隊中或執行中任務，改為自己所有並排入佇列
+
+        啟動時與每 reclaim_interval 秒執行一次。所屬行程仍在執行的任務（包含自己佇列中的任務）不處理；
+        改為自己所有的 UPDATE 以原本的 owner 為條件，多個行程同時檢查時只有一個能接手。
+        """
+        db = SessionLocal()
+        try:
+            unfinished = (
+                db.query(AnalysisJob)
+                .filter(AnalysisJob.status.in_(["queued", "running"]))
+                .order_by(AnalysisJob.created_at)
+                .all()
+            )
+            recovered = 0
+            for job in unfinished:
+                if owner_alive(job.owner):
+                    continue
+                if not job.image_path or not os.path.exists(job.image_path):
+                    (
+                        db.query(AnalysisJob)
+                        .filter(*_unchanged(job))
+                        .update({"status": "failed", "error": "服務重啟後找不到待分析的圖片",
+                                 "finished_at": datetime.utcnow()}, synchronize_session=False)
+                    )
+                    db.commit()
+                    continue
+                reclaimed = (
+                    db.query(AnalysisJob)
+                    .filter(*_unchanged(job))
+                    .update({"status": "queued", "owner": PROCESS_OWNER}, synchronize_session=False)
+                )
+                db.commit()
+                if reclaimed:
+                    self._queue.put((PRIORITY_LANES.get(job.priority, 1), next(self._seq), job.id))
+                    recovered += 1
+            if recovered:
+                logger.info("已接手 %s 個未完成的分析任務", recovered)
+        finally:
+            db.close()
+
+    def _reclaim_loop(self):
+        while not self._stop_event.wait(self.reclaim_interval):
+            try:
+                self._recover_unfinished_jobs()
+            except Exception as e:
+                logger.warning("接手未完成的分析任務失敗: %s", e)
+
+    def _worker_loop(self):
+        while self._running:
+            _, _, job_id = self._queue.get()
+            if job_id is None:
+                break
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                logger.error("分析任務 %s 執行失敗: %s", job_id, str(e))
+
+    def _update_job(self, job_id: str, **fields) -> Optional[AnalysisJob]:
+        db = SessionLocal()
+        try:
+            job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+            if job is None:
+                return None
+            for key, value in fields.items():
+                setattr(job, key, value)
+            db.commit()
+            db.refresh(job)
+            return job
+        finally:
+            db.close()
+
+    def _claim_job(self, job_id: str) -> Optional[AnalysisJob]:
+        """將排隊中的任務原子地改為執行中；已被其他行程搶佔或不存在時回傳 None"""
+        db = SessionLocal()
+        try:
+            claimed = (
+                db.query(AnalysisJob)
+                .filter(AnalysisJob.id == job_id, AnalysisJob.status == "queued")
+                .update({"status": "running", "owner": PROCESS_OWNER, "started_at": datetime.utcnow()},
+                        synchronize_session=False)
+            )
+            db.commit()
+            if not claimed:
+                return None
+            return db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        finally:
+            db.close()
+
+    def _run_job(self, job_id: str):
+        job = self._claim_job(job_id)
+        if job is None:
+            logger.debug("分析任務 %s 已由其他行程執行，略過", job_id)
+            return
+
+        image_path = job.image_path
+        try:
+            with open(image_path, "rb") as f:
+                image_bytes = f.read()
+            result = run_analysis(image_bytes, job.config, bool(job.debug))
+            job = self._update_job(job_id, status="succeeded", result=result, finished_at=datetime.utcnow())
+        except Exception as e:
+            logger.error("分析任務 %s 失敗: %s", job_id, str(e))
+            job = self._update_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        finally:
+            try:
+                os.remove(image_path)
+            except OSError:
+                pass
+
+        if job is not None and job.callback_url:
+            self._deliver_callback(job)
+
+    def _deliver_callback(self, job: AnalysisJob):
+        """將任務結果 POST 到回呼網址"""
+        try:
+            response = requests.post(job.callback_url, json=job_to_dict(job), timeout=5)
+            response.raise_for_status()
+            self._update_job(job.id, callback_status="delivered")
+        except requests.exceptions.RequestException as e:
+            logger.warning("分析任務 %s 回呼失敗: %s", job.id, e)
+            self._update_job(job.id, callback_status="failed")
+
+
+def run_analysis(image_bytes: bytes,
+                 model_config: Optional[Dict[str, str]] = None,
+                 debug: bool = False) -> Dict[str, Any]:
+    """執行 V2 分析；啟用推論 worker 池時交給獨立行程"""
+    from .inference_worker import get_inference_pool
+
+    pool = get_inference_pool()
+    if pool is not None:
+        import numpy as np
+        from PIL import Image
+        image_array = np.array(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+        return asyncio.run(pool.analyze(image_array, model_config=model_config, debug=debug))
+
+    from .weight_estimation_service_v2 import analyze_food_image_v2
+    return analyze_food_image_v2(image_bytes=image_bytes, model_config=model_config, debug=debug)
+
+
+# 全域任務佇列，於應用啟動時建立
+_job_queue: Optional[AnalysisJobQueue] = None
+
+
+def start_job_queue() -> AnalysisJobQueue:
+    """啟動全域任務佇列"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = AnalysisJobQueue()
+        _job_queue.start()
+    return _job_queue
+
+
+def stop_job_queue():
+    """關閉全域任務佇列"""
+    global _job_queue
+    if _job_queue is not None:
+        _job_queue.stop()
+        _job_queue = None
+
+
+def get_job_queue() -> Optional[AnalysisJobQueue]:
+    """取得全域任務佇列，未啟動時回傳 None"""
+    return _job_queue
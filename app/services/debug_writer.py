@@ -0,0 +1,159 @@
+# 檔案路徑: app/services/debug_writer.py
+
+"""
+背景除錯輸出寫入器
+
+分析流程只把「如何產生檔案」的函數放進有界佇列，圖片編碼與寫檔由背景執行緒完成，
+不佔用請求的處理時間。佇列滿時直接丟棄該筆輸出，不會阻塞請求。
+寫入新的一次分析時，會依保留數量與總大小上限刪除最舊的輸出目錄。
+
+設定：
+    DEBUG_OUTPUT_DIR: 除錯輸出根目錄（預設 debug_output）
+    DEBUG_SAMPLE_RATE: 未要求 debug 的請求中，抽樣輸出除錯檔案的比例（預設 0，例如 0.01 = 1%）
+    DEBUG_QUEUE_SIZE: 待寫入佇列上限（預設 64）
+    DEBUG_MAX_RUNS: 最多保留的分析目錄數（預設 200）
+    DEBUG_MAX_MB: debug_output 總大小上限 MB（預設 500）
+"""
+
+import logging
+import os
+import queue
+import random
+import shutil
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+
+from ..metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+DEBUG_OUTPUT_DIR = os.getenv("DEBUG_OUTPUT_DIR", "debug_output")
+DEBUG_SAMPLE_RATE = float(os.getenv("DEBUG_SAMPLE_RATE", "0"))
+DEBUG_QUEUE_SIZE = int(os.getenv("DEBUG_QUEUE_SIZE", "64"))
+DEBUG_MAX_RUNS = int(os.getenv("DEBUG_MAX_RUNS", "200"))
+DEBUG_MAX_MB = float(os.getenv("DEBUG_MAX_MB", "500"))
+
+DEBUG_ARTIFACTS = Counter(
+    "debug_artifacts_total",
+    "Debug artifacts by outcome (written, dropped or failed).",
+    ["result"],
+)
+
+
+def should_capture(debug: bool) -> bool:
+    """請求明確要求 debug 時一定輸出，否則依 DEBUG_SAMPLE_RATE 抽樣"""
+    return debug or (DEBUG_SAMPLE_RATE > 0 and random.random() < DEBUG_SAMPLE_RATE)
+
+
+class DebugArtifactWriter:
+    """以背景執行緒寫入除錯檔案，並限制 debug_output 的保留量"""
+
+    def __init__(self,
+                 output_dir: str = DEBUG_OUTPUT_DIR,
+                 queue_size: int = DEBUG_QUEUE_SIZE,
+                 max_runs: int = DEBUG_MAX_RUNS,
+                 max_bytes: int = int(DEBUG_MAX_MB * 1024 * 1024)):
+        self.output_dir = output_dir
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_run_dir: Optional[str] = None
+
+    def new_run_dir(self) -> str:
+        """產生本次分析的輸出目錄路徑（由背景執行緒建立）"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(self.output_dir, f"{timestamp}_{uuid.uuid4().hex[:6]}")
+
+    def submit(self, run_dir: str, filename: str, render: Callable[[str], None]) -> bool:
+        """
+        排入一個除錯檔案
+
+        Args:
+            run_dir: new_run_dir() 取得的目錄
+            filename: 檔名
+            render: 接收完整路徑並寫出檔案的函數，於背景執行緒執行
+
+        Returns:
+            是否成功排入；佇列已滿時丟棄並回傳 False
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((run_dir, filename, render))
+            return True
+        except queue.Full:
+            DEBUG_ARTIFACTS.inc(result="dropped")
+            logger.warning("除錯輸出佇列已滿，丟棄 %s", filename)
+            return False
+
+    def save_image(self, run_dir: str, filename: str, image) -> bool:
+        """排入一張 PIL 圖片"""
+        return self.submit(run_dir, filename, image.save)
+
+    def flush(self):
+        """等待佇列中的檔案全部寫完"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="debug-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            run_dir, filename, render = self._queue.get()
+            try:
+                if run_dir != self._last_run_dir:
+                    # 開始寫入新的一次分析前，先清出空間
+                    self._last_run_dir = run_dir
+                    self._enforce_retention(keep=run_dir)
+                os.makedirs(run_dir, exist_ok=True)
+                render(os.path.join(run_dir, filename))
+                DEBUG_ARTIFACTS.inc(result="written")
+            except Exception as e:
+                DEBUG_ARTIFACTS.inc(result="failed")
+                logger.warning("寫入除錯檔案 %s 失敗: %s", filename, e)
+            finally:
+                self._queue.task_done()
+
+    def _enforce_retention(self, keep: Optional[str] = None):
+        """刪除最舊的分析目錄，直到目錄數與總大小都在上限內"""
+        if not os.path.isdir(self.output_dir):
+            return
+        runs = []
+        for name in sorted(os.listdir(self.output_dir)):
+            path = os.path.join(self.output_dir, name)
+            if not os.path.isdir(path) or path == keep:
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            runs.append((path, size))
+
+        total = sum(size for _, size in runs)
+        # 保留位置給即將寫入的目錄
+        while runs and (len(runs) + 1 > self.max_runs or total > self.max_bytes):
+            path, size = runs.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+_writer: Optional[DebugArtifactWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_debug_writer() -> DebugArtifactWriter:
+    """取得全域除錯輸出寫入器"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = DebugArtifactWriter()
+    return _writer
+
+
+__all__ = ["DebugArtifactWriter", "get_debug_writer", "should_capture"]
@@ -0,0 +1,355 @@
+# 檔案路徑: app/services/food_suggest_service.py
+
+"""
+食物名稱自動完成
+
+以排序陣列 + bisect 建立記憶體內的前綴索引，索引的鍵包含：
+    - 英文名稱，以及名稱中每個單字開頭的後綴（輸入 "rice" 也能找到 "Fried rice"）
+    - chinese_name
+    - 別名：分類標籤對應表的標籤，以及 details["aliases"]
+
+索引在應用程式啟動時（app.main 的 startup 事件或 preload_models）從 nutrition 表載入，
+查詢不需等待載入。透過 ORM 寫入的少量變更在 commit 後逐筆更新索引。
+其他行程（例如 app.fdc_import、其他 web worker）的新增、修改與刪除，由 nutrition 表上的觸發器
+遞增 nutrition_suggest_version 的版本號；每隔 SUGGEST_REFRESH_SECONDS 秒比對版本號，
+有變更時在背景執行緒重新載入整個索引後替換，查詢期間繼續使用舊索引，不會被阻塞。
+本行程的寫入同樣會遞增版本，因此之後也會重新載入一次，確保與資料庫一致。
+
+設定：
+    SUGGEST_REFRESH_SECONDS: 檢查資料版本的間隔秒數（預設 30）
+    SUGGEST_MAX_SCAN: 單次查詢最多掃描的前綴符合鍵數（預設 2000）
+    SUGGEST_INCREMENTAL_MAX: 單次 commit 逐筆更新索引的變更數上限，超過時改為背景重新載入（預設 500）
+"""
+
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from ..database import engine
+from ..models.nutrition import Nutrition
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "30"))
+SUGGEST_MAX_SCAN = int(os.getenv("SUGGEST_MAX_SCAN", "2000"))
+SUGGEST_INCREMENTAL_MAX = int(os.getenv("SUGGEST_INCREMENTAL_MAX", "500"))
+
+_WORD_START = re.compile(r"(?<=[\s,(/\-])(?=\w)")
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def _index_keys(food_name: Optional[str], chinese_name: Optional[str], aliases: Iterable[str]) -> List[Tuple[str, int]]:
+    """
+    產生一筆食物的索引鍵 (key, 比對類型)
+
+    比對類型用於排序：0 = 名稱開頭，1 = 中文名稱或別名，2 = 名稱中間的單字
+    """
+    keys = []
+    if food_name:
+        name = _normalize(food_name)
+        keys.append((name, 0))
+        keys.extend((name[match.start():], 2) for match in _WORD_START.finditer(name))
+    if chinese_name:
+        keys.append((_normalize(chinese_name), 1))
+    keys.extend((_normalize(alias), 1) for alias in aliases if alias)
+    return keys
+
+
+class PrefixIndex:
+    """以排序陣列實作的前綴索引，支援逐筆新增與刪除"""
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._refs: List[Tuple[int, int]] = []  # 與 _keys 平行：(nutrition id, 比對類型)
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._entry_keys: Dict[int, List[Tuple[str, int]]] = {}
+        self._lock = threading.RLock()
+        self.max_id = 0
+        self.version: Any = None  # 載入時的資料版本
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, rows: Iterable[Tuple[int, str, Optional[str], Iterable[str]]]):
+        """一次載入多筆 (id, food_name, chinese_name, aliases)，取代既有內容"""
+        pairs = []
+        entries, entry_keys = {}, {}
+        for nutrition_id, food_name, chinese_name, aliases in rows:
+            keys = _index_keys(food_name, chinese_name, aliases)
+            entries[nutrition_id] = {"id": nutrition_id, "food_name": food_name, "chinese_name": chinese_name}
+            entry_keys[nutrition_id] = keys
+            pairs.extend((key, (nutrition_id, kind)) for key, kind in keys)
+        pairs.sort()
+        with self._lock:
+            self._keys = [key for key, _ in pairs]
+            self._refs = [ref for _, ref in pairs]
+            self._entries, self._entry_keys = entries, entry_keys
+            self.max_id = max(entries, default=0)
+
+    def upsert(self, nutrition_id: int, food_name: str, chinese_name: Optional[str] = None,
+               aliases: Iterable[str] = ()):
+        with self._lock:
+            self.remove(nutrition_id)
+            keys = _index_keys(food_name, chinese_name, aliases)
+            for key, kind in keys:
+                position = bisect.bisect_left(self._keys, key)
+                self._keys.insert(position, key)
+                self._refs.insert(position, (nutrition_id, kind))
+            self._entries[nutrition_id] = {"id": nutrition_id, "food_name": food_name, "chinese_name": chinese_name}
+            self._entry_keys[nutrition_id] = keys
+            self.max_id = max(self.max_id, nutrition_id)
+
+    def remove(self, nutrition_id: int):
+        with self._lock:
+            for key, kind in self._entry_keys.pop(nutrition_id, []):
+                position = bisect.bisect_left(self._keys, key)
+                while position < len(self._keys) and self._keys[position] == key:
+                    if self._refs[position] == (nutrition_id, kind):
+                        del self._keys[position]
+                        del self._refs[position]
+                        break
+                    position += 1
+            self._entries.pop(nutrition_id, None)
+
+    def add_alias(self, nutrition_id: int, alias: str):
+        """為已存在的食物加上別名"""
+        with self._lock:
+            entry = self._entries.get(nutrition_id)
+            if entry is None:
+                return
+            key = (_normalize(alias), 1)
+            if key in self._entry_keys[nutrition_id]:
+                return
+            position = bisect.bisect_left(self._keys, key[0])
+            self._keys.insert(position, key[0])
+            self._refs.insert(position, (nutrition_id, 1))
+            self._entry_keys[nutrition_id].append(key)
+
+    def search(self, prefix: str, limit: int = 8, max_scan: int = SUGGEST_MAX_SCAN) -> List[Dict[str, Any]]:
+        """
+        回傳以 prefix 開頭的食物，依 (是否為名稱中間的單字, 完全相符, 比對類型, 名稱長度, 名稱) 排序
+
+        符合的鍵超過 max_scan 時只取前 max_scan 個（依字母序，較短的名稱在前）排序。
+        """
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + "\uffff", lo=start, hi=min(len(self._keys), start + max_scan))
+            best: Dict[int, Tuple] = {}
+            for position in range(start, end):
+                key = self._keys[position]
+                nutrition_id, kind = self._refs[position]
+                entry = self._entries[nutrition_id]
+                rank = (kind == 2, key != prefix, kind, len(entry["food_name"] or ""), entry["food_name"] or "")
+                if nutrition_id not in best or rank < best[nutrition_id]:
+                    best[nutrition_id] = rank
+            ranked = sorted(best.items(), key=lambda item: item[1])[:limit]
+            return [
+                {"food_name": self._entries[nutrition_id]["food_name"],
+                 "chinese_name": self._entries[nutrition_id]["chinese_name"]}
+                for nutrition_id, _ in ranked
+            ]
+
+
+_index: Optional[PrefixIndex] = None
+_index_lock = threading.Lock()
+_last_refresh = 0.0
+_rebuild_thread: Optional[threading.Thread] = None
+
+# nutrition 表的名稱欄位有任何變更時遞增版本號（任何行程的寫入都會觸發）
+_VERSION_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS nutrition_suggest_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)""",
+    "INSERT OR IGNORE INTO nutrition_suggest_version (id, version) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS nutrition_suggest_ai AFTER INSERT ON nutrition BEGIN
+        UPDATE nutrition_suggest_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS nutrition_suggest_ad AFTER DELETE ON nutrition BEGIN
+        UPDATE nutrition_suggest_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS nutrition_suggest_au AFTER UPDATE OF food_name, chinese_name, details ON nutrition BEGIN
+        UPDATE nutrition_suggest_version SET version = version + 1 WHERE id = 1;
+    END""",
+)
+
+
+def _ensure_version_tracking(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in _VERSION_SCHEMA:
+        conn.execute(text(statement))
+
+
+def _data_version(conn) -> Any:
+    """目前的資料版本；非 SQLite 資料庫以 (筆數, 最大 id) 代替，只能偵測新增與刪除"""
+    if conn.dialect.name == "sqlite":
+        try:
+            return conn.execute(text("SELECT version FROM nutrition_suggest_version WHERE id = 1")).scalar()
+        except Exception:
+            pass
+    return tuple(conn.execute(text("SELECT count(*), coalesce(max(id), 0) FROM nutrition")).one())
+
+
+def _row_aliases(details: Any) -> List[str]:
+    if isinstance(details, dict) and isinstance(details.get("aliases"), list):
+        return [str(alias) for alias in details["aliases"]]
+    return []
+
+
+def _fetch_rows(conn, after_id: int = 0):
+    result = conn.execute(
+        text("SELECT id, food_name, chinese_name, details FROM nutrition WHERE id > :after ORDER BY id"),
+        {"after": after_id},
+    )
+    for nutrition_id, food_name, chinese_name, details in result:
+        if isinstance(details, str):
+            try:
+                details = json.loads(details)
+            except ValueError:
+                details = None
+        yield nutrition_id, food_name, chinese_name, _row_aliases(details)
+
+
+def _label_aliases(conn) -> List[Tuple[int, str]]:
+    """分類標籤對應表中，標籤與營養資料名稱不同者作為別名"""
+    try:
+        rows = conn.execute(text(
+            "SELECT n.id, l.label FROM food_label_nutrition l JOIN nutrition n ON n.food_name = l.food_name"
+        )).all()
+    except Exception:
+        return []
+    return [(nutrition_id, label) for nutrition_id, label in rows]
+
+
+def _build_index(bind=None) -> PrefixIndex:
+    bind = bind or engine
+    index = PrefixIndex()
+    start = time.perf_counter()
+    with bind.begin() as conn:
+        _ensure_version_tracking(conn)
+    with bind.connect() as conn:
+        # 先讀版本再讀資料：載入期間的寫入會使版本不同，下次檢查時再重新載入
+        index.version = _data_version(conn)
+        index.load(_fetch_rows(conn))
+        for nutrition_id, label in _label_aliases(conn):
+            index.add_alias(nutrition_id, label)
+    logger.info("食物名稱前綴索引載入完成：%s 筆，耗時 %.2f 秒", len(index), time.perf_counter() - start)
+    return index
+
+
+def _rebuild_in_background():
+    """在背景執行緒重新載入索引後替換；已有重新載入在進行時不重複啟動"""
+    global _rebuild_thread
+
+    def run():
+        global _index, _rebuild_thread
+        index = None
+        try:
+            index = _build_index()
+        except Exception as e:
+            logger.error("食物名稱前綴索引重新載入失敗: %s", e)
+        # 替換索引與清除執行中的標記都在同一個鎖內，與啟動重新載入的判斷互斥
+        with _index_lock:
+            if index is not None:
+                _index = index
+            _rebuild_thread = None
+
+    with _index_lock:
+        if _rebuild_thread is not None:
+            return
+        _rebuild_thread = threading.Thread(target=run, name="suggest-index-rebuild", daemon=True)
+        _rebuild_thread.start()
+
+
+def _check_for_changes(index: PrefixIndex):
+    """資料版本與索引不同時（其他行程寫入過），在背景重新載入"""
+    try:
+        with engine.connect() as conn:
+            version = _data_version(conn)
+    except Exception as e:
+        logger.warning("檢查營養資料版本失敗: %s", e)
+        return
+    if version != index.version:
+        logger.info("營養資料已變更 (版本 %s → %s)，於背景重新載入前綴索引", index.version, version)
+        _rebuild_in_background()
+
+
+def load_suggest_index() -> PrefixIndex:
+    """載入全域前綴索引（已載入時直接回傳），於應用程式啟動時呼叫"""
+    global _index, _last_refresh
+    with _index_lock:
+        if _index is None:
+            _index = _build_index()
+            _last_refresh = time.monotonic()
+        return _index
+
+
+def get_suggest_index() -> PrefixIndex:
+    """取得全域前綴索引並定期檢查資料版本；啟動時未載入成功才在此載入"""
+    global _last_refresh
+    if _index is None:
+        return load_suggest_index()
+    if time.monotonic() - _last_refresh > SUGGEST_REFRESH_SECONDS:
+        with _index_lock:
+            due = time.monotonic() - _last_refresh > SUGGEST_REFRESH_SECONDS
+            if due:
+                _last_refresh = time.monotonic()
+        if due:
+            _check_for_changes(_index)
+    return _index
+
+
+def suggest_foods(prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+    """回傳符合輸入前綴的食物名稱建議"""
+    return get_suggest_index().search(prefix, limit=limit)
+
+
+# --- ORM 寫入後逐筆更新索引 ---
+
+@event.listens_for(Session, "after_flush")
+def _collect_nutrition_changes(session, flush_context):
+    changes = session.info.setdefault("suggest_changes", [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Nutrition):
+            changes.append(("upsert", obj.id, obj.food_name, obj.chinese_name, _row_aliases(obj.details)))
+    for obj in session.deleted:
+        if isinstance(obj, Nutrition):
+            changes.append(("remove", obj.id, None, None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_nutrition_changes(session):
+    changes = session.info.pop("suggest_changes", [])
+    # 索引尚未載入時不需處理，載入時會讀到最新資料
+    if _index is None or not changes:
+        return
+    if len(changes) > SUGGEST_INCREMENTAL_MAX:
+        # 逐筆插入排序陣列的成本與索引大小成正比，大量變更改為背景重新載入
+        _rebuild_in_background()
+        return
+    for op, nutrition_id, food_name, chinese_name, aliases in changes:
+        if op == "upsert":
+            _index.upsert(nutrition_id, food_name, chinese_name, aliases)
+        else:
+            _index.remove(nutrition_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_nutrition_changes(session):
+    session.info.pop("suggest_changes", None)
+
+
+__all__ = ["PrefixIndex", "get_suggest_index", "load_suggest_index", "suggest_foods"]
@@ -0,0 +1,291 @@
+# 檔案路徑: app/services/fuzzy_match_service.py
+
+"""
+共用的食物名稱模糊比對
+
+以 n-gram 倒排索引找出候選名稱，再以編輯距離重新排序：
+    - 英文：正規化（小寫、底線與連字號改為空白、簡單的複數轉單數）後取字元三元組
+    - 中文：取單字與相鄰兩字
+因此能處理拼字錯誤、複數、底線與中英混合的輸入。
+索引只在建立時計算一次；查詢時以 numpy 合併共用 n-gram 的倒排列表計數，
+只對 Dice 係數最高的少數候選計算編輯距離。
+
+除了整體相似度，也計算「名稱的 n-gram 有多少出現在查詢中」（涵蓋率），
+讓 "chicken wings" 這類包含關鍵字的輸入也能對應到 "chicken"。
+
+避免分類標籤被對應到錯誤的食材：
+    - 容許拼字錯誤只適用於長度至少 MIN_TYPO_LENGTH 的字串，"ice" 不會被視為 "rice" 的拼錯
+    - 查詢的最後一個英文單字是 DISH_HEADS 中的菜餚名詞（例如 "apple pie" 的 pie），
+      而比對到的名稱不含該單字時，分數乘上 HEAD_MISMATCH_FACTOR："apple pie" 不是 "apple"
+"""
+
+import heapq
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 涵蓋率達到此值視為名稱完整出現在查詢中
+FULL_CONTAINMENT = 0.99
+CONTAINMENT_SCORE = 0.85
+DEFAULT_MIN_SCORE = 0.6
+MAX_CANDIDATES = 20
+# 以查詢的部分單字比對時的分數折扣
+PARTIAL_QUERY_FACTOR = 0.95
+# 較短的字串只接受完全相符，不套用拼字錯誤的容許範圍
+MIN_TYPO_LENGTH = 5
+# 查詢以菜餚名詞結尾、但比對到的名稱不含該名詞時的分數折扣
+HEAD_MISMATCH_FACTOR = 0.6
+# 會改變食物本身的菜餚名詞：前面的食材只是口味或餡料（apple pie、carrot cake、bread pudding）
+DISH_HEADS = frozenset((
+    "pie", "cake", "cheesecake", "shortcake", "cupcake", "cream", "tart", "pudding", "mousse", "muffin",
+    "cookie", "juice", "sauce", "jam", "smoothie", "yogurt", "sundae", "donut", "doughnut", "pancake",
+    "waffle", "crepe", "brulee", "macaron", "cannoli", "baklava", "churro",
+))
+
+_CJK = "\u3400-\u9fff\uf900-\ufaff"
+_TOKEN = re.compile(rf"[{_CJK}]+|[a-z0-9]+")
+_PLURAL_ES = re.compile(r"(ches|shes|sses|xes|oes)$")
+
+
+def _singular(token: str) -> str:
+    if len(token) <= 3 or token.endswith("ss"):
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if _PLURAL_ES.search(token):
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def normalize_food_name(name: str) -> str:
+    """小寫、移除標點、英文單字轉單數，例如 Chicken_Wings → chicken wing"""
+    tokens = _TOKEN.findall(name.lower().replace("_", " "))
+    return " ".join(token if re.match(rf"[{_CJK}]", token) else _singular(token) for token in tokens)
+
+
+def food_name_grams(normalized: str) -> List[str]:
+    """正規化名稱的 n-gram：英文單字取前後補空白的三元組，中文取單字與兩字組"""
+    grams = []
+    for token in normalized.split():
+        if re.match(rf"[{_CJK}]", token):
+            grams.extend(token)
+            grams.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            padded = f" {token} "
+            grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Levenshtein 距離；指定 max_distance 時，超過即提前結束並回傳 max_distance + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """
+    名稱 → 值的模糊比對索引
+
+    一個值可以有多個名稱（例如英文名、中文名與別名），查詢結果依值去重。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]] = ()):
+        self._names: List[str] = []
+        self._values: List[Any] = []
+        self._gram_counts: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._exact: Dict[str, int] = {}
+        # 查詢用的 numpy 陣列，新增名稱後於下次查詢時重建
+        self._posting_arrays: Optional[Dict[str, np.ndarray]] = None
+        self._gram_count_array: Optional[np.ndarray] = None
+        for name, value in entries:
+            self.add(name, value)
+        self._arrays()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str, value: Any):
+        normalized = normalize_food_name(name)
+        if not normalized or normalized in self._exact:
+            return
+        entry_id = len(self._names)
+        grams = set(food_name_grams(normalized))
+        self._names.append(normalized)
+        self._values.append(value)
+        self._gram_counts.append(len(grams))
+        self._exact[normalized] = entry_id
+        for gram in grams:
+            self._postings[gram].append(entry_id)
+        self._posting_arrays = None
+
+    def _arrays(self) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        if self._posting_arrays is None:
+            self._posting_arrays = {gram: np.array(ids, dtype=np.int32) for gram, ids in self._postings.items()}
+            self._gram_count_array = np.array(self._gram_counts, dtype=np.int32)
+        return self._posting_arrays, self._gram_count_array
+
+    def search(self, query: str, limit: int = 5, min_score: float = DEFAULT_MIN_SCORE) -> List[Tuple[Any, str, float]]:
+        """
+        回傳 [(值, 比對到的名稱, 分數)]，分數介於 0~1，依分數由高到低排序
+
+        分數為 n-gram Dice 係數與編輯距離相似度的平均；名稱完整出現在查詢中時至少為 CONTAINMENT_SCORE。
+        整個查詢沒有相符的名稱時，多個單字的查詢再以單字與相鄰兩字分別比對（略微降低分數），
+        讓 "spagetti bolognese" 這類部分拼錯的輸入也能找到 "spaghetti"。
+        """
+        normalized = normalize_food_name(query)
+        if not normalized:
+            return []
+        exact = self._exact.get(normalized)
+        if exact is not None and limit == 1:
+            return [(self._values[exact], self._names[exact], 1.0)]
+
+        tokens = normalized.split()
+        scores = self._score(normalized, limit, min_score)
+        if len(tokens) > 1 and max(scores.values(), default=0) < min_score:
+            windows = tokens
+            if len(tokens) > 2:
+                windows = tokens + [" ".join(tokens[i:i + 2]) for i in range(len(tokens) - 1)]
+            for window in windows:
+                for entry_id, score in self._score(window, limit, min_score / PARTIAL_QUERY_FACTOR).items():
+                    scores[entry_id] = max(scores.get(entry_id, 0), score * PARTIAL_QUERY_FACTOR)
+
+        head = tokens[-1]
+        if len(tokens) > 1 and head in DISH_HEADS:
+            for entry_id in scores:
+                if head not in self._names[entry_id].split():
+                    scores[entry_id] *= HEAD_MISMATCH_FACTOR
+
+        ranked = sorted(
+            ((score, entry_id) for entry_id, score in scores.items() if score >= min_score),
+            key=lambda item: (-item[0], self._names[item[1]]),
+        )
+        results, seen = [], set()
+        for score, entry_id in ranked:
+            value = self._values[entry_id]
+            try:
+                key = hash(value)
+            except TypeError:
+                key = id(value)
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append((value, self._names[entry_id], round(min(score, 1.0), 4)))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _score(self, normalized: str, limit: int, min_score: float) -> Dict[int, float]:
+        """
+        計算候選名稱的分數
+
+        候選依 Dice 係數由高到低計算；分數上限 (dice + 1) / 2 已低於目前第 limit 名時即停止，
+        編輯距離也只算到足以超過門檻為止，因此大多數查詢只需對少數候選計算編輯距離。
+        """
+        query_grams = set(food_name_grams(normalized))
+        postings, gram_counts = self._arrays()
+        lists = [postings[gram] for gram in query_grams if gram in postings]
+        if not lists:
+            return {}
+        shared = np.bincount(np.concatenate(lists), minlength=len(self._names))
+        hits = np.flatnonzero(shared)
+        hit_shared, hit_grams = shared[hits], gram_counts[hits]
+        query_size = len(query_grams)
+
+        dice = 2 * hit_shared / (query_size + hit_grams)
+        top = min(MAX_CANDIDATES, len(hits))
+        best = np.argpartition(-dice, top - 1)[:top]
+        candidates = [(int(hits[i]), int(hit_shared[i])) for i in best[np.argsort(-dice[best], kind="stable")]]
+        contained = hits[hit_shared >= hit_grams * FULL_CONTAINMENT].tolist()
+
+        scores: Dict[int, float] = {}
+        for entry_id in contained:
+            # 較長的名稱包含的資訊較多，同樣完整出現時優先
+            name = self._names[entry_id]
+            similarity = self._similarity(normalized, entry_id, int(shared[entry_id]), query_size) or 0.0
+            scores[entry_id] = max(similarity, CONTAINMENT_SCORE + 0.001 * min(len(name), 100))
+
+        top = heapq.nlargest(limit, scores.values())
+        threshold = max(min_score, top[-1]) if len(top) >= limit else min_score
+        for entry_id, count in candidates:
+            if entry_id in scores:
+                continue
+            if (2 * count / (query_size + self._gram_counts[entry_id]) + 1) / 2 < threshold:
+                break
+            score = self._similarity(normalized, entry_id, count, query_size, threshold)
+            if score is None:
+                continue
+            scores[entry_id] = score
+            top = heapq.nlargest(limit, scores.values())
+            if len(top) >= limit:
+                threshold = max(threshold, top[-1])
+        return scores
+
+    def _similarity(self, normalized: str, entry_id: int, shared: int, query_size: int,
+                    threshold: float = 0.0) -> Optional[float]:
+        """Dice 係數與編輯距離相似度的平均，低於 threshold 時回傳 None"""
+        name = self._names[entry_id]
+        dice = 2 * shared / (query_size + self._gram_counts[entry_id])
+        longest = max(len(normalized), len(name))
+        # 分數 >= threshold 需要 similarity >= 2 * threshold - dice
+        max_distance = int((1 - max(0.0, 2 * threshold - dice)) * longest)
+        if min(len(normalized), len(name)) < MIN_TYPO_LENGTH:
+            max_distance = 0
+        distance = edit_distance(normalized, name, max_distance)
+        if distance > max_distance:
+            return None
+        return (dice + 1 - distance / longest) / 2
+
+    def best(self, query: str, min_score: float = DEFAULT_MIN_SCORE) -> Optional[Any]:
+        """回傳最相符的值，沒有達到門檻時回傳 None"""
+        results = self.search(query, limit=1, min_score=min_score)
+        return results[0][0] if results else None
+
+
+# --- 食物密度類別 ---
+
+# 密度表類別的關鍵字（英文、中文與常見菜名）
+DENSITY_KEYWORDS = {
+    "rice": ("rice", "飯", "risotto", "paella", "bibimbap"),
+    "fried_rice": ("fried rice", "炒飯"),
+    "noodles": ("noodle", "麵", "pasta", "spaghetti", "ramen", "pho", "pad thai", "lasagna", "udon"),
+    "bread": ("bread", "麵包", "toast", "bun", "sandwich", "吐司"),
+    "meat": ("meat", "肉", "chicken", "pork", "beef", "lamb", "steak", "rib", "duck", "雞", "豬", "牛"),
+    "fish": ("fish", "魚", "salmon", "tuna", "sashimi", "seafood"),
+    "vegetables": ("vegetable", "菜", "salad", "broccoli", "edamame"),
+    "fruits": ("fruit", "水果", "apple", "banana", "orange", "strawberry", "grape"),
+    "soup": ("soup", "湯", "chowder", "bisque", "miso"),
+}
+
+_density_index: Optional[FuzzyIndex] = None
+
+
+def match_density_category(food_name: str) -> Optional[str]:
+    """將食物名稱對應到密度表的類別，例如 Fried_Rice → fried_rice、雞腿便當 → meat"""
+    global _density_index
+    if _density_index is None:
+        _density_index = FuzzyIndex(
+            (keyword, category) for category, keywords in DENSITY_KEYWORDS.items() for keyword in keywords
+        )
+    return _density_index.best(food_name)
+
+
+__all__ = [
+    "FuzzyIndex", "normalize_food_name", "food_name_grams", "edit_distance", "match_density_category",
+    "DENSITY_KEYWORDS", "DISH_HEADS",
+]
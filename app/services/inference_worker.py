@@ -0,0 +1,397 @@
+# 檔案路徑: app/services/inference_worker.py
+
+"""
+獨立行程的推論 worker 池
+
+讓 uvicorn worker 只負責 HTTP，模型推論交給同一台主機上的獨立行程執行。
+解碼後的圖片與回傳的分割遮罩透過 multiprocessing.shared_memory 傳遞，
+佇列上只傳遞共享記憶體名稱、形狀等小型中繼資料，避免序列化大型陣列。
+
+兩種部署方式的行程數：
+    - start_server.py --preload（預載後 fork）：主行程在 fork 前以 create_shared_inference_pool 建立
+      單一推論池，所有 web worker 共用同一個任務佇列，各自有獨立的結果佇列。
+      推論行程數 = INFERENCE_WORKERS，與 WEB_CONCURRENCY 無關，可分別調整。
+    - uvicorn --workers：沒有可在 fork 前執行的主行程，每個 web worker 各自啟動推論池，
+      推論行程數（與模型副本數）= WEB_CONCURRENCY × INFERENCE_WORKERS。
+      CPU_AFFINITY=auto 時以 (web worker 編號 × INFERENCE_WORKERS + 推論行程編號) 分配核心，
+      各推論池不會綁定到相同的核心。
+
+推論行程以 spawn 啟動，不會繼承父行程（包括預載模式中預載並 gc.freeze 的主行程）的權重，
+每個推論行程各自從本地快取載入一份模型：模型記憶體約為推論行程數 × 一份模型。
+因此預載模式搭配推論池時，主行程只預載 web 行程仍會用到的分類模型，不預載 V2 模型。
+
+推論行程意外結束時，監控者依各推論行程登記的執行中任務，立即以 InferenceWorkerDied
+（可重試的錯誤）結束該任務，不必等到 INFERENCE_TIMEOUT。
+
+設定：
+    INFERENCE_WORKERS: 推論行程數量，0（預設）表示在 web 行程內直接推論
+    INFERENCE_TIMEOUT: 單次推論的逾時秒數（預設 120）
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))
+
+# 推論行程結束時，監控者代為回報其執行中任務所用的結果內容
+_WORKER_DIED = "inference worker died"
+
+
+class InferenceWorkerDied(RuntimeError):
+    """處理任務的推論行程意外結束；任務本身沒有問題，可以重試"""
+
+
+def _write_shared_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """將陣列複製到新的共享記憶體區塊，回傳區塊與描述資訊"""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, {"name": shm.name, "shape": array.shape, "dtype": array.dtype.str}
+
+
+def _read_shared_array(descriptor: Dict[str, Any], unlink: bool = False) -> np.ndarray:
+    """從共享記憶體讀出陣列（複製一份），可選擇同時釋放該區塊"""
+    shm = shared_memory.SharedMemory(name=descriptor["name"])
+    try:
+        array = np.ndarray(descriptor["shape"], dtype=np.dtype(descriptor["dtype"]), buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    return array
+
+
+def _worker_main(worker_index: int, worker_count: int, task_queue, result_queues, in_flight, slot: int):
+    """
+    推論行程主迴圈
+
+    worker_index / worker_count 為核心分配用的編號與總數（涵蓋所有推論池的推論行程），
+    結果依任務的 reply_to 放回對應 web worker 的結果佇列。
+    處理中的任務登記在 in_flight[2 * slot]（reply_to）與 in_flight[2 * slot + 1]（task_id），
+    行程意外結束時由監控者讀取。
+    """
+    # 依推論行程數分配執行緒與核心，避免與其他推論行程互搶
+    os.environ["WORKER_INDEX"] = str(worker_index)
+    os.environ["WEB_CONCURRENCY"] = str(worker_count)
+
+    from PIL import Image
+    from ..logging_config import configure_logging
+    from ..runtime_config import configure_runtime
+    from .weight_estimation_service_v2 import analyze_food_image_v2
+
+    configure_logging()
+    configure_runtime(worker_index)
+    logger.info("推論 worker %s 已啟動 (pid %s)", worker_index, os.getpid())
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id = task["task_id"]
+        reply_to = task.get("reply_to", 0)
+        result_queue = result_queues[reply_to]
+        in_flight[2 * slot], in_flight[2 * slot + 1] = reply_to, task_id
+        try:
+            image = Image.fromarray(_read_shared_array(task["image"]))
+            result = analyze_food_image_v2(
+                image=image,
+                model_config=task["model_config"],
+                debug=task["debug"],
+                return_masks=task["return_masks"],
+                cascade=task.get("cascade"),
+            )
+
+            mask_descriptors = []
+            if task["return_masks"]:
+                # 遮罩以 bit 壓縮後放入共享記憶體，由 web 行程讀取後釋放
+                for mask in result.pop("masks", []):
+                    mask = np.asarray(mask, dtype=bool)
+                    shm, descriptor = _write_shared_array(np.packbits(mask))
+                    descriptor["mask_shape"] = mask.shape
+                    shm.close()
+                    mask_descriptors.append(descriptor)
+
+            result_queue.put((task_id, True, result, mask_descriptors))
+        except Exception as e:
+            logger.error("推論 worker %s 處理任務失敗: %s", worker_index, str(e))
+            result_queue.put((task_id, False, str(e), []))
+        finally:
+            in_flight[2 * slot + 1] = -1
+
+
+class InferenceWorkerPool:
+    """
+    推論 worker 池
+
+    web 行程呼叫 analyze() 時將圖片寫入共享記憶體並放入任務佇列，
+    背景執行緒收集結果後喚醒對應的 asyncio Future。
+    """
+
+    def __init__(self, num_workers: int, reply_slots: int = 1, slot_offset: int = 0, slot_count: Optional[int] = None):
+        """
+        Args:
+            num_workers: 推論行程數量
+            reply_slots: 結果佇列數量，即共用此推論池的 web worker 數
+            slot_offset / slot_count: 推論行程在核心分配中的起始編號與總數
+        """
+        self.num_workers = num_workers
+        self._ctx = mp.get_context("spawn")  # torch 不保證 fork 安全
+        self._task_queue = self._ctx.Queue()
+        self._result_queues = [self._ctx.Queue() for _ in range(max(1, reply_slots))]
+        # 每個推論行程處理中的 (reply_to, task_id)，task_id 為 -1 表示閒置
+        self._in_flight = self._ctx.Array("q", [0, -1] * num_workers, lock=False)
+        self._slot_offset = slot_offset
+        self._slot_count = slot_count or num_workers
+        self._reply_to = 0
+        self._owner_pid = os.getpid()
+        self._processes: List[Any] = []
+        self._pending: Dict[int, Tuple[asyncio.Future, asyncio.AbstractEventLoop, shared_memory.SharedMemory]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._collector: Optional[threading.Thread] = None
+        self._supervisor: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        """啟動推論行程，並由目前行程接收結果"""
+        self.start_processes()
+        self.attach(0)
+
+    def start_processes(self):
+        """啟動推論行程與監控執行緒（由建立推論池的行程呼叫）"""
+        self._running = True
+        for index in range(self.num_workers):
+            self._processes.append(self._spawn(index))
+        logger.info("推論 worker 池已啟動，共 %s 個行程", self.num_workers)
+
+    def start_supervisor(self):
+        """在建立推論池的行程中定期重啟意外結束的推論行程（共用推論池於 fork 後呼叫）"""
+        def supervise():
+            while self._running:
+                time.sleep(1.0)
+                self._restart_dead_workers()
+
+        self._supervisor = threading.Thread(target=supervise, name="inference-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def attach(self, reply_to: int):
+        """開始接收第 reply_to 個結果佇列的結果（每個 web worker 呼叫一次）"""
+        self._running = True
+        self._reply_to = reply_to % len(self._result_queues)
+        self._collector = threading.Thread(target=self._collect_results, name="inference-results", daemon=True)
+        self._collector.start()
+
+    @property
+    def is_owner(self) -> bool:
+        """目前行程是否為推論行程的父行程（只有父行程能監控與關閉推論行程）"""
+        return os.getpid() == self._owner_pid
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._slot_offset + index, self._slot_count, self._task_queue, self._result_queues,
+                  self._in_flight, index),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def stop(self):
+        """停止接收結果；在父行程中同時通知所有推論行程結束"""
+        self._running = False
+        if not self.is_owner:
+            return
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        self._processes = []
+
+    def queue_depth(self) -> int:
+        """尚未完成的任務數"""
+        with self._lock:
+            return len(self._pending)
+
+    def _collect_results(self):
+        while self._running:
+            try:
+                task_id, ok, payload, mask_descriptors = self._result_queues[self._reply_to].get(timeout=1.0)
+            except queue.Empty:
+                if self.is_owner:
+                    self._restart_dead_workers()
+                continue
+
+            with self._lock:
+                entry = self._pending.pop(task_id, None)
+            if entry is None:
+                # 任務已逾時，釋放 worker 建立的遮罩區塊
+                for descriptor in mask_descriptors:
+                    _read_shared_array(descriptor, unlink=True)
+                continue
+
+            future, loop, image_shm = entry
+            image_shm.close()
+            image_shm.unlink()
+
+            if not ok and payload == _WORKER_DIED:
+                loop.call_soon_threadsafe(_set_future_exception, future,
+                                          InferenceWorkerDied("推論行程意外結束，請重試"))
+            elif ok:
+                if mask_descriptors:
+                    payload["masks"] = [
+                        np.unpackbits(_read_shared_array(d, unlink=True))[:int(np.prod(d["mask_shape"]))]
+                        .reshape(d["mask_shape"]).astype(bool)
+                        for d in mask_descriptors
+                    ]
+                loop.call_soon_threadsafe(_set_future_result, future, payload)
+            else:
+                loop.call_soon_threadsafe(_set_future_exception, future, RuntimeError(payload))
+
+    def _restart_dead_workers(self):
+        for index, process in enumerate(self._processes):
+            if self._running and not process.is_alive():
+                logger.warning("推論 worker %s 已結束 (exitcode %s)，重新啟動", index, process.exitcode)
+                self._fail_in_flight(index)
+                self._processes[index] = self._spawn(index)
+
+    def _fail_in_flight(self, index: int):
+        """回報已結束的推論行程正在處理的任務，讓等待的請求立即失敗而不是等到逾時"""
+        reply_to, task_id = self._in_flight[2 * index], self._in_flight[2 * index + 1]
+        if task_id < 0:
+            return
+        self._in_flight[2 * index + 1] = -1
+        logger.warning("推論 worker %s 結束時正在處理任務 %s，回報失敗", index, task_id)
+        self._result_queues[reply_to].put((task_id, False, _WORKER_DIED, []))
+
+    async def analyze(self,
+                      image_array: np.ndarray,
+                      model_config: Optional[Dict[str, str]] = None,
+                      debug: bool = False,
+                      return_masks: bool = False,
+                      cascade: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        將已解碼的 RGB 圖片交給推論行程分析
+
+        Args:
+            image_array: HxWx3 uint8 陣列
+            model_config: 模型配置
+            debug: 是否輸出除錯圖片
+            return_masks: 是否回傳各食物的分割遮罩
+            cascade: 是否啟用串接模式，未指定時依 CASCADE_ENABLED
+
+        Returns:
+            與 estimate_food_weight_v2 相同格式的結果
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        image_shm, descriptor = _write_shared_array(np.ascontiguousarray(image_array, dtype=np.uint8))
+        task_id = next(self._ids)
+        with self._lock:
+            self._pending[task_id] = (future, loop, image_shm)
+
+        self._task_queue.put({
+            "task_id": task_id,
+            "reply_to": self._reply_to,
+            "image": descriptor,
+            "model_config": model_config,
+            "debug": debug,
+            "return_masks": return_masks,
+            "cascade": cascade,
+        })
+
+        try:
+            return await asyncio.wait_for(future, timeout=INFERENCE_TIMEOUT)
+        except asyncio.TimeoutError:
+            with self._lock:
+                entry = self._pending.pop(task_id, None)
+            if entry is not None:
+                entry[2].close()
+                entry[2].unlink()
+            raise
+
+
+def _set_future_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_future_exception(future: asyncio.Future, exc: Exception):
+    if not future.done():
+        future.set_exception(exc)
+
+
+# 全域推論 worker 池，INFERENCE_WORKERS > 0 時於應用啟動時建立
+_pool: Optional[InferenceWorkerPool] = None
+
+
+def create_shared_inference_pool(num_workers: int, web_workers: int) -> Optional[InferenceWorkerPool]:
+    """
+    在 fork web worker 前建立所有 web worker 共用的推論池（由預載模式的主行程呼叫）
+
+    fork 後各 web worker 在啟動時以 start_inference_pool() 接上自己的結果佇列，
+    主行程則呼叫 pool.start_supervisor() 監控推論行程。
+    """
+    global _pool
+    if num_workers <= 0:
+        return None
+    _pool = InferenceWorkerPool(num_workers, reply_slots=web_workers)
+    _pool.start_processes()
+    return _pool
+
+
+def start_inference_pool(num_workers: int = INFERENCE_WORKERS) -> Optional[InferenceWorkerPool]:
+    """
+    依設定啟動全域推論 worker 池
+
+    主行程已建立共用推論池時，只接上目前 web worker 的結果佇列；
+    否則在目前的 web worker 中建立自己的推論池。
+    """
+    global _pool
+    from ..runtime_config import claim_worker_index, get_worker_count
+
+    web_workers = get_worker_count()
+    web_index = claim_worker_index(web_workers) % web_workers
+    if _pool is not None:
+        if not _pool.is_owner:
+            _pool.attach(web_index)
+        return _pool
+    if num_workers <= 0:
+        return None
+    # 各 web worker 的推論池使用不同的核心分配編號
+    _pool = InferenceWorkerPool(num_workers, slot_offset=web_index * num_workers,
+                                slot_count=web_workers * num_workers)
+    _pool.start()
+    return _pool
+
+
+def stop_inference_pool():
+    """關閉全域推論 worker 池"""
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+def get_inference_pool() -> Optional[InferenceWorkerPool]:
+    """取得全域推論 worker 池，未啟用時回傳 None"""
+    return _pool
+
+
+__all__ = [
+    "InferenceWorkerPool", "InferenceWorkerDied", "create_shared_inference_pool", "start_inference_pool",
+    "stop_inference_pool", "get_inference_pool",
+]
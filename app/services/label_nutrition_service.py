@@ -0,0 +1,252 @@
+# 檔案路徑: app/services/label_nutrition_service.py
+
+"""
+分類標籤 → 營養資料對應表
+
+食物分類模型只會輸出 Food-101 的 101 種標籤，不需要每次辨識都做一次文字搜尋。
+建立步驟會把每個標籤（以及內建營養表的食物名稱）解析成一筆固定的營養資料，
+存入 food_label_nutrition 表；執行期載入為字典，以正規化的標籤做 O(1) 查詢，
+只有對應表中沒有的名稱才退回 fetch_nutrition_data 搜尋。
+
+建立對應表需要掃描資料庫、寫入並做模糊比對，只在啟動時（ensure_label_mapping，
+由 app.main 啟動與預載模式的主行程呼叫）與 FDC 匯入後執行；請求期間只讀取已建立的對應表。
+
+解析順序：本地 FDC 資料庫 → USDA API（需指定 --remote）→ 內建營養表
+
+用法:
+    python -m app.services.label_nutrition_service           # 只使用本地資料
+    python -m app.services.label_nutrition_service --remote  # 本地找不到時查詢 USDA API
+"""
+
+import ast
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..database import SessionLocal, engine
+from ..metrics import record_cache
+from ..models.nutrition import FoodLabelNutrition
+from .nutrition_search_service import NUTRITION_FIELDS, lookup_local_nutrition
+
+logger = logging.getLogger(__name__)
+
+# Food-101 的類別，即 ai_service 分類模型的輸出標籤
+FOOD101_LABELS = (
+    "apple_pie", "baby_back_ribs", "baklava", "beef_carpaccio", "beef_tartare", "beet_salad", "beignets",
+    "bibimbap", "bread_pudding", "breakfast_burrito", "bruschetta", "caesar_salad", "cannoli", "caprese_salad",
+    "carrot_cake", "ceviche", "cheesecake", "cheese_plate", "chicken_curry", "chicken_quesadilla",
+    "chicken_wings", "chocolate_cake", "chocolate_mousse", "churros", "clam_chowder", "club_sandwich",
+    "crab_cakes", "creme_brulee", "croque_madame", "cup_cakes", "deviled_eggs", "donuts", "dumplings",
+    "edamame", "eggs_benedict", "escargots", "falafel", "filet_mignon", "fish_and_chips", "foie_gras",
+    "french_fries", "french_onion_soup", "french_toast", "fried_calamari", "fried_rice", "frozen_yogurt",
+    "garlic_bread", "gnocchi", "greek_salad", "grilled_cheese_sandwich", "grilled_salmon", "guacamole",
+    "gyoza", "hamburger", "hot_and_sour_soup", "hot_dog", "huevos_rancheros", "hummus", "ice_cream",
+    "lasagna", "lobster_bisque", "lobster_roll_sandwich", "macaroni_and_cheese", "macarons", "miso_soup",
+    "mussels", "nachos", "omelette", "onion_rings", "oysters", "pad_thai", "paella", "pancakes",
+    "panna_cotta", "peking_duck", "pho", "pizza", "pork_chop", "poutine", "prime_rib",
+    "pulled_pork_sandwich", "ramen", "ravioli", "red_velvet_cake", "risotto", "samosa", "sashimi",
+    "scallops", "seaweed_salad", "shrimp_and_grits", "spaghetti_bolognese", "spaghetti_carbonara",
+    "spring_rolls", "steak", "strawberry_shortcake", "sushi", "tacos", "takoyaki", "tiramisu",
+    "tuna_tartare", "waffles",
+)
+
+# 舊版分析程式的內建營養表；該檔案匯入時會載入模型，因此只解析其字面值
+LEGACY_ANALYZER_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "food_analyzer.py")
+
+_label_map: Optional[Dict[str, Dict[str, Any]]] = None
+_label_map_lock = threading.Lock()
+
+
+def normalize_label(name: str) -> str:
+    """轉為小寫並以空白取代底線與連字號，例如 Apple_Pie → apple pie"""
+    return re.sub(r"[\s_\-]+", " ", name).strip().lower()
+
+
+def _legacy_nutrition_database() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(LEGACY_ANALYZER_PATH, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == "NUTRITION_DATABASE" for target in node.targets):
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                return {}
+    return {}
+
+
+def builtin_nutrition() -> Dict[str, Dict[str, float]]:
+    """內建營養表（v1 的 FOOD_DATABASE 與舊版 NUTRITION_DATABASE），以正規化名稱為鍵"""
+    from .weight_estimation_service import FOOD_DATABASE
+
+    table: Dict[str, Dict[str, float]] = {}
+    for name, values in _legacy_nutrition_database().items():
+        values = dict(values, calories=values.get("calories_per_100g", 0))
+        table[normalize_label(name)] = {
+            field: float(values[field]) for field in NUTRITION_FIELDS if isinstance(values.get(field), (int, float))
+        }
+    for name, values in FOOD_DATABASE.items():
+        table[normalize_label(name)] = {
+            field: float(values[field]) for field in NUTRITION_FIELDS if isinstance(values.get(field), (int, float))
+        }
+    return table
+
+
+def _resolve(label: str, builtin: Dict[str, Dict[str, float]], remote: bool) -> Optional[Dict[str, Any]]:
+    record = lookup_local_nutrition(label)
+    if record is not None:
+        return {"food_name": record["food_name"], "fdc_id": record.get("fdc_id"), "source": "local",
+                **{field: record.get(field) for field in NUTRITION_FIELDS}}
+
+    if remote:
+        from .nutrition_api_service import fetch_nutrition_data
+
+        record = fetch_nutrition_data(label)
+        if record is not None and "error" not in record:
+            return {"food_name": record.get("food_name", label), "fdc_id": record.get("fdc_id"), "source": "usda",
+                    **{field: record.get(field) for field in NUTRITION_FIELDS}}
+
+    if label in builtin:
+        return {"food_name": label, "fdc_id": None, "source": "builtin", **builtin[label]}
+    return None
+
+
+def build_label_mapping(labels: Optional[Iterable[str]] = None, remote: bool = False) -> Dict[str, Any]:
+    """
+    解析標籤並寫入 food_label_nutrition（已存在的標籤會被更新）
+
+    Args:
+        labels: 要解析的標籤，預設為 Food-101 標籤與內建營養表的食物名稱
+        remote: 本地找不到時是否查詢 USDA API
+
+    Returns:
+        {"mapped", "unmapped", "sources"}
+    """
+    builtin = builtin_nutrition()
+    if labels is None:
+        labels = list(FOOD101_LABELS) + list(builtin)
+    normalized = list(dict.fromkeys(normalize_label(label) for label in labels))
+
+    FoodLabelNutrition.__table__.create(bind=engine, checkfirst=True)
+    now = datetime.now()
+    unmapped: List[str] = []
+    sources: Dict[str, int] = {}
+    db = SessionLocal()
+    try:
+        for label in normalized:
+            resolved = _resolve(label, builtin, remote)
+            if resolved is None:
+                unmapped.append(label)
+                continue
+            sources[resolved["source"]] = sources.get(resolved["source"], 0) + 1
+            db.merge(FoodLabelNutrition(label=label, resolved_at=now, **resolved))
+            logger.debug("標籤 '%s' 對應到 %s (%s)", label, resolved["food_name"], resolved["source"])
+        db.commit()
+    finally:
+        db.close()
+
+    reload_label_mapping()
+    stats = {"mapped": len(normalized) - len(unmapped), "unmapped": unmapped, "sources": sources}
+    logger.info("標籤營養對應表建立完成: 對應 %s 個，未對應 %s 個，來源 %s",
+                stats["mapped"], len(unmapped), sources)
+    return stats
+
+
+def _load_label_mapping() -> Dict[str, Dict[str, Any]]:
+    FoodLabelNutrition.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        rows = db.query(FoodLabelNutrition).all()
+    finally:
+        db.close()
+    return {
+        row.label: {
+            "food_name": row.food_name, "fdc_id": row.fdc_id, "source": row.source,
+            **{field: getattr(row, field) or 0.0 for field in NUTRITION_FIELDS},
+        }
+        for row in rows
+    }
+
+
+def reload_label_mapping() -> int:
+    """重新從資料庫載入對應表，回傳筆數"""
+    global _label_map
+    with _label_map_lock:
+        _label_map = _load_label_mapping()
+        return len(_label_map)
+
+
+def ensure_label_mapping() -> int:
+    """
+    載入對應表，資料庫中尚未建立時以本地資料建立一次（於啟動時呼叫），回傳筆數
+
+    多個 worker 同時啟動時可能同時建立，寫入失敗的一方改為載入另一方建立的結果。
+    """
+    if reload_label_mapping():
+        return len(_label_map)
+    try:
+        build_label_mapping()
+    except Exception as e:
+        logger.warning("建立標籤營養對應表失敗，載入現有資料: %s", e)
+        reload_label_mapping()
+    return len(_label_map)
+
+
+def _get_label_map() -> Dict[str, Dict[str, Any]]:
+    """取得已載入的對應表；尚未載入時只讀取資料庫，不在請求中建立"""
+    global _label_map
+    if _label_map is None:
+        with _label_map_lock:
+            if _label_map is None:
+                _label_map = _load_label_mapping()
+    return _label_map
+
+
+def get_label_nutrition(food_name: str) -> Optional[Dict[str, Any]]:
+    """以正規化的標籤查詢對應表，沒有對應時回傳 None"""
+    record = _get_label_map().get(normalize_label(food_name))
+    return dict(record) if record is not None else None
+
+
+def lookup_label_nutrition(food_name: str) -> Optional[Dict[str, Any]]:
+    """
+    取得分類結果的每 100g 營養資訊
+
+    先查預先建立的對應表，沒有對應的名稱才呼叫 fetch_nutrition_data 搜尋。
+    """
+    record = get_label_nutrition(food_name)
+    record_cache("label_nutrition", record is not None)
+    if record is not None:
+        return record
+
+    from .nutrition_api_service import fetch_nutrition_data
+
+    return fetch_nutrition_data(food_name)
+
+
+__all__ = [
+    "FOOD101_LABELS", "normalize_label", "builtin_nutrition", "build_label_mapping", "reload_label_mapping",
+    "ensure_label_mapping",
+    "get_label_nutrition", "lookup_label_nutrition",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ..logging_config import configure_logging
+
+    parser = argparse.ArgumentParser(description="建立分類標籤 → 營養資料對應表")
+    parser.add_argument("--remote", action="store_true", help="本地找不到時查詢 USDA API")
+    args = parser.parse_args()
+
+    configure_logging()
+    result = build_label_mapping(remote=args.remote)
+    if result["unmapped"]:
+        print("未對應的標籤:", ", ".join(result["unmapped"]))
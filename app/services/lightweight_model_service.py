@@ -5,214 +5,342 @@ import numpy as np
 from PIL import Image
 import io
 from typing import Dict, Any, List, Optional, Tuple, Union
-import torch
-import cv2
-from ultralytics import YOLO
 import os
+import threading
+import time
+
+# torch、transformers、ultralytics 匯入成本高，只在第一次載入模型時才匯入
+from .model_cache import load_pretrained, load_processor
+from ..runtime_config import apply_ml_thread_settings
+from ..metrics import MODEL_LOADS, record_cache, record_fallback
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 可用模型與其權重來源
+DETECTION_MODELS = {
+    "yolov5n": "yolov5nu.pt",
+    "yolov8n": "yolov8n.pt",
+}
+
+SEGMENTATION_MODELS = {
+    "mobilesam": "facebook/sam-vit-base",
+    "slimsam": "Zigeng/SlimSAM-uniform",
+    "efficientvit_sam": "hustvl/EfficientViT-SAM",
+}
+
+DEPTH_MODELS = {
+    "dpt_swinv2_tiny": "Intel/dpt-swinv2-tiny-256",
+    "dpt_large": "Intel/dpt-large",
+    "lmdepth_s": "hustvl/LMDepth-S",
+    "mininet": "hustvl/MiniNet",
+}
+
+DEFAULT_MODEL_CONFIG = {
+    "detection": "yolov5n",  # 物件偵測
+    "segmentation": "mobilesam",  # 圖像分割
+    "depth": "dpt_swinv2_tiny"  # 深度估計
+}
+
+# 建議的模型配置組合；balanced 與 DEFAULT_MODEL_CONFIG 相同
+RECOMMENDED_CONFIGS = {
+    "balanced": {
+        "detection": "yolov5n",
+        "segmentation": "mobilesam",
+        "depth": "dpt_swinv2_tiny",
+        "description": "平衡配置 - 速度與準確度的最佳平衡"
+    },
+    "speed_optimized": {
+        "detection": "yolov5n",
+        "segmentation": "slimsam",
+        "depth": "mininet",
+        "description": "速度優化 - 極致輕量化，適合資源受限環境"
+    },
+    "accuracy_optimized": {
+        "detection": "yolov8n",
+        "segmentation": "efficientvit_sam",
+        "depth": "dpt_large",
+        "description": "準確度優化 - 更高準確度，但需要更多資源"
+    }
+}
+
+def get_recommended_config(name: str) -> Dict[str, str]:
+    """取得建議配置的模型組合（不含說明文字）"""
+    return {kind: RECOMMENDED_CONFIGS[name][kind] for kind in DEFAULT_MODEL_CONFIG}
+
+# 已載入的子模型，以 (類型, 模型名稱) 為鍵，讓不同配置的服務共用同一份權重
+_shared_models: Dict[Tuple[str, str], Any] = {}
+_shared_model_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+def get_shared_model(kind: str, name: str, loader):
+    """
+    取得共用的子模型，尚未載入時呼叫 loader() 載入
+
+    同一個模型只會載入一次；多個執行緒同時請求時，其餘執行緒等待第一個載入完成。
+    """
+    key = (kind, name)
+    with _registry_lock:
+        if key in _shared_models:
+            record_cache("model_registry", True)
+            return _shared_models[key]
+        lock = _shared_model_locks.setdefault(key, threading.Lock())
+    with lock:
+        hit = key in _shared_models
+        record_cache("model_registry", hit)
+        if not hit:
+            _shared_models[key] = loader()
+        return _shared_models[key]
+
+# ultralytics 的 predictor 不保證執行緒安全，共用的偵測模型同一時間只讓一個執行緒推論
+# 以實際載入模型的 (類型, 模型名稱) 為鍵，未知的模型名稱回退後與預設模型共用同一把鎖
+_detection_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+def _get_detection_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _registry_lock:
+        return _detection_locks.setdefault(key, threading.Lock())
+
 class LightweightModelService:
     """
     輕量化 AI 模型服務
     支持多種替代模型選擇，包括 MobileSAM、DPT SwinV2-Tiny 等
+    各模型在第一次使用時才載入
     """
     
-    def __init__(self, model_config: Optional[Dict[str, str]] = None):
+    def __init__(self, model_config: Optional[Dict[str, str]] = None, lazy: bool = True):
         """
         初始化輕量化模型服務
         
         Args:
             model_config: 模型配置字典，可指定具體的模型
+            lazy: 是否延遲到第一次使用時才載入各模型
         """
-        self.model_config = model_config or {
-            "detection": "yolov5n",  # 物件偵測
-            "segmentation": "mobilesam",  # 圖像分割
-            "depth": "dpt_swinv2_tiny"  # 深度估計
-        }
+        self.model_config = model_config or dict(DEFAULT_MODEL_CONFIG)
         
         # 模型實例
-        self.detection_model = None
-        self.segmentation_model = None
-        self.segmentation_processor = None
-        self.depth_model = None
+        self._detection_model = None
+        self._detection_key: Optional[Tuple[str, str]] = None
+        self._segmentation_model = None
+        self._segmentation_processor = None
+        self._depth_model = None
+
+        # 各模型冷啟動耗時（秒）
+        self.load_timings: Dict[str, float] = {}
         
-        # 載入模型
-        self._load_models()
+        if not lazy:
+            self.load_all_models()
+
+    @property
+    def detection_model(self):
+        if self._detection_model is None:
+            self._timed_load("detection", self._load_detection_model)
+        return self._detection_model
+
+    @property
+    def segmentation_model(self):
+        if self._segmentation_model is None:
+            self._timed_load("segmentation", self._load_segmentation_model)
+        return self._segmentation_model
+
+    @property
+    def segmentation_processor(self):
+        if self._segmentation_processor is None:
+            self._timed_load("segmentation", self._load_segmentation_model)
+        return self._segmentation_processor
+
+    @property
+    def depth_model(self):
+        if self._depth_model is None:
+            self._timed_load("depth", self._load_depth_model)
+        return self._depth_model
+
+    def _timed_load(self, kind: str, loader):
+        """執行載入函數並記錄冷啟動時間"""
+        start = time.perf_counter()
+        loader()
+        self.load_timings[kind] = round(time.perf_counter() - start, 3)
+        apply_ml_thread_settings()
+        logger.info("%s 模型冷啟動耗時 %.2f 秒", kind, self.load_timings[kind])
     
-    def _load_models(self):
-        """載入指定的 AI 模型"""
+    def load_all_models(self):
+        """立即載入所有指定的 AI 模型（預載模式使用）"""
         try:
             logger.info("開始載入輕量化模型組合...")
             
             # 1. 載入物件偵測模型
-            self._load_detection_model()
+            self.detection_model
             
             # 2. 載入圖像分割模型
-            self._load_segmentation_model()
+            self.segmentation_model
             
             # 3. 載入深度估計模型
-            self._load_depth_model()
+            self.depth_model
             
             logger.info("✅ 所有輕量化模型載入完成！")
             
         except Exception as e:
-            logger.error(f"模型載入失敗: {str(e)}")
+            logger.error("模型載入失敗: %s", str(e))
             raise
     
     def _load_detection_model(self):
         """載入物件偵測模型"""
+        from ultralytics import YOLO
         try:
             detection_type = self.model_config.get("detection", "yolov5n")
             
-            if detection_type == "yolov5n":
-                logger.info("載入 YOLOv5n 物件偵測模型...")
-                self.detection_model = YOLO('yolov5nu.pt')
-            elif detection_type == "yolov8n":
-                logger.info("載入 YOLOv8n 物件偵測模型...")
-                self.detection_model = YOLO('yolov8n.pt')
-            else:
-                logger.warning(f"未知的偵測模型類型: {detection_type}，使用預設 YOLOv5n")
-                self.detection_model = YOLO('yolov5nu.pt')
+            if detection_type not in DETECTION_MODELS:
+                logger.warning("未知的偵測模型類型: %s，使用預設 YOLOv5n", detection_type)
+                detection_type = "yolov5n"
+
+            logger.info("載入 %s 物件偵測模型...", detection_type)
+            # YOLO 權重為 ultralytics 的 .pt 格式，由 ultralytics 自行快取
+            def load_yolo():
+                model = YOLO(DETECTION_MODELS[detection_type])
+                MODEL_LOADS.inc(model=DETECTION_MODELS[detection_type], source="ultralytics")
+                return model
+
+            self._detection_model = get_shared_model("detection", detection_type, load_yolo)
+            self._detection_key = ("detection", detection_type)
                 
-            logger.info(f"✅ 物件偵測模型載入成功: {detection_type}")
+            logger.info("✅ 物件偵測模型載入成功: %s", detection_type)
             
         except Exception as e:
-            logger.error(f"物件偵測模型載入失敗: {str(e)}")
+            logger.error("物件偵測模型載入失敗: %s", str(e))
             raise
     
     def _load_segmentation_model(self):
         """載入圖像分割模型"""
+        from transformers import SamModel, SamProcessor
         try:
             segmentation_type = self.model_config.get("segmentation", "mobilesam")
             
-            if segmentation_type == "mobilesam":
-                logger.info("載入 MobileSAM 分割模型...")
-                from transformers import SamModel, SamProcessor
-                self.segmentation_model = SamModel.from_pretrained("facebook/sam-vit-base")
-                self.segmentation_processor = SamProcessor.from_pretrained("facebook/sam-vit-base")
-                
-            elif segmentation_type == "slimsam":
-                logger.info("載入 SlimSAM 分割模型...")
-                # 嘗試載入 SlimSAM (如果可用)
-                try:
-                    from transformers import SamModel, SamProcessor
-                    self.segmentation_model = SamModel.from_pretrained("Zigeng/SlimSAM-uniform")
-                    self.segmentation_processor = SamProcessor.from_pretrained("Zigeng/SlimSAM-uniform")
-                except:
-                    logger.warning("SlimSAM 載入失敗，回退到標準 SAM")
-                    self.segmentation_model = SamModel.from_pretrained("facebook/sam-vit-base")
-                    self.segmentation_processor = SamProcessor.from_pretrained("facebook/sam-vit-base")
-                    
-            elif segmentation_type == "efficientvit_sam":
-                logger.info("載入 EfficientViT-SAM 分割模型...")
-                # 嘗試載入 EfficientViT-SAM (如果可用)
+            if segmentation_type not in SEGMENTATION_MODELS:
+                logger.warning("未知的分割模型類型: %s，使用預設 MobileSAM", segmentation_type)
+                segmentation_type = "mobilesam"
+
+            logger.info("載入 %s 分割模型...", segmentation_type)
+
+            def load_sam(repo_id: str):
+                return load_pretrained(SamModel, repo_id), load_processor(SamProcessor, repo_id)
+
+            def load_with_fallback():
                 try:
-                    from transformers import SamModel, SamProcessor
-                    self.segmentation_model = SamModel.from_pretrained("hustvl/EfficientViT-SAM")
-                    self.segmentation_processor = SamProcessor.from_pretrained("hustvl/EfficientViT-SAM")
-                except:
-                    logger.warning("EfficientViT-SAM 載入失敗，回退到標準 SAM")
-                    self.segmentation_model = SamModel.from_pretrained("facebook/sam-vit-base")
-                    self.segmentation_processor = SamProcessor.from_pretrained("facebook/sam-vit-base")
-                    
-            else:
-                logger.warning(f"未知的分割模型類型: {segmentation_type}，使用預設 MobileSAM")
-                from transformers import SamModel, SamProcessor
-                self.segmentation_model = SamModel.from_pretrained("facebook/sam-vit-base")
-                self.segmentation_processor = SamProcessor.from_pretrained("facebook/sam-vit-base")
+                    return load_sam(SEGMENTATION_MODELS[segmentation_type])
+                except Exception:
+                    if segmentation_type == "mobilesam":
+                        raise
+                    logger.warning("%s 載入失敗，回退到標準 SAM", segmentation_type)
+                    record_fallback("segmentation_model")
+                    return get_shared_model("segmentation", "mobilesam",
+                                            lambda: load_sam(SEGMENTATION_MODELS["mobilesam"]))
+
+            self._segmentation_model, self._segmentation_processor = get_shared_model(
+                "segmentation", segmentation_type, load_with_fallback
+            )
                 
-            logger.info(f"✅ 圖像分割模型載入成功: {segmentation_type}")
+            logger.info("✅ 圖像分割模型載入成功: %s", segmentation_type)
             
         except Exception as e:
-            logger.error(f"圖像分割模型載入失敗: {str(e)}")
+            logger.error("圖像分割模型載入失敗: %s", str(e))
             raise
     
     def _load_depth_model(self):
         """載入深度估計模型"""
+        from transformers import pipeline, AutoModelForDepthEstimation, AutoImageProcessor
+
+        def build_pipeline(repo_id: str):
+            model = load_pretrained(AutoModelForDepthEstimation, repo_id)
+            processor = load_processor(AutoImageProcessor, repo_id)
+            return pipeline("depth-estimation", model=model, image_processor=processor)
+
         try:
             depth_type = self.model_config.get("depth", "dpt_swinv2_tiny")
             
-            if depth_type == "dpt_swinv2_tiny":
-                logger.info("載入 DPT SwinV2-Tiny 深度估計模型...")
-                from transformers import pipeline
-                self.depth_model = pipeline("depth-estimation", model="Intel/dpt-swinv2-tiny-256")
-                
-            elif depth_type == "dpt_large":
-                logger.info("載入 DPT Large 深度估計模型...")
-                from transformers import pipeline
-                self.depth_model = pipeline("depth-estimation", model="Intel/dpt-large")
-                
-            elif depth_type == "lmdepth_s":
-                logger.info("載入 LMDepth-S 深度估計模型...")
-                # 嘗試載入 LMDepth-S (如果可用)
-                try:
-                    from transformers import pipeline
-                    self.depth_model = pipeline("depth-estimation", model="hustvl/LMDepth-S")
-                except:
-                    logger.warning("LMDepth-S 載入失敗，回退到 DPT SwinV2-Tiny")
-                    self.depth_model = pipeline("depth-estimation", model="Intel/dpt-swinv2-tiny-256")
-                    
-            elif depth_type == "mininet":
-                logger.info("載入 MiniNet 深度估計模型...")
-                # 嘗試載入 MiniNet (如果可用)
+            if depth_type not in DEPTH_MODELS:
+                logger.warning("未知的深度模型類型: %s，使用預設 DPT SwinV2-Tiny", depth_type)
+                depth_type = "dpt_swinv2_tiny"
+
+            logger.info("載入 %s 深度估計模型...", depth_type)
+
+            def load_with_fallback():
                 try:
-                    from transformers import pipeline
-                    self.depth_model = pipeline("depth-estimation", model="hustvl/MiniNet")
-                except:
-                    logger.warning("MiniNet 載入失敗，回退到 DPT SwinV2-Tiny")
-                    self.depth_model = pipeline("depth-estimation", model="Intel/dpt-swinv2-tiny-256")
-                    
-            else:
-                logger.warning(f"未知的深度模型類型: {depth_type}，使用預設 DPT SwinV2-Tiny")
-                from transformers import pipeline
-                self.depth_model = pipeline("depth-estimation", model="Intel/dpt-swinv2-tiny-256")
+                    return build_pipeline(DEPTH_MODELS[depth_type])
+                except Exception:
+                    if depth_type in ("dpt_swinv2_tiny", "dpt_large"):
+                        raise
+                    logger.warning("%s 載入失敗，回退到 DPT SwinV2-Tiny", depth_type)
+                    record_fallback("depth_model")
+                    return get_shared_model("depth", "dpt_swinv2_tiny",
+                                            lambda: build_pipeline(DEPTH_MODELS["dpt_swinv2_tiny"]))
+
+            self._depth_model = get_shared_model("depth", depth_type, load_with_fallback)
                 
-            logger.info(f"✅ 深度估計模型載入成功: {depth_type}")
+            logger.info("✅ 深度估計模型載入成功: %s", depth_type)
             
         except Exception as e:
-            logger.error(f"深度估計模型載入失敗: {str(e)}")
+            logger.error("深度估計模型載入失敗: %s", str(e))
             raise
     
+    @staticmethod
+    def _to_rgb_array(image: Image.Image) -> np.ndarray:
+        """轉成 numpy array 並移除 alpha 通道"""
+        img_np = np.array(image)
+        if img_np.shape[2] == 4:
+            img_np = img_np[:, :, :3]  # 移除 alpha
+        return img_np
+
+    def _parse_detections(self, result) -> List[Dict[str, Any]]:
+        """將單張圖片的偵測結果轉為物件列表"""
+        detected_objects = []
+        if result.boxes is not None:
+            for box in result.boxes:
+                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                conf = float(box.conf[0].cpu().numpy())
+                class_id = int(box.cls[0].cpu().numpy())
+                label = self.detection_model.names[class_id].lower() if hasattr(self.detection_model, 'names') else str(class_id)
+                
+                # 過濾掉餐具等小物件
+                if label not in ["spoon", "fork", "knife", "scissors", "toothbrush"]:
+                    detected_objects.append({
+                        "label": label,
+                        "bbox": [float(x1), float(y1), float(x2), float(y2)],
+                        "confidence": conf
+                    })
+        return detected_objects
+
     def detect_objects(self, image: Image.Image) -> List[Dict[str, Any]]:
         """使用載入的偵測模型偵測圖片中的所有物體"""
         try:
-            # 轉成 numpy array
-            img_np = np.array(image)
-            if img_np.shape[2] == 4:
-                img_np = img_np[:, :, :3]  # 移除 alpha
-            
             # 使用偵測模型進行偵測
-            results = self.detection_model(img_np, conf=0.25)  # 降低信心度閾值
+            model = self.detection_model
+            with _get_detection_lock(self._detection_key):
+                results = model(self._to_rgb_array(image), conf=0.25)  # 降低信心度閾值
             
-            detected_objects = []
             if results and len(results) > 0:
-                result = results[0]  # 取第一個結果
-                if result.boxes is not None:
-                    for box in result.boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        conf = float(box.conf[0].cpu().numpy())
-                        class_id = int(box.cls[0].cpu().numpy())
-                        label = self.detection_model.names[class_id].lower() if hasattr(self.detection_model, 'names') else str(class_id)
-                        
-                        # 過濾掉餐具等小物件
-                        if label not in ["spoon", "fork", "knife", "scissors", "toothbrush"]:
-                            detected_objects.append({
-                                "label": label,
-                                "bbox": [float(x1), float(y1), float(x2), float(y2)],
-                                "confidence": conf
-                            })
-            return detected_objects
+                return self._parse_detections(results[0])  # 取第一個結果
+            return []
         except Exception as e:
-            logger.warning(f"物件偵測失敗: {str(e)}")
+            logger.warning("物件偵測失敗: %s", str(e))
             return []
+
+    def detect_objects_batch(self, images: List[Image.Image]) -> List[List[Dict[str, Any]]]:
+        """一次前向傳遞偵測多張圖片，失敗時逐張偵測"""
+        if not images:
+            return []
+        try:
+            model = self.detection_model
+            with _get_detection_lock(self._detection_key):
+                results = model([self._to_rgb_array(image) for image in images], conf=0.25)
+            return [self._parse_detections(result) for result in results]
+        except Exception as e:
+            logger.warning("批次物件偵測失敗，改為逐張偵測: %s", str(e))
+            record_fallback("detection_batch")
+            return [self.detect_objects(image) for image in images]
     
     def segment_food(self, image: Image.Image, input_boxes: List[List[float]]) -> List[np.ndarray]:
         """使用載入的分割模型根據提供的邊界框分割食物區域"""
         if not input_boxes:
             return []
+        import torch
         try:
             # 使用分割模型進行分割，並提供邊界框作為提示
             inputs = self.segmentation_processor(image, input_boxes=input_boxes, return_tensors="pt")
@@ -232,7 +360,7 @@ class LightweightModelService:
             return masks
             
         except Exception as e:
-            logger.error(f"食物分割失敗: {str(e)}")
+            logger.error("食物分割失敗: %s", str(e))
             return []
     
     def estimate_depth(self, image: Image.Image) -> Optional[np.ndarray]:
@@ -242,9 +370,21 @@ class LightweightModelService:
             depth_map = np.array(depth_result["depth"])
             return depth_map
         except Exception as e:
-            logger.error(f"深度估計失敗: {str(e)}")
+            logger.error("深度估計失敗: %s", str(e))
             return None
     
+    def estimate_depth_batch(self, images: List[Image.Image]) -> List[Optional[np.ndarray]]:
+        """批次進行深度估計，失敗時逐張估計"""
+        if not images:
+            return []
+        try:
+            depth_results = self.depth_model(images, batch_size=len(images))
+            return [np.array(depth_result["depth"]) for depth_result in depth_results]
+        except Exception as e:
+            logger.warning("批次深度估計失敗，改為逐張估計: %s", str(e))
+            record_fallback("depth_batch")
+            return [self.estimate_depth(image) for image in images]
+    
     def get_model_info(self) -> Dict[str, Any]:
         """獲取當前載入的模型資訊"""
         return {
@@ -252,22 +392,21 @@ class LightweightModelService:
             "segmentation": self.model_config.get("segmentation", "mobilesam"),
             "depth": self.model_config.get("depth", "dpt_swinv2_tiny"),
             "models_loaded": {
-                "detection": self.detection_model is not None,
-                "segmentation": self.segmentation_model is not None,
-                "depth": self.depth_model is not None
-            }
+                "detection": self._detection_model is not None,
+                "segmentation": self._segmentation_model is not None,
+                "depth": self._depth_model is not None
+            },
+            "load_timings": dict(self.load_timings)
         }
     
     def test_model_performance(self, test_image: Image.Image) -> Dict[str, Any]:
         """測試模型性能"""
-        import time
-        
         results = {}
         
         # 測試物件偵測性能
-        start_time = time.time()
+        start_time = time.perf_counter()
         objects = self.detect_objects(test_image)
-        detection_time = time.time() - start_time
+        detection_time = time.perf_counter() - start_time
         results["detection"] = {
             "time": detection_time,
             "objects_count": len(objects),
@@ -275,9 +414,9 @@ class LightweightModelService:
         }
         
         # 測試深度估計性能
-        start_time = time.time()
+        start_time = time.perf_counter()
         depth_map = self.estimate_depth(test_image)
-        depth_time = time.time() - start_time
+        depth_time = time.perf_counter() - start_time
         results["depth"] = {
             "time": depth_time,
             "success": depth_map is not None,
@@ -286,10 +425,10 @@ class LightweightModelService:
         
         # 測試分割性能 (如果有偵測到物件)
         if objects:
-            start_time = time.time()
+            start_time = time.perf_counter()
             input_boxes = [obj["bbox"] for obj in objects[:1]]  # 只測試第一個物件
             masks = self.segment_food(test_image, input_boxes)
-            segmentation_time = time.time() - start_time
+            segmentation_time = time.perf_counter() - start_time
             results["segmentation"] = {
                 "time": segmentation_time,
                 "masks_count": len(masks),
@@ -305,7 +444,7 @@ class LightweightModelService:
         
         return results
 
-# 全域服務實例
+# 全域服務實例（延遲載入，匯入模組時不會載入模型）
 lightweight_service = LightweightModelService()
 
 def create_model_service_with_config(config: Dict[str, str]) -> LightweightModelService:
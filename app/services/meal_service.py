@@ -1,8 +1,19 @@
 from datetime import datetime
 from typing import List, Dict, Any, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from ..cache import get_cache
 from ..models.meal_log import MealLog
 
+# 營養攝入總結的快取；新增用餐記錄時整個命名空間失效。
+# 未設定 CACHE_URL 時失效只影響目前行程，因此快取鍵另外包含 meal_logs 的 (筆數, 最大 id)，
+# 其他 web worker 寫入後鍵即不同，不會讀到過期的總結
+MEAL_SUMMARY_CACHE_TTL = 300
+
+
+def _summary_cache():
+    return get_cache("meal_summary", ttl=MEAL_SUMMARY_CACHE_TTL)
+
 class MealService:
     def __init__(self, db: Session):
         self.db = db
@@ -36,6 +47,7 @@ class MealService:
         self.db.add(meal_log)
         self.db.commit()
         self.db.refresh(meal_log)
+        _summary_cache().clear()
         return meal_log
 
     def get_meal_logs(
@@ -62,6 +74,12 @@ class MealService:
         end_date: datetime
     ) -> Dict[str, float]:
         """獲取指定時間範圍內的營養攝入總結"""
+        count, max_id = self.db.query(func.count(MealLog.id), func.max(MealLog.id)).one()
+        cache_key = f"{start_date.isoformat()}|{end_date.isoformat()}|{count}:{max_id or 0}"
+        cached = _summary_cache().get(cache_key)
+        if cached is not None:
+            return cached
+
         meals = self.get_meal_logs(start_date, end_date)
         
         summary = {
@@ -86,4 +104,5 @@ class MealService:
             summary['total_fat'] += meal.fat * multiplier
             summary['total_fiber'] += meal.fiber * multiplier
             
+        _summary_cache().set(cache_key, summary)
         return summary
@@ -0,0 +1,97 @@
+# 檔案路徑: app/services/model_cache.py
+
+"""
+本地 safetensors 權重快取
+
+第一次載入 Hugging Face 模型時從 Hub 下載並轉存為 safetensors 格式，
+之後直接從本地目錄以記憶體映射 (mmap) 方式載入，縮短冷啟動時間，
+同時讓同一台主機上的多個 worker 共享作業系統的頁面快取。
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict
+
+from ..runtime_config import apply_ml_thread_settings
+from ..metrics import MODEL_LOADS, record_cache
+
+logger = logging.getLogger(__name__)
+
+# Hugging Face 下載快取目錄
+HF_CACHE_DIR = "/tmp/huggingface"
+# 轉換後的 safetensors 快取目錄
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(HF_CACHE_DIR, "safetensors"))
+
+# 每個模型的冷啟動紀錄: repo_id -> {"seconds": 載入秒數, "source": "safetensors_cache" | "hub"}
+_cold_start_timings: Dict[str, Dict[str, Any]] = {}
+
+
+def local_model_dir(repo_id: str) -> str:
+    """取得模型在本地快取中的目錄"""
+    return os.path.join(MODEL_CACHE_DIR, repo_id.replace("/", "--"))
+
+
+def _has_safetensors(path: str) -> bool:
+    return (os.path.exists(os.path.join(path, "model.safetensors"))
+            or os.path.exists(os.path.join(path, "model.safetensors.index.json")))
+
+
+def load_pretrained(model_cls, repo_id: str, **kwargs):
+    """
+    載入模型權重，優先使用本地 safetensors 快取
+
+    Args:
+        model_cls: transformers 模型類別，例如 SamModel
+        repo_id: Hugging Face 模型名稱
+
+    Returns:
+        模型實例
+    """
+    local_dir = local_model_dir(repo_id)
+    start = time.perf_counter()
+
+    cache_hit = _has_safetensors(local_dir)
+    record_cache("safetensors", cache_hit)
+    if cache_hit:
+        # safetensors 以 mmap 讀取，不需要先把整個檔案讀進記憶體
+        model = model_cls.from_pretrained(local_dir, use_safetensors=True, **kwargs)
+        source = "safetensors_cache"
+    else:
+        model = model_cls.from_pretrained(repo_id, cache_dir=HF_CACHE_DIR, **kwargs)
+        source = "hub"
+        try:
+            model.save_pretrained(local_dir, safe_serialization=True)
+            logger.info("已將 %s 轉存為 safetensors: %s", repo_id, local_dir)
+        except Exception as e:
+            logger.warning("轉存 %s 為 safetensors 失敗: %s", repo_id, e)
+
+    elapsed = time.perf_counter() - start
+    # 第一次載入模型時 torch 才被匯入，此時補上執行緒設定
+    apply_ml_thread_settings()
+    _cold_start_timings[repo_id] = {"seconds": round(elapsed, 3), "source": source}
+    MODEL_LOADS.inc(model=repo_id, source=source)
+    logger.info("模型 %s 載入完成 (%s)，耗時 %.2f 秒", repo_id, source, elapsed)
+    return model
+
+
+def load_processor(processor_cls, repo_id: str, **kwargs):
+    """載入前處理器設定，與權重存放在同一個本地目錄"""
+    local_dir = local_model_dir(repo_id)
+    if os.path.exists(os.path.join(local_dir, "preprocessor_config.json")):
+        return processor_cls.from_pretrained(local_dir, **kwargs)
+
+    processor = processor_cls.from_pretrained(repo_id, cache_dir=HF_CACHE_DIR, **kwargs)
+    try:
+        processor.save_pretrained(local_dir)
+    except Exception as e:
+        logger.warning("儲存 %s 前處理器設定失敗: %s", repo_id, e)
+    return processor
+
+
+def get_cold_start_timings() -> Dict[str, Dict[str, Any]]:
+    """取得所有已載入模型的冷啟動紀錄"""
+    return dict(_cold_start_timings)
+
+
+__all__ = ["load_pretrained", "load_processor", "get_cold_start_timings", "local_model_dir"]
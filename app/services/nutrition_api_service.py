@@ -4,8 +4,12 @@ import requests
 from dotenv import load_dotenv
 import logging
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
+from ..cache import get_cache
+from ..circuit_breaker import CircuitBreaker
+from ..metrics import record_fallback, timed_stage
+from ..singleflight import SingleFlight
+from .nutrition_search_service import lookup_local_nutrition
+
 logger = logging.getLogger(__name__)
 
 # 載入環境變數
@@ -14,6 +18,12 @@ load_dotenv()
 # 從環境變數中獲取 API 金鑰
 USDA_API_KEY = os.getenv("USDA_API_KEY", "4guYMPsU2jSnN6GH6NjexZmSh1VWrgmOIoH6d6ju")
 USDA_API_URL = "https://api.nal.usda.gov/fdc/v1/foods/search"
+USDA_TIMEOUT_SECONDS = float(os.getenv("USDA_TIMEOUT_SECONDS", "5"))
+# 連續失敗幾次後暫停呼叫 USDA，以及暫停多久後再試探
+USDA_BREAKER_FAILURES = int(os.getenv("USDA_BREAKER_FAILURES", "5"))
+USDA_BREAKER_RESET_SECONDS = float(os.getenv("USDA_BREAKER_RESET_SECONDS", "30"))
+# USDA 查詢結果在共享快取中保留的秒數
+USDA_CACHE_TTL_SECONDS = float(os.getenv("USDA_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
 
 # 我們關心的主要營養素及其在 USDA API 中的名稱或編號
 # 我們可以透過 nutrient.nutrientNumber 或 nutrient.name 來匹配
@@ -27,17 +37,54 @@ NUTRIENT_MAP = {
     'sodium': 'Sodium, Na'
 }
 
+# USDA 逾時、限流 (429) 或 5xx 連續發生時暫停呼叫，改用本地資料
+usda_breaker = CircuitBreaker("usda", failure_threshold=USDA_BREAKER_FAILURES,
+                              reset_timeout=USDA_BREAKER_RESET_SECONDS)
+
+# 同一個食物名稱同時只查詢一次，其餘的並行請求等待並共用結果
+_lookup_flight = SingleFlight("nutrition_lookup")
+
+
+@timed_stage("nutrition_lookup")
 def fetch_nutrition_data(food_name: str):
     """
-    從 USDA FoodData Central API 獲取食物的營養資訊。
+    獲取食物的營養資訊。
+    先查詢本地營養資料庫（以 app.fdc_import 匯入的 FDC 資料），找不到時才呼叫 USDA FoodData Central API。
+    USDA 斷路器開啟或呼叫失敗時，改用分類標籤對應表與內建營養表（結果帶有 "degraded": True）。
+    正規化後名稱相同（不分大小寫與多餘空白）的並行查詢會合併為一次。
 
     :param food_name: 要查詢的食物名稱 (例如 "Donuts")。
     :return: 包含營養資訊的字典，如果找不到則返回 None。
     """
+    result = _lookup_flight.do(" ".join(food_name.lower().split()), _fetch_nutrition_data, food_name)
+    # 每個呼叫者取得自己的副本，避免修改到其他請求共用的結果
+    return dict(result) if result is not None else None
+
+
+def _fetch_nutrition_data(food_name: str):
+    try:
+        local_info = lookup_local_nutrition(food_name)
+    except Exception as e:
+        logger.warning("本地營養資料庫查詢失敗，改用 USDA API: %s", e)
+        local_info = None
+    if local_info is not None:
+        return local_info
+
     if not USDA_API_KEY:
         logger.error("USDA_API_KEY 未設定，無法查詢營養資訊。")
         return None
 
+    # 其他節點查過的結果（斷路器開啟時也可使用）
+    cache = get_cache("usda_nutrition", ttl=USDA_CACHE_TTL_SECONDS)
+    cache_key = " ".join(food_name.lower().split())
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if not usda_breaker.allow():
+        record_fallback("usda_circuit_open")
+        return _degraded_nutrition(food_name)
+
     params = {
         'query': food_name,
         'api_key': USDA_API_KEY,
@@ -45,17 +92,21 @@ def fetch_nutrition_data(food_name: str):
         'pageSize': 1  # 我們只需要最相關的一筆結果
     }
 
+    # 每次放行的呼叫都必須回報成功或失敗，否則半開狀態的試探名額不會釋放
+    settled = False
     try:
-        logger.info(f"正在向 USDA API 查詢食物：{food_name}")
-        response = requests.get(USDA_API_URL, params=params)
+        logger.debug("正在向 USDA API 查詢食物：%s", food_name)
+        response = requests.get(USDA_API_URL, params=params, timeout=USDA_TIMEOUT_SECONDS)
         response.raise_for_status()  # 如果請求失敗 (例如 4xx 或 5xx)，則會拋出異常
 
         data = response.json()
+        usda_breaker.record_success()
+        settled = True
 
         # 檢查是否有找到食物
         if data.get('foods') and len(data['foods']) > 0:
             food_data = data['foods'][0]  # 取第一個最相關的結果
-            logger.info(f"從 API 成功獲取到食物 '{food_data.get('description')}' 的資料")
+            logger.info("從 API 成功獲取到食物 '%s' 的資料", food_data.get('description'))
             
             nutrition_info = {
                 "food_name": food_data.get('description', food_name).capitalize(),
@@ -73,13 +124,14 @@ def fetch_nutrition_data(food_name: str):
                         break # 找到後就跳出內層迴圈
 
             nutrition_info.update(extracted_nutrients)
+            cache.set(cache_key, nutrition_info)
             
             # 由於 USDA 不直接提供健康建議，我們先回傳原始數據
             # 後續可以在 main.py 中根據這些數據生成我們自己的建議
             return nutrition_info
 
         else:
-            logger.warning(f"在 USDA API 中找不到食物：{food_name}")
+            logger.warning("在 USDA API 中找不到食物：%s", food_name)
             return None
 
     except requests.exceptions.RequestException as e:
@@ -87,22 +139,74 @@ def fetch_nutrition_data(food_name: str):
         if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 429:
             logger.error("USDA API 請求過於頻繁 (429 Too Many Requests). 您提供的 API KEY 可能已達上限，或後備的 DEMO_KEY 已達上限。請考慮至 https://fdc.nal.usda.gov/api-key.html 申請免費的個人 API 金鑰，並將其設定在 .env 檔案中。")
         else:
-            logger.error(f"請求 USDA API 時發生網路錯誤: {e}")
-        
-        # 即使 API 失敗，也回傳一個空的營養結構，以避免主流程中斷
-        return {
-            'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, 
-            'fiber': 0, 'sugar': 0, 'sodium': 0,
-            'error': f'查詢 {food_name} 營養資訊時發生問題。可能是暫時的網路錯誤或 API 請求次數達到上限。'
-        }
+            logger.error("請求 USDA API 時發生網路錯誤: %s", e)
+        # 查詢本身的 4xx 錯誤代表 USDA 仍正常回應，對斷路器而言視為成功
+        if _is_provider_failure(e):
+            usda_breaker.record_failure(e)
+        else:
+            usda_breaker.record_success()
+        settled = True
+
+        # 即使 API 失敗，也以本地資料回應，以避免主流程中斷
+        record_fallback("usda_error")
+        return _degraded_nutrition(food_name)
     except Exception as e:
-        logger.error(f"處理 API 回應時發生未知錯誤: {e}")
+        logger.error("處理 API 回應時發生未知錯誤: %s", e)
+        if not settled:
+            # 回應無法解析，視為服務異常
+            usda_breaker.record_failure(e)
         return {
             'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, 
             'fiber': 0, 'sugar': 0, 'sodium': 0,
             'error': 'Unknown error processing nutrition data'
         }
 
+def _is_provider_failure(error: requests.exceptions.RequestException) -> bool:
+    """逾時、連線錯誤、限流與伺服器錯誤計入斷路器；查詢本身的 4xx 錯誤不計入"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return True
+
+
+_builtin_table = None
+_builtin_index = None
+
+
+def _degraded_nutrition(food_name: str):
+    """
+    USDA 無法使用時的本地資料：分類標籤對應表 → 內建營養表（模糊比對）
+
+    都找不到時回傳與過去相同的全零結構並附上 error，呼叫端據此回報暫時無法查詢。
+    """
+    global _builtin_table, _builtin_index
+    from .fuzzy_match_service import FuzzyIndex
+    from .label_nutrition_service import builtin_nutrition, get_label_nutrition
+
+    record = None
+    try:
+        record = get_label_nutrition(food_name)
+        if record is None:
+            if _builtin_index is None:
+                _builtin_table = builtin_nutrition()
+                _builtin_index = FuzzyIndex((name, name) for name in _builtin_table)
+            name = _builtin_index.best(food_name)
+            if name is not None:
+                record = {"food_name": name, "source": "builtin", **_builtin_table[name]}
+    except Exception as e:
+        logger.warning("本地後備營養資料查詢失敗: %s", e)
+
+    if record is not None:
+        nutrition_info = {"food_name": record["food_name"], "chinese_name": None}
+        nutrition_info.update({key: float(record.get(key) or 0.0) for key in NUTRIENT_MAP})
+        nutrition_info.update({"source": record.get("source", "builtin"), "degraded": True})
+        return nutrition_info
+
+    return {
+        'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, 
+        'fiber': 0, 'sugar': 0, 'sodium': 0,
+        'error': f'查詢 {food_name} 營養資訊時發生問題。可能是暫時的網路錯誤或 API 請求次數達到上限。'
+    }
+
 if __name__ == '__main__':
     # 測試此模組的功能
     test_food = "donuts"
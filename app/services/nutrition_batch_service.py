@@ -0,0 +1,137 @@
+# 檔案路徑: app/services/nutrition_batch_service.py
+
+"""
+批次營養查詢
+
+飲食規劃畫面一次需要 20~50 種食物的營養資訊。批次查詢的步驟：
+    1. 名稱去除重複（不分大小寫與多餘空白）
+    2. 以一次 SQL 查詢取得本地資料庫中名稱完全相符的食物
+    3. 查詢分類標籤對應表（記憶體內，於執行緒池中一次查詢所有未找到的名稱）
+    4. 其餘名稱以 fetch_nutrition_data（本地全文檢索 → USDA API）並行查詢，
+       並行數由全域 semaphore 限制，多個批次請求同時進行時也不會超過上限
+
+設定：
+    NUTRITION_BATCH_CONCURRENCY: 同時進行的個別查詢數上限（預設 8）
+    NUTRITION_BATCH_MAX_ITEMS: 單次批次最多的食物名稱數（預設 100）
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from .label_nutrition_service import get_label_nutrition
+from .nutrition_api_service import fetch_nutrition_data
+from .nutrition_search_service import lookup_exact_nutrition_many
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_BATCH_CONCURRENCY = int(os.getenv("NUTRITION_BATCH_CONCURRENCY", "8"))
+NUTRITION_BATCH_MAX_ITEMS = int(os.getenv("NUTRITION_BATCH_MAX_ITEMS", "100"))
+
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, NUTRITION_BATCH_CONCURRENCY))
+    return _semaphore
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _ok(record: Dict[str, Any], source: str) -> Dict[str, Any]:
+    return {"status": "ok", "source": record.get("source") or source, "nutrition": record}
+
+
+def _label_records(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """查詢分類標籤對應表，回傳有對應的名稱；在執行緒池中執行"""
+    records = {}
+    for key in keys:
+        try:
+            record = get_label_nutrition(key)
+        except Exception as e:
+            logger.warning("分類標籤對應表查詢失敗: %s", e)
+            continue
+        if record is not None:
+            records[key] = record
+    return records
+
+
+async def _resolve_remote(name: str) -> Dict[str, Any]:
+    async with _get_semaphore():
+        try:
+            record = await run_in_threadpool(fetch_nutrition_data, name)
+        except Exception as e:
+            logger.warning("批次營養查詢 '%s' 失敗: %s", name, e)
+            return {"status": "error", "error": str(e)}
+    if record is None:
+        return {"status": "not_found"}
+    if "error" in record:
+        return {"status": "error", "error": record["error"]}
+    return _ok(record, "usda")
+
+
+async def lookup_nutrition_batch(food_names: List[str]) -> Dict[str, Any]:
+    """
+    批次查詢每 100g 的營養資訊
+
+    Args:
+        food_names: 食物名稱列表，可包含重複
+
+    Returns:
+        {"results": {輸入名稱: {"status", "source", "nutrition" 或 "error"}}, "stats": {...}}
+        status 為 "ok"、"not_found" 或 "error"；大小寫不同的重複名稱共用同一個查詢結果，
+        空白名稱以原輸入為鍵，回傳 {"status": "error", "error": "empty name"}
+    """
+    start = time.perf_counter()
+    groups: Dict[str, List[str]] = {}
+    empty: List[str] = []
+    for name in food_names:
+        if name.strip():
+            groups.setdefault(_normalize(name), []).append(name.strip())
+        else:
+            empty.append(name)
+
+    resolved: Dict[str, Dict[str, Any]] = {}
+    try:
+        local = await run_in_threadpool(lookup_exact_nutrition_many, list(groups))
+    except Exception as e:
+        logger.warning("批次本地營養查詢失敗，改為逐筆查詢: %s", e)
+        local = {}
+    for key, record in local.items():
+        resolved[key] = _ok(record, "local")
+    local_hits = len(resolved)
+
+    for key, record in (await run_in_threadpool(_label_records, [key for key in groups if key not in resolved])).items():
+        resolved[key] = _ok(record, "label")
+    label_hits = len(resolved) - local_hits
+
+    remaining = [key for key in groups if key not in resolved]
+    for key, result in zip(remaining, await asyncio.gather(*(_resolve_remote(key) for key in remaining))):
+        resolved[key] = result
+
+    results = {name: resolved[key] for key, names in groups.items() for name in names}
+    for name in empty:
+        results[name] = {"status": "error", "error": "empty name"}
+    stats = {
+        "requested": len(food_names),
+        "unique": len(groups),
+        "local": local_hits,
+        "label": label_hits,
+        "searched": len(remaining),
+        "not_found": sum(1 for result in resolved.values() if result["status"] == "not_found"),
+        "errors": sum(1 for result in resolved.values() if result["status"] == "error") + len(set(empty)),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    logger.info("批次營養查詢: %s", stats)
+    return {"results": results, "stats": stats}
+
+
+__all__ = ["lookup_nutrition_batch", "NUTRITION_BATCH_MAX_ITEMS", "NUTRITION_BATCH_CONCURRENCY"]
@@ -0,0 +1,282 @@
+# 檔案路徑: app/services/nutrition_search_service.py
+
+"""
+本地營養資料庫的全文檢索
+
+nutrition 表的食物名稱建立 SQLite FTS5 索引（PostgreSQL 則使用 pg_trgm 三元組索引），
+/api/nutrition/lookup 先在本地依相關度排序查詢，找不到時才呼叫 USDA API。
+不支援全文檢索的資料庫退回 LIKE 查詢。
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, inspect, text
+
+from ..database import engine
+from ..metrics import timed_stage
+from ..models.nutrition import Nutrition, FoodNutrient  # noqa: F401  確保 create_all 建立資料表
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_FIELDS = ("calories", "protein", "fat", "carbs", "fiber", "sugar", "sodium")
+_SELECT_COLUMNS = "n.id, n.food_name, n.chinese_name, n.fdc_id, " + ", ".join(f"n.{f}" for f in NUTRITION_FIELDS)
+
+# 初始化後的檢索方式: "fts5", "trigram" 或 "like"
+_search_backend: Optional[str] = None
+_schema_lock = threading.Lock()
+
+# lookup_local_nutrition 檢查名稱是否相符的候選筆數
+LOOKUP_CANDIDATES = 5
+
+_FTS_STATEMENTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS nutrition_fts USING fts5(
+        food_name, chinese_name, content='nutrition', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    # 外部內容表需要觸發器才能與 nutrition 保持同步
+    """CREATE TRIGGER IF NOT EXISTS nutrition_fts_ai AFTER INSERT ON nutrition BEGIN
+        INSERT INTO nutrition_fts(rowid, food_name, chinese_name) VALUES (new.id, new.food_name, new.chinese_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS nutrition_fts_ad AFTER DELETE ON nutrition BEGIN
+        INSERT INTO nutrition_fts(nutrition_fts, rowid, food_name, chinese_name)
+        VALUES ('delete', old.id, old.food_name, old.chinese_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS nutrition_fts_au AFTER UPDATE OF food_name, chinese_name ON nutrition BEGIN
+        INSERT INTO nutrition_fts(nutrition_fts, rowid, food_name, chinese_name)
+        VALUES ('delete', old.id, old.food_name, old.chinese_name);
+        INSERT INTO nutrition_fts(rowid, food_name, chinese_name) VALUES (new.id, new.food_name, new.chinese_name);
+    END""",
+)
+
+
+def _add_missing_columns(conn):
+    """舊的資料庫沒有 FDC 相關欄位時補上（create_all 不會修改既有資料表）"""
+    columns = {column["name"] for column in inspect(conn).get_columns("nutrition")}
+    if "fdc_id" not in columns:
+        conn.execute(text("ALTER TABLE nutrition ADD COLUMN fdc_id INTEGER"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_nutrition_fdc_id ON nutrition (fdc_id)"))
+    if "data_type" not in columns:
+        conn.execute(text("ALTER TABLE nutrition ADD COLUMN data_type VARCHAR"))
+    # 完全相符查詢不分大小寫，需要運算式索引才不會掃描整張表
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_nutrition_food_name_lower ON nutrition (lower(food_name))"))
+
+
+def ensure_search_index(bind=None) -> str:
+    """
+    建立營養資料表與全文檢索索引（可重複呼叫）
+
+    Returns:
+        使用中的檢索方式: "fts5"、"trigram" 或 "like"
+    """
+    global _search_backend
+    bind = bind or engine
+    with _schema_lock:
+        Nutrition.metadata.create_all(bind=bind, tables=[Nutrition.__table__, FoodNutrient.__table__])
+        with bind.begin() as conn:
+            _add_missing_columns(conn)
+
+        backend = "like"
+        try:
+            if bind.dialect.name == "sqlite":
+                with bind.begin() as conn:
+                    created = not conn.execute(text(
+                        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='nutrition_fts'"
+                    )).first()
+                    for statement in _FTS_STATEMENTS:
+                        conn.execute(text(statement))
+                    if created:
+                        # 新建的索引需要收錄既有資料
+                        conn.execute(text("INSERT INTO nutrition_fts(nutrition_fts) VALUES ('rebuild')"))
+                backend = "fts5"
+            elif bind.dialect.name == "postgresql":
+                with bind.begin() as conn:
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_nutrition_food_name_trgm "
+                        "ON nutrition USING gin (food_name gin_trgm_ops)"
+                    ))
+                backend = "trigram"
+        except Exception as e:
+            logger.warning("無法建立全文檢索索引，改用 LIKE 查詢: %s", e)
+
+        _search_backend = backend
+        return backend
+
+
+def rebuild_search_index(bind=None):
+    """大量匯入後重建 FTS5 索引"""
+    bind = bind or engine
+    if ensure_search_index(bind) == "fts5":
+        with bind.begin() as conn:
+            conn.execute(text("INSERT INTO nutrition_fts(nutrition_fts) VALUES ('rebuild')"))
+            conn.execute(text("INSERT INTO nutrition_fts(nutrition_fts) VALUES ('optimize')"))
+
+
+def _fts_query(query: str, anchored: bool = False) -> Optional[str]:
+    """
+    將使用者輸入轉為 FTS5 查詢：詞之間為 AND，最後一個詞做前綴比對（輸入到一半也能找到）
+
+    anchored=True 時要求食物名稱以第一個詞開頭；FDC 的名稱以主要食材開頭（例如 "Apples, raw"），
+    這類結果最相關，且符合的列數少，排序成本低。
+    """
+    tokens = re.findall(r"\w+", query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    if anchored:
+        return f"food_name : ^{terms[0]} " + " ".join(terms[1:])
+    return " ".join(terms)
+
+
+def _row_to_dict(row, score: Optional[float] = None) -> Dict[str, Any]:
+    result = {
+        "food_name": row.food_name,
+        "chinese_name": row.chinese_name,
+        "fdc_id": row.fdc_id,
+        "source": "local",
+    }
+    for field in NUTRITION_FIELDS:
+        value = getattr(row, field)
+        result[field] = float(value) if value is not None else 0.0
+    if score is not None:
+        result["score"] = round(score, 4)
+    return result
+
+
+_FTS_SEARCH_SQL = text(
+    f"SELECT {_SELECT_COLUMNS}, bm25(nutrition_fts, 10.0, 5.0) AS score "
+    "FROM nutrition_fts JOIN nutrition n ON n.id = nutrition_fts.rowid "
+    "WHERE nutrition_fts MATCH :match ORDER BY score LIMIT :limit"
+)
+
+
+@timed_stage("nutrition_local_search")
+def search_nutrition(query: str, limit: int = 5, bind=None) -> List[Dict[str, Any]]:
+    """
+    依相關度查詢本地營養資料
+
+    完全相同的食物名稱（不分大小寫）排第一，其餘依 FTS5 bm25 或三元組相似度排序。
+
+    Args:
+        query: 食物名稱或關鍵字
+        limit: 最多回傳筆數
+
+    Returns:
+        與 fetch_nutrition_data 相同格式的字典列表，另含 fdc_id、source 與 score
+    """
+    bind = bind or engine
+    query = query.strip()
+    if not query:
+        return []
+    backend = _search_backend or ensure_search_index(bind)
+
+    with bind.connect() as conn:
+        exact = conn.execute(
+            text(f"SELECT {_SELECT_COLUMNS} FROM nutrition n WHERE lower(n.food_name) = lower(:q) LIMIT 1"),
+            {"q": query},
+        ).first()
+        results = [_row_to_dict(exact, 0.0)] if exact else []
+        if len(results) >= limit:
+            return results
+
+        exclude_id = exact.id if exact else -1
+        remaining = limit - len(results)
+        if backend == "fts5":
+            # 先找以查詢詞開頭的名稱，不足時再放寬為任意位置
+            seen = {exclude_id}
+            for anchored in (True, False):
+                match = _fts_query(query, anchored)
+                if not match or len(results) >= limit:
+                    break
+                rows = conn.execute(_FTS_SEARCH_SQL, {"match": match, "limit": limit - len(results) + len(seen)}).all()
+                for row in rows:
+                    if row.id not in seen and len(results) < limit:
+                        seen.add(row.id)
+                        results.append(_row_to_dict(row, row.score))
+        elif backend == "trigram":
+            rows = conn.execute(text(
+                f"SELECT {_SELECT_COLUMNS}, similarity(n.food_name, :q) AS score FROM nutrition n "
+                "WHERE n.food_name % :q AND n.id != :exclude ORDER BY score DESC LIMIT :limit"
+            ), {"q": query, "exclude": exclude_id, "limit": remaining}).all()
+            results.extend(_row_to_dict(row, row.score) for row in rows)
+        else:
+            rows = conn.execute(text(
+                f"SELECT {_SELECT_COLUMNS} FROM nutrition n "
+                "WHERE lower(n.food_name) LIKE lower(:pattern) AND n.id != :exclude "
+                "ORDER BY length(n.food_name) LIMIT :limit"
+            ), {"pattern": f"%{query}%", "exclude": exclude_id, "limit": remaining}).all()
+            results.extend(_row_to_dict(row) for row in rows)
+
+    return results
+
+
+def _singular(word: str) -> str:
+    if len(word) > 3 and word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words(name: str) -> List[str]:
+    # 去除複數字尾，讓 "apple" 可以對應 FDC 的 "Apples, raw"
+    return [_singular(word) for word in re.findall(r"\w+", name.lower())]
+
+
+def _names_food(record: Dict[str, Any], food_name: str) -> bool:
+    """
+    名稱是否就是查詢的食物：中文名稱相同，或英文名稱第一個逗號前的部分與查詢的詞完全相同
+
+    FDC 的名稱以主要食材開頭，逗號後為描述（"Apples, raw, with skin"），
+    而 "Apple pie" 只是以查詢詞開頭的另一種食物。
+    """
+    if (record.get("chinese_name") or "").strip() == food_name.strip():
+        return True
+    words = _words(food_name)
+    return bool(words) and _words(record["food_name"].split(",")[0]) == words
+
+
+def lookup_local_nutrition(food_name: str, bind=None) -> Optional[Dict[str, Any]]:
+    """
+    回傳本地資料庫中名稱相符的營養資料，找不到時回傳 None
+
+    全文檢索的前綴與 AND 比對會找到名稱只是包含查詢詞的食物（"apple" → "Apple pie"），
+    這裡的結果會直接取代 USDA 查詢，因此只採用完全相符或名稱主體相同的資料。
+    """
+    for record in search_nutrition(food_name, limit=LOOKUP_CANDIDATES, bind=bind):
+        if _names_food(record, food_name):
+            return record
+    return None
+
+
+_EXACT_MANY_SQL = text(
+    f"SELECT {_SELECT_COLUMNS}, lower(n.food_name) AS name_key FROM nutrition n WHERE lower(n.food_name) IN :names"
+).bindparams(bindparam("names", expanding=True))
+
+
+@timed_stage("nutrition_local_batch")
+def lookup_exact_nutrition_many(food_names: Iterable[str], bind=None) -> Dict[str, Dict[str, Any]]:
+    """
+    以一次查詢取得多個食物名稱完全相符（不分大小寫）的營養資料
+
+    Returns:
+        {小寫食物名稱: 營養資料}，找不到的名稱不在結果中
+    """
+    bind = bind or engine
+    names = list(dict.fromkeys(name.strip().lower() for name in food_names if name.strip()))
+    if not names:
+        return {}
+    _search_backend or ensure_search_index(bind)
+    with bind.connect() as conn:
+        rows = conn.execute(_EXACT_MANY_SQL, {"names": names}).all()
+    return {row.name_key: _row_to_dict(row, 0.0) for row in rows}
+
+
+__all__ = [
+    "ensure_search_index", "rebuild_search_index", "search_nutrition", "lookup_local_nutrition",
+    "lookup_exact_nutrition_many",
+    "NUTRITION_FIELDS",
+]
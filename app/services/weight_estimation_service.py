@@ -7,9 +7,9 @@ import io
 from typing import Dict, Any, List, Optional, Tuple
 import random
 from .ai_service import classify_food_image  # 引入真實的 AI 分類函數
+from ..metrics import record_fallback
+from .fuzzy_match_service import FuzzyIndex, match_density_category
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # 食物密度表 (g/cm³) - 常見食物的平均密度
@@ -162,12 +162,13 @@ class WeightEstimationService:
             # 限制在合理範圍內
             pixel_ratio = max(0.001, min(0.1, pixel_ratio))
             
-            logger.info(f"動態像素比例計算 - 食物: {food_type}, 畫面佔比: {food_ratio:.3f}, 預估面積: {estimated_area:.1f} cm², 像素比例: {pixel_ratio:.4f}")
+            logger.debug("動態像素比例計算 - 食物: %s, 畫面佔比: %.3f, 預估面積: %.1f cm², 像素比例: %.4f",
+                         food_type, food_ratio, estimated_area, pixel_ratio)
             
             return pixel_ratio
             
         except Exception as e:
-            logger.warning(f"動態像素比例計算失敗: {e}，使用預設值")
+            logger.warning("動態像素比例計算失敗: %s，使用預設值", e)
             return 0.01  # 預設值
 
     def calculate_volume_and_weight(self, 
@@ -179,12 +180,12 @@ class WeightEstimationService:
         """計算體積和重量 (改進版本)"""
         try:
             food_pixels = np.sum(mask)
-            logger.info(f"重量計算開始 - 食物: {food_type}, 像素數量: {food_pixels}")
+            logger.debug("重量計算開始 - 食物: %s, 像素數量: %s", food_type, food_pixels)
 
             if pixel_to_cm_ratio:
                 # --- 主要路徑：有參考物，進行精準計算 ---
                 area_cm2 = food_pixels * (pixel_to_cm_ratio ** 2)
-                logger.info(f"精準計算 - 像素比例: {pixel_to_cm_ratio}, 實際面積: {area_cm2:.2f} cm²")
+                logger.debug("精準計算 - 像素比例: %s, 實際面積: %.2f cm²", pixel_to_cm_ratio, area_cm2)
                 
                 # 預設形狀因子
                 shape_factor = 0.5 
@@ -199,30 +200,30 @@ class WeightEstimationService:
                                 normalized_depth = (food_depth_values - min_depth) / (max_depth - min_depth)
                                 dynamic_shape_factor = np.mean(normalized_depth)
                                 shape_factor = np.clip(dynamic_shape_factor, 0.2, 0.8)
-                                logger.info(f"使用深度圖將食物 '{food_type}' 的形狀因子動態調整為 {shape_factor:.2f}")
+                                logger.debug("使用深度圖將食物 '%s' 的形狀因子動態調整為 %.2f", food_type, shape_factor)
                     except Exception as e:
-                        logger.warning(f"分析深度圖以調整形狀因子時失敗: {e}，將使用預設值 0.5。")
+                        logger.warning("分析深度圖以調整形狀因子時失敗: %s，將使用預設值 0.5。", e)
 
                 actual_volume = shape_factor * (area_cm2 ** 1.5)
-                logger.info(f"體積計算 - 形狀因子: {shape_factor}, 估算體積: {actual_volume:.2f} cm³")
+                logger.debug("體積計算 - 形狀因子: %s, 估算體積: %.2f cm³", shape_factor, actual_volume)
                 
                 food_density = self.get_food_density(food_type)
                 weight = actual_volume * food_density
-                logger.info(f"重量計算 - 密度: {food_density} g/cm³, 原始重量: {weight:.2f} g")
+                logger.debug("重量計算 - 密度: %s g/cm³, 原始重量: %.2f g", food_density, weight)
                 
                 confidence = 0.8 if depth_map is not None else 0.75
                 error_range = 0.25
                 
             else:
                 # --- 後備路徑：無參考物，使用畫面佔比估算 ---
-                logger.warning(f"無 pixel_to_cm_ratio，對食物 '{food_type}' 啟用基於畫面佔比的後備估算。")
+                logger.warning("無 pixel_to_cm_ratio，對食物 '%s' 啟用基於畫面佔比的後備估算。", food_type)
                 if image_area_pixels and image_area_pixels > 0:
                     # 假設標準餐點重量為 350g，並根據食物佔畫面的比例進行調整
                     screen_ratio = food_pixels / image_area_pixels
                     base_weight = 350 
                     base_ratio = 0.25
                     weight = base_weight * (screen_ratio / base_ratio)
-                    logger.info(f"後備估算 - 畫面佔比: {screen_ratio:.3f}, 估算重量: {weight:.2f} g")
+                    logger.debug("後備估算 - 畫面佔比: %.3f, 估算重量: %.2f g", screen_ratio, weight)
                     confidence = 0.4
                     error_range = 0.6
                 else:
@@ -230,35 +231,32 @@ class WeightEstimationService:
                     confidence = 0.2
                     error_range = 0.8
                 
-                logger.info(f"後備估算結果：重量 {weight:.2f}g, 信心度 {confidence}, 誤差範圍 {error_range}")
+                logger.debug("後備估算結果：重量 %.2fg, 信心度 %s, 誤差範圍 %s", weight, confidence, error_range)
 
             # 對單一物件的重量做一個合理性檢查
             if weight > 1500:
-                logger.warning(f"單一物件預估重量 {weight:.2f}g 過高，可能不準確。")
+                logger.warning("單一物件預估重量 %.2fg 過高，可能不準確。", weight)
                 weight = 1500
 
-            logger.info(f"最終結果 - 重量: {weight:.2f}g, 信心度: {confidence:.2f}")
+            logger.debug("最終結果 - 重量: %.2fg, 信心度: %.2f", weight, confidence)
             return weight, confidence, error_range
 
         except Exception as e:
-            logger.error(f"體積重量計算失敗: {str(e)}")
+            logger.error("體積重量計算失敗: %s", str(e))
             return 150.0, 0.3, 0.5
 
     def get_food_density(self, food_name: str) -> float:
         """根據食物名稱取得密度"""
-        food_name_lower = food_name.lower()
-        
-        # 簡單的關鍵字匹配
-        if any(keyword in food_name_lower for keyword in ["rice", "飯"]):
-            return FOOD_DENSITY_TABLE["rice"]
-        elif any(keyword in food_name_lower for keyword in ["noodle", "麵"]):
-            return FOOD_DENSITY_TABLE["noodles"]
-        elif any(keyword in food_name_lower for keyword in ["meat", "肉", "chicken", "pork", "beef", "lamb"]):
-            return FOOD_DENSITY_TABLE["meat"]
-        elif any(keyword in food_name_lower for keyword in ["vegetable", "菜"]):
-            return FOOD_DENSITY_TABLE["vegetables"]
-        else:
-            return FOOD_DENSITY_TABLE["default"]
+        category = match_density_category(food_name)
+        return FOOD_DENSITY_TABLE[category or "default"]
+
+# FOOD_DATABASE 的模糊比對索引，分類結果與資料庫鍵的拼法不同時也能對應
+_food_index = FuzzyIndex((name, name) for name in FOOD_DATABASE)
+
+
+def match_food_key(food_name: str) -> Optional[str]:
+    """將食物名稱對應到 FOOD_DATABASE 的鍵，例如 "Fried Rice" → fried_rice，沒有相符時回傳 None"""
+    return _food_index.best(food_name)
 
 # 創建服務實例
 weight_service = WeightEstimationService()
@@ -276,12 +274,13 @@ async def estimate_food_weight(image_bytes: bytes) -> Dict[str, Any]:
         
         # 如果 AI 模型失敗，使用備用方案
         if detected_food.startswith("Error") or detected_food == "Unknown":
-            logger.warning(f"AI 模型辨識失敗: {detected_food}，使用備用方案")
+            logger.warning("AI 模型辨識失敗: %s，使用備用方案", detected_food)
+            record_fallback("v1_random_food")
             food_names = list(FOOD_DATABASE.keys())
             detected_food = random.choice(food_names)
         
-        # 標準化食物名稱（轉小寫，移除空格）
-        detected_food_normalized = detected_food.lower().replace(' ', '_')
+        # 對應到營養資料庫的鍵（容許大小寫、空格、複數與拼字差異）
+        food_key = match_food_key(detected_food)
         
         # 2. 模擬物件偵測
         detected_objects = weight_service.detect_objects(image)
@@ -324,7 +323,7 @@ async def estimate_food_weight(image_bytes: bytes) -> Dict[str, Any]:
             weight_variation = random.uniform(0.8, 1.2)
             estimated_weight = base_weight * weight_variation
             
-            food_density = FOOD_DATABASE.get(detected_food_normalized, {}).get("density", 0.8)
+            food_density = FOOD_DATABASE.get(food_key, {}).get("density", 0.8)
             estimated_weight *= food_density
             estimated_weight = max(50, min(500, estimated_weight))
             
@@ -332,7 +331,7 @@ async def estimate_food_weight(image_bytes: bytes) -> Dict[str, Any]:
             error_range = random.uniform(0.1, 0.25)
         
         # 6. 獲取營養資訊
-        nutrition_base = FOOD_DATABASE.get(detected_food_normalized, FOOD_DATABASE["rice"]).copy()
+        nutrition_base = FOOD_DATABASE[food_key or "rice"].copy()
         del nutrition_base["density"]  # 移除密度信息
         
         # 根據重量調整營養素
@@ -358,7 +357,7 @@ async def estimate_food_weight(image_bytes: bytes) -> Dict[str, Any]:
         else:
             note = "未檢測到參考物，重量為估算值，僅供參考"
         
-        logger.info(f"分析完成：{detected_food}, 重量：{estimated_weight:.1f}g, 信心度：{confidence:.2f}")
+        logger.info("分析完成：%s, 重量：%.1fg, 信心度：%.2f", detected_food, estimated_weight, confidence)
         
         return {
             "food_type": detected_food,
@@ -373,7 +372,7 @@ async def estimate_food_weight(image_bytes: bytes) -> Dict[str, Any]:
         }
         
     except Exception as e:
-        logger.error(f"重量估算失敗: {str(e)}")
+        logger.error("重量估算失敗: %s", str(e))
         # 回傳預設結果
         return {
             "food_type": "Unknown",
@@ -1,17 +1,22 @@
 # 檔案路徑: app/services/weight_estimation_service_v2.py
 
 import logging
+import os
 import numpy as np
 from PIL import Image
 import io
 from typing import Dict, Any, List, Optional, Tuple
-import torch
-import cv2
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO)
+from ..metrics import ANALYSIS_PATHS, stage_timer, suppress_analysis_metrics, timed_stage, record_fallback
+from .debug_writer import get_debug_writer, should_capture
+from .fuzzy_match_service import match_density_category
+
 logger = logging.getLogger(__name__)
 
+# 串接 (cascade) 模式：只有一項食物且整張圖的分類信心度足夠時，略過分割與深度估計
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() in ("1", "true", "yes")
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.6"))
+
 # 食物密度表 (g/cm³) - 常見食物的平均密度
 FOOD_DENSITY_TABLE = {
     "rice": 0.8,           # 米飯
@@ -60,19 +65,32 @@ class WeightEstimationServiceV2:
         from .lightweight_model_service import LightweightModelService
         self.model_service = LightweightModelService(model_config)
         
-        logger.info(f"✅ 重量估算服務 V2 初始化完成，使用配置: {self.model_config}")
+        logger.info("✅ 重量估算服務 V2 初始化完成，使用配置: %s", self.model_config)
     
     def detect_objects(self, image: Image.Image) -> List[Dict[str, Any]]:
         """使用輕量化模型服務偵測圖片中的所有物體"""
-        return self.model_service.detect_objects(image)
+        with stage_timer("detection"):
+            return self.model_service.detect_objects(image)
     
     def segment_food(self, image: Image.Image, input_boxes: List[List[float]]) -> List[np.ndarray]:
         """使用輕量化模型服務分割食物區域"""
-        return self.model_service.segment_food(image, input_boxes)
+        with stage_timer("segmentation"):
+            return self.model_service.segment_food(image, input_boxes)
     
     def estimate_depth(self, image: Image.Image) -> Optional[np.ndarray]:
         """使用輕量化模型服務進行深度估計"""
-        return self.model_service.estimate_depth(image)
+        with stage_timer("depth"):
+            return self.model_service.estimate_depth(image)
+
+    def detect_objects_batch(self, images: List[Image.Image]) -> List[List[Dict[str, Any]]]:
+        """使用輕量化模型服務批次偵測多張圖片"""
+        with stage_timer("detection_batch"):
+            return self.model_service.detect_objects_batch(images)
+
+    def estimate_depth_batch(self, images: List[Image.Image]) -> List[Optional[np.ndarray]]:
+        """使用輕量化模型服務批次進行深度估計"""
+        with stage_timer("depth_batch"):
+            return self.model_service.estimate_depth_batch(images)
 
     def calculate_volume_and_weight(self, 
                                   mask: np.ndarray, 
@@ -100,9 +118,9 @@ class WeightEstimationServiceV2:
                                 normalized_depth = (food_depth_values - min_depth) / (max_depth - min_depth)
                                 dynamic_shape_factor = np.mean(normalized_depth)
                                 shape_factor = np.clip(dynamic_shape_factor, 0.2, 0.8)
-                                logger.info(f"使用深度圖將食物 '{food_type}' 的形狀因子動態調整為 {shape_factor:.2f}")
+                                logger.debug("使用深度圖將食物 '%s' 的形狀因子動態調整為 %.2f", food_type, shape_factor)
                     except Exception as e:
-                        logger.warning(f"分析深度圖以調整形狀因子時失敗: {e}，將使用預設值 0.5。")
+                        logger.warning("分析深度圖以調整形狀因子時失敗: %s，將使用預設值 0.5。", e)
 
                 actual_volume = shape_factor * (area_cm2 ** 1.5)
                 
@@ -112,7 +130,8 @@ class WeightEstimationServiceV2:
                 
             else:
                 # --- 後備路徑：無參考物，使用畫面佔比估算 ---
-                logger.warning(f"無 pixel_to_cm_ratio，對食物 '{food_type}' 啟用基於畫面佔比的後備估算。")
+                record_fallback("screen_ratio_weight")
+                logger.warning("無 pixel_to_cm_ratio，對食物 '%s' 啟用基於畫面佔比的後備估算。", food_type)
                 if image_area_pixels and image_area_pixels > 0:
                     # 假設標準餐點重量為 350g，並根據食物佔畫面的比例進行調整
                     screen_ratio = food_pixels / image_area_pixels
@@ -126,34 +145,23 @@ class WeightEstimationServiceV2:
                     confidence = 0.2
                     error_range = 0.8
                 
-                logger.info(f"後備估算結果：重量 {weight:.2f}g, 信心度 {confidence}, 誤差範圍 {error_range}")
+                logger.debug("後備估算結果：重量 %.2fg, 信心度 %s, 誤差範圍 %s", weight, confidence, error_range)
 
             # 對單一物件的重量做一個合理性檢查
             if weight > 1500:
-                logger.warning(f"單一物件預估重量 {weight:.2f}g 過高，可能不準確。")
+                logger.warning("單一物件預估重量 %.2fg 過高，可能不準確。", weight)
                 weight = 1500
 
             return weight, confidence, error_range
 
         except Exception as e:
-            logger.error(f"體積重量計算失敗: {str(e)}")
+            logger.error("體積重量計算失敗: %s", str(e))
             return 150.0, 0.3, 0.5
     
     def get_food_density(self, food_name: str) -> float:
         """根據食物名稱取得密度"""
-        food_name_lower = food_name.lower()
-        
-        # 簡單的關鍵字匹配
-        if any(keyword in food_name_lower for keyword in ["rice", "飯"]):
-            return FOOD_DENSITY_TABLE["rice"]
-        elif any(keyword in food_name_lower for keyword in ["noodle", "麵"]):
-            return FOOD_DENSITY_TABLE["noodles"]
-        elif any(keyword in food_name_lower for keyword in ["meat", "肉", "chicken", "pork", "beef", "lamb"]):
-            return FOOD_DENSITY_TABLE["meat"]
-        elif any(keyword in food_name_lower for keyword in ["vegetable", "菜"]):
-            return FOOD_DENSITY_TABLE["vegetables"]
-        else:
-            return FOOD_DENSITY_TABLE["default"]
+        category = match_density_category(food_name)
+        return FOOD_DENSITY_TABLE[category or "default"]
     
     def get_model_info(self) -> Dict[str, Any]:
         """獲取當前使用的模型資訊"""
@@ -166,247 +174,806 @@ class WeightEstimationServiceV2:
 # 全域服務實例
 weight_service_v2 = WeightEstimationServiceV2()
 
+# 可作為比例尺的參考物標籤
+REFERENCE_LABELS = ["plate", "bowl", "credit_card", "coin"]
+
 async def estimate_food_weight_v2(image_bytes: bytes, 
                                 model_config: Optional[Dict[str, str]] = None,
-                                debug: bool = False) -> Dict[str, Any]:
+                                debug: bool = False,
+                                cascade: Optional[bool] = None) -> Dict[str, Any]:
     """
     整合食物辨識、重量估算與營養分析的主函數 (V2 - 輕量化方案)
     使用可配置的輕量化模型組合
     """
+    return analyze_food_image_v2(image_bytes=image_bytes, model_config=model_config, debug=debug, cascade=cascade)
+
+def get_service_for_config(model_config: Optional[Dict[str, str]] = None) -> WeightEstimationServiceV2:
+    """取得對應配置的服務實例，未提供配置時使用全域實例"""
+    if model_config:
+        return WeightEstimationServiceV2(model_config)
+    return weight_service_v2
+
+def decode_image(image_bytes: bytes) -> Image.Image:
+    """將圖片位元組解碼為 RGB 圖片"""
+    with stage_timer("decode"):
+        return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+
+def encode_image(image: Image.Image, format: str = "JPEG") -> bytes:
+    """將圖片編碼為位元組，供分類模型使用"""
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+def create_debug_dir() -> str:
+    """取得本次分析的除錯輸出目錄，目錄與檔案由背景寫入器建立"""
+    return get_debug_writer().new_run_dir()
+
+@timed_stage("calibration")
+def calibrate_reference_object(all_objects: List[Dict[str, Any]],
+                               image_area_pixels: int) -> Tuple[Optional[float], Optional[str], List[Dict[str, Any]]]:
+    """
+    從偵測結果中挑選參考物並計算全域 pixel_to_cm_ratio
+
+    Returns:
+        (pixel_to_cm_ratio, 參考物標籤, 所有參考物候選)
+    """
+    pixel_to_cm_ratio = None
+    reference_object_label = None
+    
+    # 所有偵測到的參考物候選
+    all_ref_candidates = [obj for obj in all_objects if obj["label"] in REFERENCE_LABELS]
+
+    logger.debug("偵測到 %s 個參考物候選: %s", len(all_ref_candidates), [o['label'] for o in all_ref_candidates])
+    for obj in all_ref_candidates:
+        bbox = obj.get("bbox")
+        bbox_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+        area_percentage = (bbox_area / image_area_pixels) * 100
+        logger.debug("候選參考物 '%s' 佔畫面 %.2f%% (Bbox: %s)", obj['label'], area_percentage, [int(c) for c in bbox])
+
+    # 可靠的參考物（通過尺寸檢測）
+    potential_refs = [
+        obj for obj in all_ref_candidates 
+        if (obj["bbox"][2]-obj["bbox"][0]) * (obj["bbox"][3]-obj["bbox"][1]) > image_area_pixels * 0.01
+    ]
+
+    if potential_refs:
+        # 選擇最大的參考物
+        best_ref = max(potential_refs, key=lambda obj: (obj["bbox"][2]-obj["bbox"][0]) * (obj["bbox"][3]-obj["bbox"][1]))
+        reference_object_label = best_ref["label"]
+        ref_type = best_ref.get("label")
+        ref_bbox = best_ref.get("bbox")
+        ref_size_cm = REFERENCE_OBJECTS.get(ref_type)
+
+        if ref_size_cm and ref_bbox:
+            px_w = ref_bbox[2] - ref_bbox[0]
+            px_h = ref_bbox[3] - ref_bbox[1]
+            
+            if "diameter" in ref_size_cm and px_w > 0:
+                # 圓形參考物 (盤子、碗、硬幣)
+                px_diameter = px_w
+                pixel_to_cm_ratio = ref_size_cm["diameter"] / px_diameter
+                logger.info("成功使用圓形參考物 '%s' (%.1f px) 計算出 pixel_to_cm_ratio: %.4f",
+                            reference_object_label, px_diameter, pixel_to_cm_ratio)
+            elif "width" in ref_size_cm and "height" in ref_size_cm and px_w > 0 and px_h > 0:
+                # 矩形參考物 (信用卡)
+                pixel_to_cm_ratio = ref_size_cm["width"] / px_w
+                logger.info("成功使用矩形參考物 '%s' (%.1fx%.1f px) 計算出 pixel_to_cm_ratio: %.4f",
+                            reference_object_label, px_w, px_h, pixel_to_cm_ratio)
+        
+        if not pixel_to_cm_ratio:
+             reference_object_label = None
+             logger.warning("偵測到參考物 '%s'，但計算其比例失敗。", best_ref['label'])
+
+    return pixel_to_cm_ratio, reference_object_label, all_ref_candidates
+
+def extract_food_items(service: WeightEstimationServiceV2,
+                       image: Image.Image,
+                       food_objects: List[Dict[str, Any]],
+                       image_area_pixels: int,
+                       debug_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    分割每個食物物件並裁切出辨識用的去背圖片
+
+    Returns:
+        每個有效食物的 {"label", "bbox", "mask", "crop_bytes"}
+    """
+    return list(iter_food_items(service, image, food_objects, image_area_pixels, debug_dir))
+
+def iter_food_items(service: WeightEstimationServiceV2,
+                    image: Image.Image,
+                    food_objects: List[Dict[str, Any]],
+                    image_area_pixels: int,
+                    debug_dir: Optional[str] = None):
+    """逐一分割並裁切食物物件，每完成一項即產生結果（供串流分析使用）"""
+    for i, food_obj in enumerate(food_objects):
+        try:
+            # a. 分割
+            input_box = [food_obj["bbox"]]
+            masks = service.segment_food(image, input_boxes=input_box)
+            if not masks: continue
+            mask = max(masks, key=lambda m: np.sum(m))
+
+            # 遮罩過濾器
+            mask_pixels = np.sum(mask)
+            if mask_pixels > image_area_pixels * 0.9:
+                logger.warning("過濾掉一個可疑的過大食物遮罩 (來自 YOLO 的 '%s'), 其遮罩佔據了畫面的 %.2f%%。",
+                               food_obj['label'], mask_pixels / image_area_pixels * 100)
+                continue
+
+            # b. 裁切 (辨識用)
+            if mask.ndim == 3: mask = mask[0]
+            if mask.ndim != 2: continue
+            rows, cols = np.any(mask, axis=1), np.any(mask, axis=0)
+            if not np.any(rows) or not np.any(cols): continue
+            rmin, rmax = np.where(rows)[0][[0, -1]]
+            cmin, cmax = np.where(cols)[0][[0, -1]]
+            item_array = np.array(image); item_rgba = np.zeros((*item_array.shape[:2], 4), dtype=np.uint8)
+            item_rgba[:,:,:3] = item_array; item_rgba[:,:,3] = mask * 255
+            cropped_pil = Image.fromarray(item_rgba[rmin:rmax+1, cmin:cmax+1, :], 'RGBA')
+            item_image_bytes = encode_image(cropped_pil, format="PNG")
+            if debug_dir:
+                get_debug_writer().save_image(debug_dir, f"item_{i}_{food_obj['label']}_cropped.png", cropped_pil)
+
+            yield {"label": food_obj["label"], "bbox": food_obj["bbox"], "mask": mask, "crop_bytes": item_image_bytes}
+        except Exception as item_e:
+            logger.error("處理物件 '%s' 時失敗: %s", food_obj['label'], str(item_e))
+            continue
+
+def ellipse_mask(bbox: List[float], height: int, width: int) -> np.ndarray:
+    """以邊界框的內切橢圓近似食物遮罩（略過分割模型時使用）"""
+    x1, y1 = max(0.0, float(bbox[0])), max(0.0, float(bbox[1]))
+    x2, y2 = min(float(width), float(bbox[2])), min(float(height), float(bbox[3]))
+    mask = np.zeros((height, width), dtype=bool)
+    if x2 <= x1 or y2 <= y1:
+        return mask
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    rx, ry = (x2 - x1) / 2, (y2 - y1) / 2
+    ys, xs = np.ogrid[:height, :width]
+    mask[((xs + 0.5 - cx) / rx) ** 2 + ((ys + 0.5 - cy) / ry) ** 2 <= 1.0] = True
+    return mask
+
+def try_fast_path(image: Image.Image,
+                  image_bytes: Optional[bytes],
+                  food_objects: List[Dict[str, Any]]) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+    """
+    串接模式的快速路徑：只有一項食物時，以整張圖的分類結果代替分割後的裁切辨識
+
+    Returns:
+        (items, food_names)；多項食物、分類失敗或信心度低於 CASCADE_MIN_CONFIDENCE 時回傳 None，
+        呼叫端應改走完整流程
+    """
+    from .ai_service import classify_food_image_with_score
+
+    if len(food_objects) != 1:
+        return None
+
+    if image_bytes is None:
+        image_bytes = encode_image(image)
+    food_name, score = classify_food_image_with_score(image_bytes)
+    if food_name.startswith("Error") or food_name.lower() in ("unknown", "other"):
+        return None
+    if score < CASCADE_MIN_CONFIDENCE:
+        logger.debug("整張圖分類信心度 %.2f 低於 %.2f，改走完整流程", score, CASCADE_MIN_CONFIDENCE)
+        return None
+
+    food_obj = food_objects[0]
+    mask = ellipse_mask(food_obj["bbox"], image.height, image.width)
+    if not mask.any():
+        return None
+    item = {"label": food_obj["label"], "bbox": food_obj["bbox"], "mask": mask, "crop_bytes": None}
+    return [item], [food_name]
+
+def get_cascade_stats() -> Dict[str, Any]:
+    """串接模式的設定，以及目前為止各流程處理的分析數與快速路徑比例"""
+    fast = int(ANALYSIS_PATHS.get(path="fast"))
+    full = int(ANALYSIS_PATHS.get(path="full"))
+    total = fast + full
+    return {
+        "enabled": CASCADE_ENABLED,
+        "min_confidence": CASCADE_MIN_CONFIDENCE,
+        "fast": fast,
+        "full": full,
+        "fast_path_ratio": round(fast / total, 4) if total else 0.0,
+    }
+
+def summarize_food_items(service: WeightEstimationServiceV2,
+                         items: List[Dict[str, Any]],
+                         food_names: List[str],
+                         pixel_to_cm_ratio: Optional[float],
+                         depth_map: Optional[np.ndarray],
+                         image_area_pixels: int) -> Tuple[List[Dict[str, Any]], Dict[str, float], List[np.ndarray]]:
+    """
+    根據辨識結果計算每項食物的重量與營養
+
+    Returns:
+        (detected_foods, total_nutrition, 對應的遮罩列表)
+    """
+    from .label_nutrition_service import lookup_label_nutrition
+    from .nutrition_search_service import NUTRITION_FIELDS
+
+    detected_foods = []
+    food_masks = []
+    total_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0}
+
+    for item, food_name in zip(items, food_names):
+        try:
+            mask = item["mask"]
+
+            # d. 計算體積和重量
+            weight, confidence, error_range = service.calculate_volume_and_weight(
+                mask, 
+                food_name, 
+                pixel_to_cm_ratio=pixel_to_cm_ratio,
+                depth_map=depth_map,
+                image_area_pixels=image_area_pixels
+            )
+            
+            # e. 查詢營養資訊：分類標籤先查預先建立的對應表，沒有對應才搜尋
+            nutrition_info = lookup_label_nutrition(food_name)
+            if nutrition_info is None:
+                nutrition_info = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0}
+
+            # f. 根據重量調整營養素（只換算營養素欄位，不含 fdc_id 等中繼資料）
+            weight_ratio = weight / 100
+            adjusted_nutrition = {
+                k: v * weight_ratio for k, v in nutrition_info.items()
+                if k in NUTRITION_FIELDS and isinstance(v, (int, float))
+            }
+            
+            # g. 累加總營養
+            for key in total_nutrition: total_nutrition[key] += adjusted_nutrition.get(key, 0)
+
+            # h. 儲存單項食物結果
+            detected_foods.append({
+                "food_name": food_name,
+                "estimated_weight": round(weight, 1),
+                "nutrition": {k: round(v, 1) for k, v in adjusted_nutrition.items()}
+            })
+            food_masks.append(mask)
+        except Exception as item_e:
+            logger.error("處理物件 '%s' 時失敗: %s", item['label'], str(item_e))
+            continue
+
+    return detected_foods, total_nutrition, food_masks
+
+def build_analysis_note(detected_foods: List[Dict[str, Any]],
+                        pixel_to_cm_ratio: Optional[float],
+                        reference_object_label: Optional[str],
+                        all_ref_candidates: List[Dict[str, Any]]) -> str:
+    """生成分析結果備註"""
+    if detected_foods:
+        if pixel_to_cm_ratio and reference_object_label:
+            return f"已使用 '{reference_object_label}' 作為參考物，成功分析 {len(detected_foods)} 項食物，準確度較高。"
+        elif all_ref_candidates:
+            too_small_ref_labels = list(set([o['label'] for o in all_ref_candidates]))
+            return f"警告：雖偵測到 {too_small_ref_labels}，但其佔比過小無法作為精準參考。結果為AI基於畫面比例估算，僅供參考。"
+        else:
+            return f"未能找到可靠參考物。結果為AI基於畫面比例估算，僅供參考。"
+    return "分析失敗：AI 無法辨識出任何可信的食物項目。請嘗試手動搜尋。"
+
+def no_objects_result(debug_dir: Optional[str] = None) -> Dict[str, Any]:
+    """未偵測到任何物體時的結果"""
+    note = "無法從圖片中偵測到任何物體。"
+    result = {"detected_foods": [], "total_estimated_weight": 0, "total_nutrition": {}, "note": note}
+    if debug_dir: result["debug_output_path"] = debug_dir
+    return result
+
+def failed_analysis_result(error: Exception, debug_dir: Optional[str] = None) -> Dict[str, Any]:
+    """主流程發生例外時的結果"""
+    result = {
+        "detected_foods": [],
+        "total_estimated_weight": 0,
+        "total_nutrition": {},
+        "reference_object": None,
+        "note": f"分析失敗: {str(error)}"
+    }
+    if debug_dir:
+        result["debug_output_path"] = debug_dir
+    return result
+
+def save_detection_debug_image(image: Image.Image, all_objects: List[Dict[str, Any]], debug_dir: str):
+    """輸出物件偵測結果的除錯圖片（於背景繪製）"""
+    def render(path: str):
+        from PIL import ImageDraw
+        debug_image = image.copy()
+        draw = ImageDraw.Draw(debug_image)
+        for obj in all_objects:
+            bbox = obj.get("bbox")
+            label = obj.get("label", "unknown")
+            draw.rectangle(bbox, outline="red", width=3)
+            draw.text((bbox[0], bbox[1]), label, fill="red")
+        debug_image.save(path)
+
+    get_debug_writer().submit(debug_dir, "01_detected_objects.jpg", render)
+
+def save_depth_debug_image(depth_map: np.ndarray, debug_dir: str):
+    """輸出深度圖的除錯圖片（於背景轉換）"""
+    def render(path: str):
+        depth_for_save = (depth_map - np.min(depth_map)) / (np.max(depth_map) - np.min(depth_map) + 1e-6) * 255.0
+        Image.fromarray(depth_for_save.astype(np.uint8)).convert("L").save(path)
+
+    get_debug_writer().submit(debug_dir, "03_depth_map.png", render)
+
+def save_segmentation_debug_image(image: Image.Image, masks: List[np.ndarray], debug_dir: str):
+    """以已計算好的遮罩輸出分割結果疊圖（於背景繪製），不重新執行分割模型"""
+    def render(path: str):
+        overlay_array = np.array(image)
+        rng = np.random.default_rng()
+        for mask in masks:
+            color = rng.integers(0, 255, size=3, dtype=np.uint8)
+            if mask.ndim == 3: mask = mask[0]
+            overlay_array[mask] = (overlay_array[mask] * 0.5 + color * 0.5).astype(np.uint8)
+        Image.fromarray(overlay_array).save(path)
+
+    get_debug_writer().submit(debug_dir, "02_final_segmentation.jpg", render)
+
+def complete_food_analysis(service: WeightEstimationServiceV2,
+                           image: Image.Image,
+                           image_bytes: Optional[bytes],
+                           food_objects: List[Dict[str, Any]],
+                           items: List[Dict[str, Any]],
+                           food_names: List[str],
+                           calibration: Tuple[Optional[float], Optional[str], List[Dict[str, Any]]],
+                           depth_map: Optional[np.ndarray],
+                           debug_dir: Optional[str] = None,
+                           return_masks: bool = False) -> Dict[str, Any]:
+    """
+    在食物辨識完成後計算重量、營養並組合最終結果
+
+    單張與批次分析共用，批次模式下 food_names 來自跨圖片的批次辨識。
+    """
+    from .ai_service import classify_food_image
+
+    image_area_pixels = image.width * image.height
+    pixel_to_cm_ratio, reference_object_label, all_ref_candidates = calibration
+
+    detected_foods, total_nutrition, food_masks = summarize_food_items(
+        service, items, food_names, pixel_to_cm_ratio, depth_map, image_area_pixels
+    )
+
+    # 5. 智慧後備機制
+    if not detected_foods:
+        logger.info("主要重量估算流程未偵測到有效食物，啟用後備食物辨識模型。")
+        record_fallback("classifier")
+        try:
+            if image_bytes is None:
+                image_bytes = encode_image(image)
+            fallback_food_name = classify_food_image(image_bytes)
+            
+            if fallback_food_name and fallback_food_name.lower() not in ['unknown', 'other']:
+                logger.info("後備模型辨識出食物為: %s", fallback_food_name)
+                note = f"AI 重量估算失敗，但圖片辨識模型認為食物可能是「{fallback_food_name}」。請參考並手動輸入重量。"
+                result = {
+                    "detected_foods": [],
+                    "total_estimated_weight": 0,
+                    "total_nutrition": {},
+                    "reference_object": None,
+                    "note": note,
+                    "fallback_food_suggestion": { "food_name": fallback_food_name },
+                    "model_info": service.get_model_info()
+                }
+                if debug_dir: result["debug_output_path"] = debug_dir
+                return result
+
+        except Exception as fallback_e:
+            logger.error("後備食物辨識模型失敗: %s", fallback_e)
+
+    # 6. 生成備註
+    note = build_analysis_note(detected_foods, pixel_to_cm_ratio, reference_object_label, all_ref_candidates)
+
+    result = {
+        "detected_foods": detected_foods,
+        "total_estimated_weight": round(sum(item['estimated_weight'] for item in detected_foods), 1),
+        "total_nutrition": {k: round(v, 1) for k, v in total_nutrition.items()},
+        "reference_object": reference_object_label,
+        "note": note,
+        "model_info": service.get_model_info()
+    }
+    if return_masks:
+        result["masks"] = food_masks
+    
+    if debug_dir:
+        save_segmentation_debug_image(image, [item["mask"] for item in items], debug_dir)
+        result["debug_output_path"] = debug_dir
+        
+    return result
+
+def analyze_food_image_v2(image_bytes: Optional[bytes] = None,
+                          image: Optional[Image.Image] = None,
+                          model_config: Optional[Dict[str, str]] = None,
+                          debug: bool = False,
+                          return_masks: bool = False,
+                          cascade: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    V2 分析流程本體（同步執行）
+
+    Args:
+        image_bytes: 原始圖片位元組
+        image: 已解碼的 RGB 圖片；提供時不再解碼 image_bytes
+        model_config: 模型配置
+        debug: 是否輸出除錯圖片；未要求時依 DEBUG_SAMPLE_RATE 抽樣輸出
+        return_masks: 是否在結果的 "masks" 欄位附上各食物的分割遮罩（與 detected_foods 順序相同）
+        cascade: 是否啟用串接模式，未指定時依 CASCADE_ENABLED；
+            結果的 "pipeline" 欄位為 "fast"（略過分割與深度估計）或 "full"
+    """
+    from .ai_service import classify_food_image
+
     debug_dir = None
     try:
-        if debug:
-            import os
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            debug_dir = os.path.join("debug_output", timestamp)
-            os.makedirs(debug_dir, exist_ok=True)
+        if should_capture(debug):
+            debug_dir = create_debug_dir()
             
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        if image is None:
+            image = decode_image(image_bytes)
         
-        if debug:
-            image.save(os.path.join(debug_dir, "00_original.jpg"))
+        if debug_dir:
+            get_debug_writer().save_image(debug_dir, "00_original.jpg", image)
         
         # 創建服務實例（如果提供了配置）
-        if model_config:
-            service = WeightEstimationServiceV2(model_config)
-        else:
-            service = weight_service_v2
+        service = get_service_for_config(model_config)
         
         # 1. 物件偵測，取得所有物件的邊界框
         all_objects = service.detect_objects(image)
         image_area_pixels = image.width * image.height
 
         if not all_objects:
-            note = "無法從圖片中偵測到任何物體。"
-            result = {"detected_foods": [], "total_estimated_weight": 0, "total_nutrition": {}, "note": note}
-            if debug: result["debug_output_path"] = debug_dir
-            return result
-
-        if debug:
-            from PIL import ImageDraw
-            debug_image = image.copy()
-            draw = ImageDraw.Draw(debug_image)
-            for obj in all_objects:
-                bbox = obj.get("bbox")
-                label = obj.get("label", "unknown")
-                draw.rectangle(bbox, outline="red", width=3)
-                draw.text((bbox[0], bbox[1]), label, fill="red")
-            debug_image.save(os.path.join(debug_dir, "01_detected_objects.jpg"))
+            return no_objects_result(debug_dir)
+
+        if debug_dir:
+            save_detection_debug_image(image, all_objects, debug_dir)
             
         # 2. 計算全域 pixel_to_cm_ratio
-        pixel_to_cm_ratio = None
-        reference_object_label = None
+        calibration = calibrate_reference_object(all_objects, image_area_pixels)
+
+        food_objects = [obj for obj in all_objects if obj["label"] not in REFERENCE_LABELS]
+
+        # 串接模式：單一食物且整張圖分類可信時，以邊界框近似遮罩，略過深度估計與分割
+        fast = None
+        if CASCADE_ENABLED if cascade is None else cascade:
+            fast = try_fast_path(image, image_bytes, food_objects)
+
+        if fast is not None:
+            items, food_names = fast
+            depth_map = None
+        else:
+            # 3. 深度估計
+            depth_map = service.estimate_depth(image)
+            if debug_dir and depth_map is not None:
+                save_depth_debug_image(depth_map, debug_dir)
+
+            # 4. 分割、裁切並辨識每項食物
+            items = extract_food_items(service, image, food_objects, image_area_pixels, debug_dir)
+            food_names = [classify_food_image(item["crop_bytes"]) for item in items]
+
+        result = complete_food_analysis(
+            service, image, image_bytes, food_objects, items, food_names,
+            calibration, depth_map, debug_dir=debug_dir, return_masks=return_masks
+        )
+        result["pipeline"] = "fast" if fast is not None else "full"
+        return result
         
-        # 所有偵測到的參考物候選
-        all_ref_candidates = [obj for obj in all_objects if obj["label"] in ["plate", "bowl", "credit_card", "coin"]]
+    except Exception as e:
+        logger.error("多食物重量估算主流程失敗: %s", str(e))
+        return failed_analysis_result(e, debug_dir)
 
-        logger.info(f"偵測到 {len(all_ref_candidates)} 個參考物候選: {[o['label'] for o in all_ref_candidates]}")
-        for obj in all_ref_candidates:
-            bbox = obj.get("bbox")
-            bbox_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
-            area_percentage = (bbox_area / image_area_pixels) * 100
-            logger.info(f"候選參考物 '{obj['label']}' 佔畫面 {area_percentage:.2f}% (Bbox: {[int(c) for c in bbox]})")
-
-        # 可靠的參考物（通過尺寸檢測）
-        potential_refs = [
-            obj for obj in all_ref_candidates 
-            if (obj["bbox"][2]-obj["bbox"][0]) * (obj["bbox"][3]-obj["bbox"][1]) > image_area_pixels * 0.01
-        ]
-
-        if potential_refs:
-            # 選擇最大的參考物
-            best_ref = max(potential_refs, key=lambda obj: (obj["bbox"][2]-obj["bbox"][0]) * (obj["bbox"][3]-obj["bbox"][1]))
-            reference_object_label = best_ref["label"]
-            ref_type = best_ref.get("label")
-            ref_bbox = best_ref.get("bbox")
-            ref_size_cm = REFERENCE_OBJECTS.get(ref_type)
-
-            if ref_size_cm and ref_bbox:
-                px_w = ref_bbox[2] - ref_bbox[0]
-                px_h = ref_bbox[3] - ref_bbox[1]
-                
-                if "diameter" in ref_size_cm and px_w > 0:
-                    # 圓形參考物 (盤子、碗、硬幣)
-                    px_diameter = px_w
-                    pixel_to_cm_ratio = ref_size_cm["diameter"] / px_diameter
-                    logger.info(f"成功使用圓形參考物 '{reference_object_label}' ({px_diameter:.1f} px) 計算出 pixel_to_cm_ratio: {pixel_to_cm_ratio:.4f}")
-                elif "width" in ref_size_cm and "height" in ref_size_cm and px_w > 0 and px_h > 0:
-                    # 矩形參考物 (信用卡)
-                    pixel_to_cm_ratio = ref_size_cm["width"] / px_w
-                    logger.info(f"成功使用矩形參考物 '{reference_object_label}' ({px_w:.1f}x{px_h:.1f} px) 計算出 pixel_to_cm_ratio: {pixel_to_cm_ratio:.4f}")
-            
-            if not pixel_to_cm_ratio:
-                 reference_object_label = None
-                 logger.warning(f"偵測到參考物 '{best_ref['label']}'，但計算其比例失敗。")
+def encode_mask_rle(mask: np.ndarray) -> Dict[str, Any]:
+    """
+    將二值遮罩編碼為逐列掃描 (row-major) 的 run-length 格式
 
-        # 3. 深度估計
-        depth_map = service.estimate_depth(image)
-        if debug and depth_map is not None:
-            depth_for_save = (depth_map - np.min(depth_map)) / (np.max(depth_map) - np.min(depth_map) + 1e-6) * 255.0
-            Image.fromarray(depth_for_save.astype(np.uint8)).convert("L").save(os.path.join(debug_dir, "03_depth_map.png"))
+    counts 由 0 的長度開始，0 與 1 的長度交替出現，
+    前端可依 size 還原出與原圖相同大小的遮罩。
+    """
+    flat = np.asarray(mask, dtype=bool).ravel()
+    change_points = np.flatnonzero(np.diff(flat.astype(np.int8))) + 1
+    boundaries = np.concatenate(([0], change_points, [flat.size]))
+    counts = np.diff(boundaries).tolist()
+    if flat.size and flat[0]:
+        counts.insert(0, 0)
+    return {"size": list(mask.shape), "counts": counts}
+
+def iter_analysis_events_v2(image_bytes: bytes,
+                            model_config: Optional[Dict[str, str]] = None,
+                            debug: bool = False):
+    """
+    單張圖片的 V2 分析，每完成一個階段就產生一個事件
+
+    偵測框在 SAM、深度估計與營養查詢完成前就已可用，
+    逐階段回傳可讓前端提早顯示部分結果。
+
+    Yields:
+        (事件名稱, 資料)，依序為：
+            "objects": 偵測到的所有物件
+            "reference": 參考物與 pixel_to_cm_ratio
+            "item": 每項食物的分割遮罩 (RLE) 與辨識結果
+            "result": 與 analyze_food_image_v2 相同格式的最終結果（含營養總計）
+        發生錯誤時產生 "error" 事件
+    """
+    from .ai_service import classify_food_image
 
-        # 4. 載入相關服務
-        from .ai_service import classify_food_image
-        from .nutrition_api_service import fetch_nutrition_data
+    debug_dir = None
+    try:
+        if should_capture(debug):
+            debug_dir = create_debug_dir()
 
-        detected_foods = []
-        total_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0}
-        
-        food_objects = [obj for obj in all_objects if obj["label"] not in ["plate", "bowl", "credit_card", "coin"]]
+        image = decode_image(image_bytes)
+        if debug_dir:
+            get_debug_writer().save_image(debug_dir, "00_original.jpg", image)
 
-        for i, food_obj in enumerate(food_objects):
-            try:
-                # a. 分割
-                input_box = [food_obj["bbox"]]
-                masks = service.segment_food(image, input_boxes=input_box)
-                if not masks: continue
-                mask = max(masks, key=lambda m: np.sum(m))
-
-                # 遮罩過濾器
-                mask_pixels = np.sum(mask)
-                if mask_pixels > image_area_pixels * 0.9:
-                    logger.warning(f"過濾掉一個可疑的過大食物遮罩 (來自 YOLO 的 '{food_obj['label']}'), 其遮罩佔據了畫面的 {mask_pixels / image_area_pixels:.2%}。")
-                    continue
+        service = get_service_for_config(model_config)
 
-                # b. 裁切 (辨識用)
-                if mask.ndim == 3: mask = mask[0]
-                if mask.ndim != 2: continue
-                rows, cols = np.any(mask, axis=1), np.any(mask, axis=0)
-                if not np.any(rows) or not np.any(cols): continue
-                rmin, rmax = np.where(rows)[0][[0, -1]]
-                cmin, cmax = np.where(cols)[0][[0, -1]]
-                item_array = np.array(image); item_rgba = np.zeros((*item_array.shape[:2], 4), dtype=np.uint8)
-                item_rgba[:,:,:3] = item_array; item_rgba[:,:,3] = mask * 255
-                cropped_pil = Image.fromarray(item_rgba[rmin:rmax+1, cmin:cmax+1, :], 'RGBA')
-                buffer = io.BytesIO(); cropped_pil.save(buffer, format="PNG"); item_image_bytes = buffer.getvalue()
-                if debug:
-                    cropped_pil.save(os.path.join(debug_dir, f"item_{i}_{food_obj['label']}_cropped.png"))
-
-                # c. 辨識
-                food_name = classify_food_image(item_image_bytes)
-                
-                # d. 計算體積和重量
-                weight, confidence, error_range = service.calculate_volume_and_weight(
-                    mask, 
-                    food_name, 
-                    pixel_to_cm_ratio=pixel_to_cm_ratio,
-                    depth_map=depth_map,
-                    image_area_pixels=image_area_pixels
-                )
-                
-                # e. 查詢營養資訊
-                nutrition_info = fetch_nutrition_data(food_name)
-                if nutrition_info is None:
-                    nutrition_info = {"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "fiber": 0}
-
-                # f. 根據重量調整營養素
-                weight_ratio = weight / 100
-                adjusted_nutrition = {k: v * weight_ratio for k, v in nutrition_info.items() if isinstance(v, (int, float))}
-                
-                # g. 累加總營養
-                for key in total_nutrition: total_nutrition[key] += adjusted_nutrition.get(key, 0)
-
-                # h. 儲存單項食物結果
-                detected_foods.append({
-                    "food_name": food_name,
-                    "estimated_weight": round(weight, 1),
-                    "nutrition": {k: round(v, 1) for k, v in adjusted_nutrition.items()}
-                })
-            except Exception as item_e:
-                logger.error(f"處理物件 '{food_obj['label']}' 時失敗: {str(item_e)}")
-                continue
+        # 1. 物件偵測
+        all_objects = service.detect_objects(image)
+        image_area_pixels = image.width * image.height
+        yield "objects", {"image_size": [image.width, image.height], "objects": all_objects}
 
-        # 5. 智慧後備機制
-        if not detected_foods:
-            logger.info("主要重量估算流程未偵測到有效食物，啟用後備食物辨識模型。")
-            try:
-                fallback_food_name = classify_food_image(image_bytes)
-                
-                if fallback_food_name and fallback_food_name.lower() not in ['unknown', 'other']:
-                    logger.info(f"後備模型辨識出食物為: {fallback_food_name}")
-                    note = f"AI 重量估算失敗，但圖片辨識模型認為食物可能是「{fallback_food_name}」。請參考並手動輸入重量。"
-                    result = {
-                        "detected_foods": [],
-                        "total_estimated_weight": 0,
-                        "total_nutrition": {},
-                        "reference_object": None,
-                        "note": note,
-                        "fallback_food_suggestion": { "food_name": fallback_food_name },
-                        "model_info": service.get_model_info()
-                    }
-                    if debug: result["debug_output_path"] = debug_dir
-                    return result
-
-            except Exception as fallback_e:
-                logger.error(f"後備食物辨識模型失敗: {fallback_e}")
-
-        # 6. 生成備註
-        if detected_foods:
-            if pixel_to_cm_ratio and reference_object_label:
-                note = f"已使用 '{reference_object_label}' 作為參考物，成功分析 {len(detected_foods)} 項食物，準確度較高。"
-            elif all_ref_candidates:
-                too_small_ref_labels = list(set([o['label'] for o in all_ref_candidates]))
-                note = f"警告：雖偵測到 {too_small_ref_labels}，但其佔比過小無法作為精準參考。結果為AI基於畫面比例估算，僅供參考。"
-            else:
-                note = f"未能找到可靠參考物。結果為AI基於畫面比例估算，僅供參考。"
-        else:
-            note = "分析失敗：AI 無法辨識出任何可信的食物項目。請嘗試手動搜尋。"
+        if not all_objects:
+            yield "result", no_objects_result(debug_dir)
+            return
+
+        if debug_dir:
+            save_detection_debug_image(image, all_objects, debug_dir)
 
-        result = {
-            "detected_foods": detected_foods,
-            "total_estimated_weight": round(sum(item['estimated_weight'] for item in detected_foods), 1),
-            "total_nutrition": {k: round(v, 1) for k, v in total_nutrition.items()},
+        # 2. 參考物校正
+        calibration = calibrate_reference_object(all_objects, image_area_pixels)
+        pixel_to_cm_ratio, reference_object_label, all_ref_candidates = calibration
+        yield "reference", {
             "reference_object": reference_object_label,
-            "note": note,
-            "model_info": service.get_model_info()
+            "pixel_to_cm_ratio": pixel_to_cm_ratio,
+            "candidates": [obj["label"] for obj in all_ref_candidates],
         }
-        
-        if debug:
-            from PIL import ImageDraw
-            overlay_img = image.copy()
-            overlay_array = np.array(overlay_img)
-            all_food_boxes = [obj['bbox'] for obj in food_objects]
-            if all_food_boxes:
-                all_masks = service.segment_food(image, input_boxes=all_food_boxes)
-                for mask in all_masks:
-                    color = np.random.randint(0, 255, size=3, dtype=np.uint8)
-                    if mask.ndim == 3: mask = mask[0]
-                    overlay_array[mask] = (overlay_array[mask] * 0.5 + color * 0.5).astype(np.uint8)
-            Image.fromarray(overlay_array).save(os.path.join(debug_dir, "02_final_segmentation.jpg"))
-            result["debug_output_path"] = debug_dir
-            
-        return result
-        
+
+        # 3. 逐項分割與辨識，每辨識完一項就回傳
+        food_objects = [obj for obj in all_objects if obj["label"] not in REFERENCE_LABELS]
+        items, food_names = [], []
+        for item in iter_food_items(service, image, food_objects, image_area_pixels, debug_dir):
+            food_name = classify_food_image(item["crop_bytes"])
+            yield "item", {
+                "index": len(items),
+                "label": item["label"],
+                "bbox": item["bbox"],
+                "food_name": food_name,
+                "mask": encode_mask_rle(item["mask"]),
+            }
+            items.append(item)
+            food_names.append(food_name)
+
+        # 4. 深度估計只影響重量，放在辨識之後執行
+        depth_map = service.estimate_depth(image)
+        if debug_dir and depth_map is not None:
+            save_depth_debug_image(depth_map, debug_dir)
+
+        # 5. 重量、營養與最終結果
+        yield "result", complete_food_analysis(
+            service, image, image_bytes, food_objects, items, food_names,
+            calibration, depth_map, debug_dir=debug_dir
+        )
+
     except Exception as e:
-        logger.error(f"多食物重量估算主流程失敗: {str(e)}")
-        result = {
-            "detected_foods": [],
-            "total_estimated_weight": 0,
-            "total_nutrition": {},
-            "reference_object": None,
-            "note": f"分析失敗: {str(e)}"
+        logger.error("串流分析失敗: %s", str(e))
+        yield "error", failed_analysis_result(e, debug_dir)
+
+def percentile(values: List[float], pct: float) -> float:
+    """以最近秩法計算百分位數"""
+    ordered = sorted(values)
+    rank = max(1, int(np.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+def time_analysis_stages(service: WeightEstimationServiceV2,
+                         image: Image.Image,
+                         image_bytes: Optional[bytes] = None) -> Tuple[Dict[str, float], Dict[str, Any]]:
+    """
+    執行一次 V2 分析流程並量測每個階段的耗時
+
+    Returns:
+        ({階段: 秒數}, 分析結果)
+    """
+    import time
+    from .ai_service import classify_food_image
+
+    image_area_pixels = image.width * image.height
+    timings = {}
+    total_start = time.perf_counter()
+
+    start = time.perf_counter()
+    all_objects = service.detect_objects(image)
+    timings["detection"] = time.perf_counter() - start
+
+    calibration = calibrate_reference_object(all_objects, image_area_pixels)
+    food_objects = [obj for obj in all_objects if obj["label"] not in REFERENCE_LABELS]
+
+    start = time.perf_counter()
+    depth_map = service.estimate_depth(image)
+    timings["depth"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    items = extract_food_items(service, image, food_objects, image_area_pixels)
+    timings["segmentation"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    food_names = [classify_food_image(item["crop_bytes"]) for item in items]
+    timings["classification"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if all_objects:
+        result = complete_food_analysis(
+            service, image, image_bytes, food_objects, items, food_names, calibration, depth_map
+        )
+    else:
+        result = no_objects_result()
+    timings["weight_nutrition"] = time.perf_counter() - start
+    timings["total"] = time.perf_counter() - total_start
+
+    return timings, result
+
+def profile_analysis_stages(image: Image.Image,
+                            image_bytes: bytes,
+                            model_config: Optional[Dict[str, str]] = None,
+                            repetitions: int = 5) -> Dict[str, Any]:
+    """
+    重複執行 V2 分析流程，量測每個階段的延遲
+
+    第一次執行只用來載入模型與暖機，不計入統計。
+
+    Returns:
+        {"stage_timings": {階段: {"p50_ms", "p95_ms", "mean_ms"}}, "analysis_result": 最後一次的結果摘要}
+    """
+    service = get_service_for_config(model_config)
+    stage_samples: Dict[str, List[float]] = {}
+    result = None
+
+    for run in range(max(1, repetitions) + 1):
+        timings, result = time_analysis_stages(service, image, image_bytes)
+        if run == 0:
+            continue  # 暖機
+        for stage, seconds in timings.items():
+            stage_samples.setdefault(stage, []).append(seconds)
+
+    stage_timings = {
+        stage: {
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+        }
+        for stage, samples in stage_samples.items()
+    }
+
+    return {
+        "model_info": service.get_model_info(),
+        "stage_timings": stage_timings,
+        "analysis_result": {
+            "detected_foods_count": len(result.get("detected_foods", [])),
+            "total_weight": result.get("total_estimated_weight", 0),
+            "has_reference_object": result.get("reference_object") is not None
         }
-        if debug and debug_dir:
-            result["debug_output_path"] = debug_dir
-        return result 
\ No newline at end of file
+    }
+
+def compare_model_configs(image: Image.Image,
+                          image_bytes: bytes,
+                          configs: List[Dict[str, str]],
+                          repetitions: int = 5,
+                          max_parallel: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    在 CPU 配額內同時比較多組模型配置
+
+    所有配置共用同一張已解碼的圖片；相同的子模型在配置之間共用，只載入一次。
+    未設定 TORCH_NUM_THREADS 時依配置數切分 CPU 配額（見 split_inference_budget），
+    比較期間的耗時不計入 /metrics 的分析階段延遲。
+
+    Args:
+        image: 已解碼的 RGB 圖片
+        image_bytes: 原始圖片位元組（後備辨識使用）
+        configs: 模型配置列表
+        repetitions: 每組配置計入統計的重複次數
+        max_parallel: 同時執行的配置數上限，預設為配置數（仍受 CPU 配額限制）
+
+    Returns:
+        與 configs 順序相同的比較結果
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from ..runtime_config import inference_threads, split_inference_budget
+
+    tasks = max(1, min(len(configs), max_parallel or len(configs)))
+    parallelism, threads = split_inference_budget(tasks)
+    logger.info("比較 %s 組模型配置，同時執行 %s 組（每組 %s 個執行緒），每組重複 %s 次",
+                len(configs), parallelism, threads, repetitions)
+
+    def run(index: int, config: Dict[str, str]) -> Dict[str, Any]:
+        try:
+            # 比較的重複執行不計入線上的階段延遲與流程統計
+            with inference_threads(threads), suppress_analysis_metrics():
+                profile = profile_analysis_stages(image, image_bytes, config, repetitions)
+            return {"config_index": index, "config": config, **profile, "status": "success"}
+        except Exception as e:
+            logger.error("模型配置 %s 比較失敗: %s", config, str(e))
+            return {"config_index": index, "config": config, "error": str(e), "status": "failed"}
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="compare-models") as executor:
+        futures = [executor.submit(run, i, config) for i, config in enumerate(configs)]
+        return [future.result() for future in futures]
+
+def iter_batch_analysis_v2(named_images: List[Tuple[str, bytes]],
+                           model_config: Optional[Dict[str, str]] = None,
+                           batch_size: int = 8):
+    """
+    批次分析多張圖片，逐張產生結果
+
+    每 batch_size 張圖片為一組：物件偵測與深度估計在組內跨圖片批次執行；
+    之後逐張分割（每張圖的提示框數量不同）並將該張的裁切圖一次批次辨識，
+    每張圖片自己的階段完成即產生其結果，不等待同組其他圖片。
+
+    Args:
+        named_images: [(檔名, 圖片位元組), ...]
+        model_config: 模型配置
+        batch_size: 每組圖片數量
+
+    Yields:
+        {"index", "filename", "status", "result" 或 "error"}
+    """
+    from .ai_service import classify_food_images
+
+    service = get_service_for_config(model_config)
+    batch_size = max(1, batch_size)
+
+    for offset in range(0, len(named_images), batch_size):
+        chunk = named_images[offset:offset + batch_size]
+
+        # 解碼，無法解碼的圖片直接回報錯誤
+        decoded = []
+        for i, (filename, image_bytes) in enumerate(chunk):
+            index = offset + i
+            try:
+                image = decode_image(image_bytes)
+                decoded.append((index, filename, image_bytes, image))
+            except Exception as e:
+                yield {"index": index, "filename": filename, "status": "failed", "error": f"圖片解碼失敗: {str(e)}"}
+
+        if not decoded:
+            continue
+
+        done = set()
+        try:
+            # 1. 跨圖片批次物件偵測
+            detections = service.detect_objects_batch([entry[3] for entry in decoded])
+
+            pending = []
+            for entry, all_objects in zip(decoded, detections):
+                index, filename, _, _ = entry
+                if not all_objects:
+                    done.add(index)
+                    yield {"index": index, "filename": filename, "status": "success", "result": no_objects_result()}
+                else:
+                    pending.append((entry, all_objects))
+
+            if not pending:
+                continue
+
+            # 2. 跨圖片批次深度估計
+            depth_maps = service.estimate_depth_batch([entry[3] for entry, _ in pending])
+
+            # 3. 逐張分割、批次辨識該張的裁切圖，並計算重量與營養
+            for ((index, filename, image_bytes, image), all_objects), depth_map in zip(pending, depth_maps):
+                image_area_pixels = image.width * image.height
+                calibration = calibrate_reference_object(all_objects, image_area_pixels)
+                food_objects = [obj for obj in all_objects if obj["label"] not in REFERENCE_LABELS]
+                items = extract_food_items(service, image, food_objects, image_area_pixels)
+                food_names = classify_food_images([item["crop_bytes"] for item in items]) if items else []
+                done.add(index)
+                try:
+                    result = complete_food_analysis(
+                        service, image, image_bytes, food_objects, items, food_names, calibration, depth_map
+                    )
+                    yield {"index": index, "filename": filename, "status": "success", "result": result}
+                except Exception as e:
+                    logger.error("批次分析圖片 '%s' 失敗: %s", filename, str(e))
+                    yield {"index": index, "filename": filename, "status": "failed", "error": str(e)}
+
+        except Exception as e:
+            # 批次階段失敗時，逐張回退到單張分析
+            logger.error("批次分析失敗，改為逐張分析: %s", str(e))
+            record_fallback("batch_analysis")
+            for index, filename, image_bytes, image in decoded:
+                if index in done:
+                    continue
+                result = analyze_food_image_v2(image_bytes=image_bytes, image=image, model_config=model_config)
+                yield {"index": index, "filename": filename, "status": "success", "result": result}
@@ -0,0 +1,113 @@
+# 檔案路徑: app/singleflight.py
+
+"""
+合併進行中的相同請求（single-flight）
+
+多個使用者同時拍同一道菜，或前端重試時，會同時執行相同的營養查詢與影像分析。
+同一個鍵在計算完成前再次呼叫時，不重新計算，而是等待進行中的那一次並取得相同的結果
+（或相同的例外）。計算完成後鍵即釋放，之後的呼叫會重新計算，因此這不是快取。
+
+    - SingleFlight.do：同步版，以執行緒事件等待，用於 threadpool 中執行的函數
+    - SingleFlight.do_async：非同步版，計算在獨立的 task 中執行，
+      發起的請求被取消（例如用戶端中斷連線）時不影響其他等待者
+
+每次呼叫會記錄 singleflight_calls_total{group, role}，role=follower 即為被合併的呼叫數。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import record_singleflight
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """以鍵合併進行中的相同呼叫"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _Call] = {}
+        self._tasks: Dict[Any, "asyncio.Task"] = {}
+
+    def do(self, key: Any, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """執行 func(*args, **kwargs)；相同的鍵正在執行時，等待並回傳其結果"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        record_singleflight(self.name, not leader)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.debug("single-flight %s: %s 個相同呼叫共用結果", self.name, call.waiters)
+            call.event.set()
+
+    async def do_async(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        等待 factory() 的結果；相同的鍵正在執行時，等待同一個 task
+
+        factory 只有在沒有進行中的呼叫時才會被呼叫。
+        """
+        task = self._tasks.get(key)
+        record_singleflight(self.name, task is not None)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _, key=key, task=task: self._release(key, task))
+        return await asyncio.shield(task)
+
+    def _release(self, key: Any, task: "asyncio.Task"):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # 沒有等待者時取出例外，避免 "exception was never retrieved" 警告
+            task.exception()
+
+    def in_flight(self) -> int:
+        """目前進行中的鍵數"""
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
+
+
+def content_key(data: bytes, *parts: Any) -> str:
+    """以內容雜湊與其他參數（例如模型配置）組成合併用的鍵"""
+    digest = hashlib.sha256(data).hexdigest()
+    if not parts:
+        return digest
+    return digest + ":" + json.dumps(parts, sort_keys=True, default=str)
+
+
+__all__ = ["SingleFlight", "content_key"]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+食物名稱模糊比對基準測試
+
+以合成的食物名稱表（預設 10,000 筆，中英文各半）建立 FuzzyIndex，
+再以拼字錯誤、複數、底線與大小寫變化的查詢量測建立時間、查詢延遲與正確率。
+
+用法:
+    python benchmark_fuzzy_match.py
+    python benchmark_fuzzy_match.py --names 50000 --queries 2000 --output fuzzy.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.fuzzy_match_service import FuzzyIndex, normalize_food_name
+
+STYLES = ("grilled", "fried", "steamed", "roasted", "braised", "spicy", "smoked", "baked", "sweet", "sour")
+INGREDIENTS = (
+    "chicken", "pork", "beef", "salmon", "tofu", "shrimp", "mushroom", "cabbage", "potato", "tomato",
+    "eggplant", "spinach", "duck", "lamb", "squid", "oyster", "pumpkin", "corn", "onion", "garlic",
+)
+DISHES = ("rice", "noodle", "soup", "salad", "sandwich", "curry", "dumpling", "bun", "pie", "stew")
+CJK_STYLES = ("烤", "炸", "蒸", "滷", "炒", "燉", "涼拌", "煎", "燒", "辣")
+CJK_INGREDIENTS = ("雞", "豬", "牛", "鮭魚", "豆腐", "蝦", "香菇", "高麗菜", "馬鈴薯", "番茄",
+                   "茄子", "菠菜", "鴨", "羊", "魷魚", "蚵仔", "南瓜", "玉米", "洋蔥", "蒜")
+CJK_DISHES = ("飯", "麵", "湯", "沙拉", "三明治", "咖哩", "水餃", "包子", "派", "煲")
+
+
+def build_names(count, seed=0):
+    """產生不重複的合成食物名稱"""
+    rng = random.Random(seed)
+    english = [f"{s} {i} {d}" for s in STYLES for i in INGREDIENTS for d in DISHES]
+    chinese = [f"{s}{i}{d}" for s in CJK_STYLES for i in CJK_INGREDIENTS for d in CJK_DISHES]
+    names = set()
+    while len(names) < count:
+        # 基本組合只有 2,000 種，其餘加上產地或份量讓名稱不重複
+        if rng.random() < 0.5:
+            name = rng.choice(english)
+            if len(names) >= len(english):
+                name = f"{name} {rng.choice(('taiwan', 'japan', 'korea', 'thai', 'small', 'large'))} {rng.randint(1, 99)}"
+        else:
+            name = rng.choice(chinese)
+            if len(names) >= len(chinese):
+                name = f"{rng.choice(('台式', '日式', '韓式', '泰式', '小份', '大份'))}{name}{rng.randint(1, 99)}"
+        names.add(name)
+    return sorted(names)
+
+
+def _typo(word, rng):
+    if len(word) < 5:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    operation = rng.choice(("delete", "swap", "replace"))
+    if operation == "delete":
+        return word[:position] + word[position + 1:]
+    if operation == "swap":
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word[:position] + rng.choice("aeiou") + word[position + 1:]
+
+
+def make_query(name, rng):
+    """依名稱產生一個變形查詢，回傳 (變形類型, 查詢)"""
+    if not name.isascii():
+        return "chinese", name[:-1] if name[-1].isdigit() and rng.random() < 0.5 else name
+    words = name.split()
+    kind = rng.choice(("typo", "plural", "underscore", "case"))
+    if kind == "typo":
+        index = rng.randrange(len(words))
+        words[index] = _typo(words[index], rng)
+        return kind, " ".join(words)
+    if kind == "plural":
+        return kind, " ".join(words[:-1] + [words[-1] + "s"])
+    if kind == "underscore":
+        return kind, "_".join(words)
+    return kind, name.title()
+
+
+def run(names_count, query_count, seed=0):
+    rng = random.Random(seed)
+    names = build_names(names_count, seed)
+
+    start = time.perf_counter()
+    index = FuzzyIndex((name, name) for name in names)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    hits = {}
+    for name in rng.sample(names, min(query_count, len(names))):
+        kind, query = make_query(name, rng)
+        start = time.perf_counter()
+        match = index.best(query)
+        latencies.append(time.perf_counter() - start)
+        # 變形後可能與另一個名稱完全相同，因此以正規化名稱比較
+        correct = match is not None and normalize_food_name(match) in (
+            normalize_food_name(name), normalize_food_name(query))
+        total, correct_count = hits.get(kind, (0, 0))
+        hits[kind] = (total + 1, correct_count + correct)
+
+    latencies.sort()
+    return {
+        "names": len(index),
+        "queries": len(latencies),
+        "build_seconds": round(build_seconds, 3),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000, 3),
+        "accuracy": round(sum(c for _, c in hits.values()) / len(latencies), 4),
+        "accuracy_by_kind": {kind: round(c / t, 4) for kind, (t, c) in sorted(hits.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="食物名稱模糊比對基準測試")
+    parser.add_argument("--names", type=int, default=10000, help="合成名稱筆數")
+    parser.add_argument("--queries", type=int, default=1000, help="查詢次數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="將結果寫入 JSON 檔案")
+    args = parser.parse_args()
+
+    result = run(args.names, args.queries, args.seed)
+    print(f"🧪 名稱數: {result['names']}, 查詢數: {result['queries']}")
+    print(f"建立索引: {result['build_seconds']:.3f} 秒")
+    print(f"查詢延遲: p50={result['p50_ms']:.3f} ms  p99={result['p99_ms']:.3f} ms")
+    print(f"正確率: {result['accuracy']:.2%}  " +
+          "  ".join(f"{kind}={value:.2%}" for kind, value in result["accuracy_by_kind"].items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+食物分析完整流程基準測試
+
+對本地資料夾中的固定測試圖片執行 v1 / v2 分析流程，量測：
+    - 各階段延遲分佈（p50 / p95 / mean / min / max）
+    - 多個並行度下的吞吐量
+    - 行程的峰值 RSS
+
+結果寫成 JSON 報告，可與先前 commit 的報告比較以找出效能回歸。
+
+用法:
+    python benchmark_pipeline.py --images benchmark_images --output report.json
+    python benchmark_pipeline.py --pipelines v2 --concurrency 1,2,4 --repetitions 5
+    python benchmark_pipeline.py --baseline old_report.json --tolerance 0.15   # 回歸時以狀態碼 1 結束
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_images")
+
+
+def load_fixture_images(image_dir: str, synthetic_count: int = 4) -> List[Tuple[str, bytes]]:
+    """
+    讀取資料夾中的測試圖片；資料夾不存在或沒有圖片時產生固定亂數種子的合成圖片
+
+    Returns:
+        [(檔名, 圖片位元組), ...]，依檔名排序
+    """
+    images = []
+    if os.path.isdir(image_dir):
+        for name in sorted(os.listdir(image_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(image_dir, name), "rb") as f:
+                    images.append((name, f.read()))
+    if images:
+        return images
+
+    import numpy as np
+    from PIL import Image
+    print(f"⚠️ {image_dir} 中沒有測試圖片，改用 {synthetic_count} 張合成圖片")
+    rng = np.random.default_rng(0)
+    for i in range(synthetic_count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (512, 512, 3), dtype=np.uint8)).save(buffer, format="JPEG")
+        images.append((f"synthetic_{i}.jpg", buffer.getvalue()))
+    return images
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """將秒數樣本整理成毫秒統計"""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[max(1, -(-len(ordered) * p // 100)) - 1]
+
+    return {
+        "n": len(ordered),
+        "p50_ms": round(pct(50) * 1000, 2),
+        "p95_ms": round(pct(95) * 1000, 2),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "min_ms": round(ordered[0] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    """目前行程的峰值 RSS（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以 bytes 回報
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def make_runner(pipeline: str):
+    """
+    建立單張圖片的執行函數，回傳 {階段: 秒數}
+
+    v1 流程為單一函數，只量測 total；v2 量測各階段。
+    """
+    from PIL import Image
+
+    if pipeline == "v1":
+        from app.services.weight_estimation_service import estimate_food_weight
+
+        def run_v1(image_bytes: bytes) -> Dict[str, float]:
+            start = time.perf_counter()
+            asyncio.run(estimate_food_weight(image_bytes))
+            return {"total": time.perf_counter() - start}
+        return run_v1
+
+    if pipeline == "v2":
+        from app.services.weight_estimation_service_v2 import time_analysis_stages, weight_service_v2
+
+        def run_v2(image_bytes: bytes) -> Dict[str, float]:
+            start = time.perf_counter()
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            decode_time = time.perf_counter() - start
+            timings, _ = time_analysis_stages(weight_service_v2, image, image_bytes)
+            timings["decode"] = decode_time
+            timings["total"] += decode_time
+            return timings
+        return run_v2
+
+    raise ValueError(f"未知的分析流程: {pipeline}")
+
+
+def benchmark_pipeline(pipeline: str,
+                       images: List[Tuple[str, bytes]],
+                       repetitions: int,
+                       concurrency_levels: List[int]) -> Dict[str, Any]:
+    """對單一流程執行延遲與吞吐量測試"""
+    runner = make_runner(pipeline)
+
+    # 暖機：載入模型，不計入統計
+    warmup_start = time.perf_counter()
+    runner(images[0][1])
+    warmup_seconds = time.perf_counter() - warmup_start
+
+    # 1. 循序執行，量測各階段延遲分佈
+    stage_samples: Dict[str, List[float]] = {}
+    for _ in range(repetitions):
+        for _, image_bytes in images:
+            for stage, seconds in runner(image_bytes).items():
+                stage_samples.setdefault(stage, []).append(seconds)
+
+    # 2. 各並行度下的吞吐量
+    throughput = []
+    workload = [image_bytes for _ in range(repetitions) for _, image_bytes in images]
+    for concurrency in concurrency_levels:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = [timings["total"] for timings in executor.map(runner, workload)]
+        wall_time = time.perf_counter() - start
+        throughput.append({
+            "concurrency": concurrency,
+            "images_per_s": round(len(workload) / wall_time, 3),
+            "latency": summarize(latencies),
+        })
+        print(f"  {pipeline} 並行度 {concurrency:>2}: {throughput[-1]['images_per_s']:.2f} 張/秒")
+
+    return {
+        "warmup_seconds": round(warmup_seconds, 3),
+        "stages": {stage: summarize(samples) for stage, samples in stage_samples.items()},
+        "throughput": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    """
+    比較兩份報告，回傳超過容許範圍的回歸項目
+
+    延遲 (p50 / p95) 變慢超過 tolerance，或吞吐量下降超過 tolerance 都視為回歸。
+    """
+    regressions = []
+    for pipeline, report in current.get("pipelines", {}).items():
+        base = baseline.get("pipelines", {}).get(pipeline)
+        if not base:
+            continue
+        for stage, stats in report["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if not base_stats:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                if base_stats[key] > 0 and stats[key] > base_stats[key] * (1 + tolerance):
+                    regressions.append(f"{pipeline}.{stage}.{key}: {base_stats[key]} -> {stats[key]}")
+        base_throughput = {t["concurrency"]: t["images_per_s"] for t in base["throughput"]}
+        for point in report["throughput"]:
+            before = base_throughput.get(point["concurrency"])
+            if before and point["images_per_s"] < before * (1 - tolerance):
+                regressions.append(
+                    f"{pipeline}.throughput@{point['concurrency']}: {before} -> {point['images_per_s']}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="食物分析完整流程基準測試")
+    parser.add_argument("--images", type=str, default=DEFAULT_IMAGE_DIR, help="測試圖片資料夾")
+    parser.add_argument("--pipelines", type=str, default="v1,v2", help="以逗號分隔的流程，例如 v1,v2")
+    parser.add_argument("--repetitions", type=int, default=3, help="每張圖片的重複次數")
+    parser.add_argument("--concurrency", type=str, default="1,2,4", help="以逗號分隔的並行度")
+    parser.add_argument("--output", type=str, default=None, help="將報告寫入 JSON 檔案")
+    parser.add_argument("--baseline", type=str, default=None, help="與先前的報告比較")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="回歸容許比例（預設 0.1 = 10%%）")
+    args = parser.parse_args()
+
+    from app.runtime_config import configure_runtime
+    runtime = configure_runtime()
+
+    images = load_fixture_images(args.images)
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    print(f"🧪 測試圖片 {len(images)} 張，重複 {args.repetitions} 次，並行度 {concurrency_levels}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runtime": runtime,
+            "images": [name for name, _ in images],
+            "repetitions": args.repetitions,
+        },
+        "pipelines": {},
+    }
+
+    for pipeline in args.pipelines.split(","):
+        print(f"▶️ 執行 {pipeline} 流程...")
+        result = benchmark_pipeline(pipeline, images, args.repetitions, concurrency_levels)
+        report["pipelines"][pipeline] = result
+        for stage, stats in result["stages"].items():
+            print(f"  {stage:<18} p50={stats['p50_ms']:>9.2f} ms  p95={stats['p95_ms']:>9.2f} ms")
+        print(f"  峰值 RSS: {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        print(f"✅ 報告已寫入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.tolerance)
+        if regressions:
+            print("❌ 發現效能回歸:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✅ 與基準報告相比沒有效能回歸")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+torch 執行緒數基準測試
+
+模擬多個 worker 同時推論，掃描不同的每 worker 執行緒數，
+量測單次推論延遲與整體吞吐量，用來決定 TORCH_NUM_THREADS 的設定。
+
+用法:
+    python benchmark_threads.py --workers 4 --threads 1,2,4,8 --iterations 10
+    python benchmark_threads.py --workers 2 --models   # 使用實際的輕量化模型
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_worker(worker_index, num_threads, iterations, use_models, barrier, result_queue):
+    """單一 worker：套用執行緒設定後重複推論並回報每次延遲"""
+    os.environ["WORKER_INDEX"] = str(worker_index)
+    os.environ["TORCH_NUM_THREADS"] = str(num_threads)
+    os.environ["OPENCV_NUM_THREADS"] = str(num_threads)
+
+    from app.runtime_config import configure_runtime, apply_ml_thread_settings
+    configure_runtime(worker_index)
+
+    import numpy as np
+    import torch
+    from PIL import Image
+    apply_ml_thread_settings()
+
+    if use_models:
+        from app.services.lightweight_model_service import LightweightModelService
+        service = LightweightModelService()
+        test_image = Image.fromarray(np.random.randint(0, 255, (512, 512, 3), dtype=np.uint8))
+
+        def step():
+            service.test_model_performance(test_image)
+    else:
+        # 合成工作負載：與視覺模型相近的卷積運算
+        conv = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 64, 3, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.Conv2d(64, 64, 3, padding=1),
+        ).eval()
+        tensor = torch.rand(1, 3, 256, 256)
+
+        def step():
+            with torch.no_grad():
+                conv(tensor)
+
+    step()  # 暖機
+    barrier.wait()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        step()
+        latencies.append(time.perf_counter() - start)
+    result_queue.put(latencies)
+
+
+def run_sweep_point(workers, num_threads, iterations, use_models):
+    """以指定的 worker 數與執行緒數執行一次測試"""
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers + 1)
+    result_queue = ctx.Queue()
+    processes = [
+        ctx.Process(target=_run_worker, args=(i, num_threads, iterations, use_models, barrier, result_queue))
+        for i in range(workers)
+    ]
+    for p in processes:
+        p.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    latencies = []
+    for _ in processes:
+        latencies.extend(result_queue.get())
+    wall_time = time.perf_counter() - start
+    for p in processes:
+        p.join()
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "threads_per_worker": num_threads,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "throughput_per_s": round(len(latencies) / wall_time, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="torch 執行緒數基準測試")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--threads", type=str, default=None, help="以逗號分隔的執行緒數，例如 1,2,4")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--models", action="store_true", help="使用實際的輕量化模型而非合成負載")
+    parser.add_argument("--output", type=str, default=None, help="將結果寫入 JSON 檔案")
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    if args.threads:
+        thread_counts = [int(t) for t in args.threads.split(",")]
+    else:
+        thread_counts = sorted({1, 2, 4, max(1, cpu_count // args.workers), cpu_count})
+
+    print(f"🧪 CPU 核心數: {cpu_count}, worker 數: {args.workers}")
+    results = []
+    for num_threads in thread_counts:
+        point = run_sweep_point(args.workers, num_threads, args.iterations, args.models)
+        results.append(point)
+        print(f"threads={num_threads:>3}  p50={point['p50_ms']:>9.2f} ms  "
+              f"p95={point['p95_ms']:>9.2f} ms  throughput={point['throughput_per_s']:>8.2f}/s")
+
+    best = max(results, key=lambda r: r["throughput_per_s"])
+    print(f"✅ 建議 TORCH_NUM_THREADS={best['threads_per_worker']} (吞吐量 {best['throughput_per_s']}/s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": cpu_count, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 import uvicorn
 
+from app.services.fuzzy_match_service import FuzzyIndex
+
 app = FastAPI(title="Health Assistant AI - Food Recognition API")
 
 # CORS設定
@@ -95,6 +97,11 @@ class HealthResponse(BaseModel):
     status: str
     message: str
 
+# 營養資料庫的模糊比對索引（英文鍵與中文名稱）
+_nutrition_index = FuzzyIndex(
+    [(key, key) for key in NUTRITION_DATABASE] + [(value["name"], key) for key, value in NUTRITION_DATABASE.items()]
+)
+
 def get_nutrition_info(food_name: str) -> Dict[str, Any]:
     """根據食物名稱獲取營養資訊"""
     # 將食物名稱轉為小寫並清理
@@ -107,20 +114,10 @@ def get_nutrition_info(food_name: str) -> Dict[str, Any]:
     if food_key in NUTRITION_DATABASE:
         return NUTRITION_DATABASE[food_key]
     
-    # 模糊匹配 - 檢查是否包含關鍵字
-    for key, value in NUTRITION_DATABASE.items():
-        if key in food_key or food_key in key:
-            return value
-        # 也檢查中文名稱
-        if value["name"] in food_name:
-            return value
-    
-    # 更智能的匹配 - 處理複合詞
-    food_words = food_key.split()
-    for word in food_words:
-        for key, value in NUTRITION_DATABASE.items():
-            if word == key or word in key:
-                return value
+    # 模糊匹配 - 容許拼字錯誤、複數與中英文名稱
+    match = _nutrition_index.best(food_name)
+    if match is not None:
+        return NUTRITION_DATABASE[match]
     
     # 特殊情況處理
     special_mappings = {
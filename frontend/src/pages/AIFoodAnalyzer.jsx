@@ -53,6 +53,7 @@ function AIFoodAnalyzer() {
   // 系統日誌狀態
   const [logs, setLogs] = useState([]);
   const [logsLoading, setLogsLoading] = useState(false);
+  const logCursorRef = useRef(0); // 已取得的最後一筆日誌序號
   const [apiStatus, setApiStatus] = useState(null);
   
   // 手動模式相關
@@ -104,12 +105,13 @@ function AIFoodAnalyzer() {
     }
   };
 
-  // 載入系統日誌
+  // 載入系統日誌：只取得上次之後新增的日誌，並保留最近 500 筆
   const loadLogs = async () => {
     setLogsLoading(true);
     try {
-      const response = await apiService.getLogs();
-      setLogs(response.logs || []);
+      const response = await apiService.getLogs({ cursor: logCursorRef.current });
+      logCursorRef.current = response.next_cursor ?? logCursorRef.current;
+      setLogs(prev => [...prev, ...(response.logs || [])].slice(-500));
     } catch (error) {
       console.error('載入日誌失敗:', error);
       setLogs(['載入日誌失敗: ' + error.message]);
@@ -6,6 +6,7 @@ const AIFoodAnalyzer = () => {
   const [result, setResult] = useState(null);
   const [error, setError] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState([]); // 串流分析的階段訊息
   const [imageSrc, setImageSrc] = useState(null);
   const fileInputRef = useRef(null);
   const [foodDiary, setFoodDiary] = useState([]);
@@ -19,6 +20,29 @@ const AIFoodAnalyzer = () => {
   const [manualNutrition, setManualNutrition] = useState(null);
   const [isManualLoading, setIsManualLoading] = useState(false);
   const [manualError, setManualError] = useState('');
+  const [suggestions, setSuggestions] = useState([]); // 食物名稱自動完成
+
+  // 輸入食物名稱時向本地前綴索引取得建議，短暫停頓後才送出請求
+  useEffect(() => {
+    const query = manualFoodName.trim();
+    if (mode !== 'manual' || !query) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(`http://localhost:8000/api/nutrition/suggest?q=${encodeURIComponent(query)}&limit=8`, { signal: controller.signal });
+        if (response.ok) setSuggestions(await response.json());
+      } catch (err) {
+        if (err.name !== 'AbortError') setSuggestions([]);
+      }
+    }, 120);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [manualFoodName, mode]);
 
   // --- 日記編輯相關 state ---
   const [editingMeal, setEditingMeal] = useState(null);
@@ -28,6 +52,7 @@ const AIFoodAnalyzer = () => {
     setResult(null);
     setError('');
     setIsLoading(false);
+    setProgress([]);
     setImageSrc(null);
     setMode('initial'); // 回到初始選擇畫面
     setManualFoodName('');
@@ -60,25 +85,66 @@ const AIFoodAnalyzer = () => {
     }
   };
 
+  // 解析 Server-Sent Events 串流，每收到一個完整事件就呼叫 onEvent
+  const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let eventName = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) eventName = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        if (data) onEvent(eventName, JSON.parse(data));
+      }
+    }
+  };
+
   const processImage = async () => {
     if (!imageSrc) return;
     setIsLoading(true);
     setError('');
     setResult(null);
+    setProgress([]);
 
     try {
       const blob = await (await fetch(imageSrc)).blob();
       const formData = new FormData();
-      formData.append('file', blob, 'food_image.jpg');
+      formData.append('image', blob, 'food_image.jpg');
 
-      const aiResponse = await fetch('http://localhost:8000/api/ai/analyze-food-image-with-weight/', {
+      const aiResponse = await fetch('http://localhost:8000/ai/v2/analyze-food/stream', {
         method: 'POST',
         body: formData,
       });
       if (!aiResponse.ok) {
         throw new Error(`伺服器錯誤: ${aiResponse.status}`);
       }
-      const aiData = await aiResponse.json();
+
+      // 先顯示各階段的中間結果，最後的 result 事件才是完整分析
+      let aiData = null;
+      await readEventStream(aiResponse, (eventName, data) => {
+        if (eventName === 'objects') {
+          setProgress(prev => [...prev, `偵測到 ${data.objects.length} 個物件`]);
+        } else if (eventName === 'reference') {
+          setProgress(prev => [...prev, data.reference_object ? `參考物：${data.reference_object}` : '未找到可靠參考物，將以畫面比例估算']);
+        } else if (eventName === 'item') {
+          setProgress(prev => [...prev, `辨識出：${data.food_name}`]);
+        } else if (eventName === 'result' || eventName === 'error') {
+          aiData = data;
+        }
+      });
+      if (!aiData) {
+        throw new Error('分析串流意外中斷，請稍後再試。');
+      }
       
       if (aiData.detected_foods && aiData.detected_foods.length > 0) {
         setResult({ originalResponse: aiData });
@@ -250,6 +316,11 @@ const AIFoodAnalyzer = () => {
                     {isLoading ? <div className="loading-spinner"></div> : 
                      imageSrc ? <img src={imageSrc} alt="Food" className="max-h-full max-w-full rounded-lg" /> : <span className="text-gray-400">圖片預覽區</span>}
                   </div>
+                  {isLoading && progress.length > 0 && (
+                    <ul className="text-sm text-gray-600 mb-4">
+                      {progress.map((message, index) => <li key={index}>✓ {message}</li>)}
+                    </ul>
+                  )}
                   <div className="button-group grid grid-cols-1 md:grid-cols-3 gap-3 mb-4">
                     <button onClick={() => alert('相機功能開發中！')} className="btn-secondary" disabled={isLoading}><Camera className="mr-2" />開啟相機</button>
                     <button onClick={processImage} className="btn-primary" disabled={isLoading || !imageSrc}>{isLoading ? '分析中...' : <><Zap className="mr-2" />開始分析</>}</button>
@@ -300,7 +371,12 @@ const AIFoodAnalyzer = () => {
               {error && <p className="text-sm text-red-500 mb-3">{error}</p>}
               <p className="text-sm text-gray-500 mb-4">在這裡手動查詢並記錄您的餐點。</p>
               <div className="manual-lookup-form">
-                <input type="text" value={manualFoodName} onChange={(e) => setManualFoodName(e.target.value)} placeholder="輸入食物名稱" className="input-field" />
+                <input type="text" value={manualFoodName} onChange={(e) => setManualFoodName(e.target.value)} placeholder="輸入食物名稱" className="input-field" list="food-suggestions" autoComplete="off" />
+                <datalist id="food-suggestions">
+                  {suggestions.map((item) => (
+                    <option key={item.food_name} value={item.food_name}>{item.chinese_name || ''}</option>
+                  ))}
+                </datalist>
                 <button onClick={() => handleManualLookup()} disabled={isManualLoading} className="btn-secondary ml-2">{isManualLoading ? '查詢中...' : <><Search className="mr-1" />查詢營養</>}</button>
               </div>
               {manualError && <p className="text-sm text-red-600 my-3">{manualError}</p>}
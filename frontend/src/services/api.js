@@ -54,9 +54,12 @@ class ApiService {
         return this.makeRequest(`/api/nutrition/${encodeURIComponent(foodName)}`);
     }
 
-    // 獲取系統日誌
-    async getLogs() {
-        return this.makeRequest('/api/logs');
+    // 獲取系統日誌，cursor 為上次回應的 next_cursor，只取得新增的日誌
+    async getLogs({ cursor = 0, level, logger } = {}) {
+        const params = new URLSearchParams({ cursor: String(cursor) });
+        if (level) params.append('level', level);
+        if (logger) params.append('logger', logger);
+        return this.makeRequest(`/api/logs?${params.toString()}`);
     }
 
     // 上傳圖片並分析
@@ -2,40 +2,160 @@
 """
 簡化的健康助手啟動腳本
 避免重複載入 AI 模型的問題
+
+執行期設定透過環境變數調整（詳見 app/runtime_config.py）：
+    HOST / PORT              監聽位址與埠號
+    WEB_CONCURRENCY          uvicorn worker 數量（大於 1 時停用 reload）
+    RELOAD                   是否啟用自動重載（預設單一 worker 時啟用）
+    TORCH_NUM_THREADS        每個 worker 的 torch intra-op 執行緒數
+    TORCH_INTEROP_THREADS    每個 worker 的 torch inter-op 執行緒數
+    OPENCV_NUM_THREADS       每個 worker 的 OpenCV 執行緒數
+    CPU_AFFINITY             "auto" 或核心列表，例如 "0-3"
+    PRELOAD_MODELS           設為 true（或使用 --preload）時，先在主行程載入模型再 fork worker，
+                             讓各 worker 以 copy-on-write 共享權重記憶體
+    INFERENCE_WORKERS        推論行程數。預載模式下由主行程建立一個所有 worker 共用的推論池，
+                             總行程數為 1 + WEB_CONCURRENCY + INFERENCE_WORKERS；
+                             非預載模式下每個 worker 各自建立推論池，
+                             推論行程數為 WEB_CONCURRENCY × INFERENCE_WORKERS。
+                             推論行程以 spawn 啟動，各自從磁碟載入 V2 模型，不共享預載的權重；
+                             預載模式搭配推論池時主行程只預載分類模型
 """
 
 import uvicorn
+import argparse
+import gc
 import logging
 import os
+import signal
+import socket
 import sys
+import time
+
+from app.logging_config import configure_logging
+from app.runtime_config import get_worker_count, resolve_runtime_settings
 
-# 設置日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 設置日誌（格式與等級見 app/logging_config.py）
+configure_logging()
 logger = logging.getLogger(__name__)
 
+def run_preforked(host: str, port: int, workers: int):
+    """
+    預載模型後 fork worker
+
+    主行程載入所有權重後凍結 GC，再 fork 出 worker 共用同一個監聽 socket。
+    權重張量只要不被寫入，就會一直與主行程共享同一份實體記憶體。
+    啟用推論池時 V2 分析在 spawn 的推論行程中執行，這些行程各自載入模型，
+    主行程因此不預載 V2 模型。
+    """
+    from app.preload import preload_models, read_memory_usage
+    from app.services.inference_worker import INFERENCE_WORKERS, create_shared_inference_pool
+
+    before = read_memory_usage()
+    from app.main import app
+    preload_models(include_v2=INFERENCE_WORKERS <= 0)
+    # 將預載的物件移出 GC 追蹤，避免 GC 掃描時寫入物件標頭而觸發頁面複製
+    gc.freeze()
+    after = read_memory_usage()
+    logger.info("主行程記憶體：預載前 %s，預載後 %s", before, after)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # 推論池在 fork 前建立，所有 worker 共用同一組推論行程，推論行程數不隨 worker 數增加
+    inference_pool = create_shared_inference_pool(INFERENCE_WORKERS, workers)
+
+    children = []
+    for index in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.environ["WORKER_INDEX"] = str(index)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+            server.run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    logger.info("已 fork %s 個 worker: %s", workers, children)
+    if inference_pool is not None:
+        inference_pool.start_supervisor()
+        logger.info("共用推論池: %s 個推論行程", inference_pool.num_workers)
+
+    def _forward(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _forward)
+    signal.signal(signal.SIGTERM, _forward)
+
+    # 等 worker 完成啟動後回報每個 worker 的記憶體使用量
+    time.sleep(float(os.getenv("PRELOAD_REPORT_DELAY", "5")))
+    total_pss = 0.0
+    for child in children:
+        usage = read_memory_usage(child)
+        total_pss += usage.get("pss", 0.0)
+        logger.info("worker 記憶體: %s", usage)
+    logger.info("所有 worker PSS 總和: %.1f MB", total_pss)
+
+    for child in children:
+        try:
+            os.waitpid(child, 0)
+        except ChildProcessError:
+            pass
+    if inference_pool is not None:
+        inference_pool.stop()
+
 def main():
     """主函數"""
+    parser = argparse.ArgumentParser(description="Health Assistant API 啟動腳本")
+    parser.add_argument("--preload", action="store_true", help="預載模型後 fork worker 以共享權重記憶體")
+    args = parser.parse_args()
+
     try:
         logger.info("正在啟動 Health Assistant API...")
         logger.info("使用簡化模式，AI 模型將在首次使用時載入")
-        
+
+        host = os.getenv("HOST", "0.0.0.0")
+        port = int(os.getenv("PORT", "8000"))
+        workers = get_worker_count()
+        # uvicorn 的 reload 模式只支援單一 worker
+        reload = workers == 1 and os.getenv("RELOAD", "true").lower() in ("1", "true", "yes")
+
+        # 記錄每個 worker 預計使用的設定，實際生效值由各 worker 啟動時記錄
+        planned = resolve_runtime_settings(worker_index=0)
+        logger.info(
+            "workers=%s, reload=%s, torch_num_threads=%s, torch_interop_threads=%s, "
+            "opencv_num_threads=%s, cpu_affinity=%s",
+            workers, reload, planned['torch_num_threads'], planned['torch_interop_threads'],
+            planned['opencv_num_threads'], os.getenv('CPU_AFFINITY') or 'none',
+        )
+
+        preload = args.preload or os.getenv("PRELOAD_MODELS", "false").lower() in ("1", "true", "yes")
+        if preload:
+            logger.info("使用預載模式：模型將在主行程載入後由 worker 共享")
+            run_preforked(host, port, workers)
+            return
+
         # 啟動 FastAPI 服務器
         uvicorn.run(
             "app.main:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
+            host=host,
+            port=port,
+            reload=reload,
+            workers=None if reload else workers,
             log_level="info"
         )
-        
+
     except KeyboardInterrupt:
         logger.info("收到中斷信號，正在關閉服務器...")
     except Exception as e:
-        logger.error(f"啟動失敗: {str(e)}")
+        logger.error("啟動失敗: %s", str(e))
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
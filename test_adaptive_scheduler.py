@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+負載排程（自動切換預設模型配置）的測試
+
+用法:
+    python -m pytest test_adaptive_scheduler.py
+"""
+
+import time
+
+from app.services.adaptive_scheduler import DEGRADED_CONFIG, NORMAL_CONFIG, AdaptiveScheduler
+from app.services.lightweight_model_service import RECOMMENDED_CONFIGS
+
+
+def _scheduler(**kwargs) -> AdaptiveScheduler:
+    options = dict(enabled=True, queue_high=8, queue_low=2, p95_high=6.0, p95_low=3.0,
+                   window=20, min_samples=5, min_hold=0.0)
+    options.update(kwargs)
+    return AdaptiveScheduler(**options)
+
+
+def test_disabled_always_uses_default_pipeline():
+    """測試停用時一律使用預設配置"""
+    scheduler = _scheduler(enabled=False)
+    assert scheduler.select(100) == (NORMAL_CONFIG, None)
+
+
+def test_queue_depth_hysteresis():
+    """測試佇列過長時降級，介於兩個門檻之間維持現狀，低於恢復門檻才恢復"""
+    scheduler = _scheduler()
+    assert scheduler.select(5) == (NORMAL_CONFIG, None)
+
+    name, config = scheduler.select(8)
+    assert name == DEGRADED_CONFIG
+    assert config == {kind: RECOMMENDED_CONFIGS[DEGRADED_CONFIG][kind]
+                      for kind in ("detection", "segmentation", "depth")}
+
+    assert scheduler.select(5)[0] == DEGRADED_CONFIG
+    assert scheduler.select(2)[0] == NORMAL_CONFIG
+
+
+def test_p95_latency_triggers_downgrade_and_blocks_upgrade():
+    """測試 p95 延遲過高時降級，延遲仍高時即使佇列短也不恢復"""
+    scheduler = _scheduler()
+    for _ in range(4):
+        scheduler.record_latency(10.0)
+    assert scheduler.select(0)[0] == NORMAL_CONFIG  # 樣本不足，不計算 p95
+
+    scheduler.record_latency(10.0)
+    assert scheduler.select(0)[0] == DEGRADED_CONFIG
+    assert scheduler.snapshot()["samples"] == 0  # 切換後重新累積樣本
+
+    for _ in range(5):
+        scheduler.record_latency(4.0)
+    assert scheduler.select(0)[0] == DEGRADED_CONFIG
+    scheduler.reset()
+    assert scheduler.current == NORMAL_CONFIG
+
+
+def test_min_hold_prevents_flapping():
+    """測試切換後在最短維持時間內不會再切換"""
+    scheduler = _scheduler(min_hold=0.05)
+    assert scheduler.select(10)[0] == DEGRADED_CONFIG
+    assert scheduler.select(0)[0] == DEGRADED_CONFIG
+    time.sleep(0.06)
+    assert scheduler.select(0)[0] == NORMAL_CONFIG
+    snapshot = scheduler.snapshot()
+    assert snapshot["selected_config"] == NORMAL_CONFIG
+    assert snapshot["queue_depth"] == 0
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+非同步分析任務佇列的測試：優先順序、執行結果、上傳限制，以及多個 web worker 共用資料庫時的接手與搶佔
+
+用法:
+    python -m pytest test_analysis_jobs.py
+"""
+
+import socket
+import time
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.analysis_job import AnalysisJob
+from app.routers import job_router
+from app.services import analysis_job_service
+from app.services.analysis_job_service import (
+    PROCESS_OWNER, AnalysisJobQueue, ensure_job_schema, validate_callback_url
+)
+
+DEAD_OWNER = f"{socket.gethostname()}:999999999"
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    ensure_job_schema(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(analysis_job_service, "engine", engine)
+    monkeypatch.setattr(analysis_job_service, "SessionLocal", factory)
+    monkeypatch.setattr(analysis_job_service, "JOB_STORAGE_DIR", str(tmp_path))
+    return factory
+
+
+def _add_job(factory, tmp_path, job_id, status, owner=None):
+    image_path = tmp_path / f"{job_id}.img"
+    image_path.write_bytes(b"image")
+    db = factory()
+    db.add(AnalysisJob(id=job_id, status=status, owner=owner, priority="interactive",
+                       image_path=str(image_path), created_at=datetime.utcnow()))
+    db.commit()
+    db.close()
+
+
+def _queued_ids(job_queue):
+    return [entry[2] for entry in list(job_queue._queue.queue)]
+
+
+def _statuses(factory):
+    db = factory()
+    statuses = {job.id: (job.status, job.owner) for job in db.query(AnalysisJob).all()}
+    db.close()
+    return statuses
+
+
+def test_interactive_jobs_run_before_batch_jobs(session_factory):
+    """測試互動式任務排在先提交的批次任務之前，同優先順序內先進先出"""
+    job_queue = AnalysisJobQueue(1)
+    first_batch = job_queue.submit(b"a", priority="batch")
+    interactive = job_queue.submit(b"b", priority="interactive")
+    second_batch = job_queue.submit(b"c", priority="batch")
+    order = [job_queue._queue.get()[2] for _ in range(3)]
+    assert order == [interactive.id, first_batch.id, second_batch.id]
+    assert _statuses(session_factory)[interactive.id] == ("queued", PROCESS_OWNER)
+
+
+def test_job_runs_and_stores_result(session_factory, monkeypatch):
+    """測試任務執行後保存結果並刪除暫存圖片"""
+    monkeypatch.setattr(analysis_job_service, "run_analysis",
+                        lambda image_bytes, config, debug: {"total_estimated_weight": len(image_bytes)})
+    job_queue = AnalysisJobQueue(1)
+    job = job_queue.submit(b"image", {"detection": "yolov8n"})
+    job_queue._run_job(job.id)
+
+    stored = job_queue.get_job(job.id)
+    assert stored.status == "succeeded"
+    assert stored.result == {"total_estimated_weight": 5}
+    assert stored.config == {"detection": "yolov8n"}
+    assert not analysis_job_service.os.path.exists(job.image_path)
+
+
+def test_submit_validation():
+    """測試回呼網址只允許本機，且提交前檢查優先順序與圖片大小"""
+    assert validate_callback_url("http://localhost:8000/hook")
+    assert not validate_callback_url("https://example.com/hook")
+    job_queue = AnalysisJobQueue(1)
+    with pytest.raises(ValueError):
+        job_queue.submit(b"image", priority="urgent")
+    with pytest.raises(ValueError):
+        job_queue.submit(b"x" * (analysis_job_service.ANALYSIS_JOB_MAX_IMAGE_BYTES + 1))
+
+
+def test_upload_over_limit_is_rejected(session_factory, monkeypatch):
+    """測試上傳超過大小上限的圖片時回傳 400，不建立任務"""
+    monkeypatch.setattr(job_router, "ANALYSIS_JOB_MAX_IMAGE_BYTES", 10)
+    job_queue = AnalysisJobQueue(1)
+    monkeypatch.setattr(job_router, "get_job_queue", lambda: job_queue)
+    app = FastAPI()
+    app.include_router(job_router.router)
+    client = TestClient(app)
+
+    response = client.post("/ai/jobs", files={"image": ("a.png", b"x" * 11, "image/png")})
+    assert response.status_code == 400
+    response = client.post("/ai/jobs", files={"image": ("a.png", b"x" * 10, "image/png")})
+    assert response.status_code == 202
+    assert client.get(response.json()["poll_url"]).json()["status"] == "queued"
+    assert job_queue.queue_depth() == 1
+
+
+def test_queued_job_is_claimed_by_one_worker(session_factory, tmp_path):
+    """測試多個 worker 都排入同一個任務時，只有一個能搶佔執行"""
+    _add_job(session_factory, tmp_path, "job1", "queued", owner=DEAD_OWNER)
+    first, second = AnalysisJobQueue(1), AnalysisJobQueue(1)
+    first._recover_unfinished_jobs()
+    assert _queued_ids(first) == ["job1"]
+    # 已由仍在執行的行程接手，不會再被其他行程排入
+    second._recover_unfinished_jobs()
+    assert _queued_ids(second) == []
+
+    assert first._claim_job("job1").owner == PROCESS_OWNER
+    assert second._claim_job("job1") is None
+
+
+def test_jobs_recovered_only_when_owner_is_gone(session_factory, tmp_path):
+    """測試所屬行程仍在執行的任務不會被接手，已結束的才會"""
+    _add_job(session_factory, tmp_path, "live", "running", owner=PROCESS_OWNER)
+    _add_job(session_factory, tmp_path, "dead", "running", owner=DEAD_OWNER)
+    _add_job(session_factory, tmp_path, "remote", "running", owner="other-host:1")
+    _add_job(session_factory, tmp_path, "legacy", "queued")
+
+    job_queue = AnalysisJobQueue(1)
+    job_queue._recover_unfinished_jobs()
+    assert sorted(_queued_ids(job_queue)) == ["dead", "legacy"]
+
+    statuses = _statuses(session_factory)
+    assert statuses["dead"] == ("queued", PROCESS_OWNER)
+    assert statuses["live"] == ("running", PROCESS_OWNER)
+    assert statuses["remote"] == ("running", "other-host:1")
+
+    # 再次檢查時不會重複排入自己已接手的任務
+    job_queue._recover_unfinished_jobs()
+    assert sorted(_queued_ids(job_queue)) == ["dead", "legacy"]
+
+
+def test_stranded_jobs_reclaimed_periodically(session_factory, tmp_path, monkeypatch):
+    """測試執行中的行程結束後，其他行程不需重啟即可定期接手其任務"""
+    monkeypatch.setattr(analysis_job_service, "run_analysis", lambda image_bytes, config, debug: {"ok": True})
+    job_queue = AnalysisJobQueue(1, reclaim_interval=0.05)
+    job_queue.start()
+    try:
+        _add_job(session_factory, tmp_path, "stranded", "running", owner=DEAD_OWNER)
+        deadline = time.monotonic() + 5
+        while _statuses(session_factory)["stranded"][0] != "succeeded":
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    finally:
+        job_queue.stop()
+    assert _statuses(session_factory)["stranded"] == ("succeeded", PROCESS_OWNER)
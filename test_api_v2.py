@@ -144,6 +144,70 @@ def test_analyze_food_custom_config():
         print(f"❌ 測試失敗: {str(e)}")
         return False
 
+def test_analyze_food_batch():
+    """測試批次食物分析（NDJSON 串流）"""
+    print("\n🧪 測試批次食物分析...")
+    
+    try:
+        # 發送多張測試圖片
+        files = [('images', (f'test_{i}.jpg', create_test_image(), 'image/jpeg')) for i in range(3)]
+        data = {'batch_size': '2'}
+        
+        start_time = time.time()
+        response = requests.post(f"{BASE_URL}/ai/v2/analyze-food/batch", files=files, data=data, stream=True)
+        
+        if response.status_code != 200:
+            print(f"❌ 批次分析失敗: {response.status_code}")
+            print(f"錯誤信息: {response.text}")
+            return False
+        
+        results = []
+        for line in response.iter_lines():
+            if not line:
+                continue
+            entry = json.loads(line)
+            results.append(entry)
+            print(f"  第 {entry['index']} 張 ({entry['filename']}): {entry['status']} "
+                  f"@ {time.time() - start_time:.2f} 秒")
+        
+        print(f"✅ 批次分析完成，共收到 {len(results)} 筆結果")
+        return len(results) == 3
+            
+    except Exception as e:
+        print(f"❌ 測試失敗: {str(e)}")
+        return False
+
+def test_analyze_food_stream():
+    """測試串流食物分析（Server-Sent Events）"""
+    print("\n🧪 測試串流食物分析...")
+    
+    try:
+        files = {'image': ('test.jpg', create_test_image(), 'image/jpeg')}
+        
+        start_time = time.time()
+        response = requests.post(f"{BASE_URL}/ai/v2/analyze-food/stream", files=files, stream=True)
+        
+        if response.status_code != 200:
+            print(f"❌ 串流分析失敗: {response.status_code}")
+            print(f"錯誤信息: {response.text}")
+            return False
+        
+        events = []
+        event_name = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event_name = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append(event_name)
+                print(f"  事件 {event_name} @ {time.time() - start_time:.2f} 秒")
+        
+        print(f"✅ 串流分析完成，共收到 {len(events)} 個事件")
+        return bool(events) and events[0] == "objects" and events[-1] == "result"
+            
+    except Exception as e:
+        print(f"❌ 測試失敗: {str(e)}")
+        return False
+
 def test_model_config():
     """測試模型配置端點"""
     print("\n🧪 測試模型配置...")
@@ -198,7 +262,7 @@ def test_compare_models():
         
         # 發送請求
         files = {'image': ('test.jpg', img_bytes, 'image/jpeg')}
-        data = {'configs': json.dumps(configs)}
+        data = {'configs': json.dumps(configs), 'repetitions': '3'}
         
         start_time = time.time()
         response = requests.post(f"{BASE_URL}/ai/v2/compare-models", files=files, data=data)
@@ -213,7 +277,8 @@ def test_compare_models():
             
             for i, comp_result in enumerate(result['comparison_results']):
                 if comp_result['status'] == 'success':
-                    print(f"  配置 {i}: 成功 (時間: {comp_result['total_time']:.2f}s)")
+                    total = comp_result['stage_timings']['total']
+                    print(f"  配置 {i}: 成功 (p50: {total['p50_ms']:.1f} ms, p95: {total['p95_ms']:.1f} ms)")
                 else:
                     print(f"  配置 {i}: 失敗 ({comp_result.get('error', 'Unknown error')})")
             
@@ -249,10 +314,16 @@ def main():
     # 4. 測試自定義配置食物分析
     test_results.append(("自定義配置食物分析", test_analyze_food_custom_config()))
     
-    # 5. 測試模型配置
+    # 5. 測試批次食物分析
+    test_results.append(("批次食物分析", test_analyze_food_batch()))
+    
+    # 6. 測試串流食物分析
+    test_results.append(("串流食物分析", test_analyze_food_stream()))
+    
+    # 7. 測試模型配置
     test_results.append(("模型配置測試", test_model_config()))
     
-    # 6. 測試模型比較
+    # 8. 測試模型比較
     test_results.append(("模型比較", test_compare_models()))
     
     # 總結測試結果
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+V2 批次分析（NDJSON 串流）的逐張產生與上傳大小限制測試
+
+用法:
+    python -m pytest test_batch_analysis.py
+"""
+
+import io
+import zipfile
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.routers import ai_router_v2
+from app.services import ai_service, label_nutrition_service
+from app.services import weight_estimation_service_v2 as v2
+
+
+class FakeBatchModelService:
+    """以固定偵測結果代替模型，並記錄各階段的執行順序"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def detect_objects_batch(self, images):
+        return [[{"label": "plate", "bbox": [0, 0, 100, 100], "confidence": 0.9},
+                 {"label": "food", "bbox": [20, 20, 80, 80], "confidence": 0.8}] for _ in images]
+
+    def estimate_depth_batch(self, images):
+        return [np.ones((image.height, image.width), dtype=np.float32) for image in images]
+
+    def segment_food(self, image, input_boxes):
+        self.events.append(("segment", image.info["name"]))
+        x1, y1, x2, y2 = [int(c) for c in input_boxes[0]]
+        mask = np.zeros((image.height, image.width), dtype=bool)
+        mask[y1:y2, x1:x2] = True
+        return [mask]
+
+    def get_model_info(self):
+        return {"detection": "fake"}
+
+
+def _image_bytes(color=(200, 120, 60)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (100, 100), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_batch_yields_each_image_when_its_stages_finish(monkeypatch):
+    """測試同一組內前一張圖片的結果在下一張圖片分割前就已產生"""
+    events = []
+    service = FakeBatchModelService(events)
+    monkeypatch.setattr(v2, "get_service_for_config", lambda config=None: service)
+    monkeypatch.setattr(ai_service, "classify_food_images", lambda crops: ["Fried Rice"] * len(crops))
+    monkeypatch.setattr(label_nutrition_service, "lookup_label_nutrition",
+                        lambda name: {"calories": 160, "protein": 4, "carbs": 30, "fat": 3, "fiber": 1})
+
+    def decode_named(image_bytes):
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        image.info["name"] = image_bytes[-1]
+        return image
+
+    monkeypatch.setattr(v2, "decode_image", decode_named)
+    named = [("a.png", _image_bytes() + b"a"), ("b.png", _image_bytes() + b"b")]
+    for entry in v2.iter_batch_analysis_v2(named, batch_size=2):
+        events.append(("result", entry["filename"], entry["status"]))
+
+    assert events == [("segment", ord("a")), ("result", "a.png", "success"),
+                      ("segment", ord("b")), ("result", "b.png", "success")]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(ai_router_v2, "MAX_BATCH_IMAGES", 2)
+    monkeypatch.setattr(ai_router_v2, "MAX_BATCH_IMAGE_BYTES", 1000)
+    monkeypatch.setattr(ai_router_v2, "MAX_BATCH_TOTAL_BYTES", 1500)
+    app = FastAPI()
+    app.include_router(ai_router_v2.router)
+    return TestClient(app)
+
+
+def _zip(entries) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _post(client, images=(), archive=None):
+    files = [("images", (name, data, "image/png")) for name, data in images]
+    if archive is not None:
+        files.append(("archive", ("batch.zip", archive, "application/zip")))
+    return client.post("/ai/v2/analyze-food/batch", files=files)
+
+
+def test_batch_rejects_uploads_over_the_limits(client):
+    """測試 multipart 與 zip 的張數、單張大小與總大小超過上限時回傳 400"""
+    small, large = b"x" * 800, b"x" * 1001
+    assert _post(client, [("a.png", small), ("b.png", small), ("c.png", small)]).status_code == 400
+    assert _post(client, [("a.png", large)]).status_code == 400
+    assert _post(client, [("a.png", small), ("b.png", small)]).status_code == 400
+    assert _post(client, [("a.png", small)], _zip([("b.png", small), ("c.png", small)])).status_code == 400
+    assert _post(client, archive=_zip([("a.png", large)])).status_code == 400
+    assert _post(client, [("a.png", small)], _zip([("b.png", small)])).status_code == 400
+    assert _post(client, archive=b"not a zip").status_code == 400
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+食物分析基準測試工具的測試
+
+統計與報告比較邏輯不需要模型即可測試；
+完整流程測試會載入模型，需設定 RUN_PIPELINE_BENCHMARK=1 才執行。
+
+用法:
+    python -m pytest test_benchmark_pipeline.py
+    RUN_PIPELINE_BENCHMARK=1 python -m pytest test_benchmark_pipeline.py
+"""
+
+import os
+
+import pytest
+
+from benchmark_pipeline import summarize, compare_reports, load_fixture_images, benchmark_pipeline
+
+
+def _report(p50, p95, images_per_s):
+    return {
+        "pipelines": {
+            "v2": {
+                "stages": {"total": {"p50_ms": p50, "p95_ms": p95}},
+                "throughput": [{"concurrency": 1, "images_per_s": images_per_s}],
+            }
+        }
+    }
+
+
+def test_summarize_percentiles():
+    """測試延遲統計"""
+    stats = summarize([i / 1000 for i in range(1, 101)])  # 1 ~ 100 ms
+    assert stats["n"] == 100
+    assert stats["p50_ms"] == 50.0
+    assert stats["p95_ms"] == 95.0
+    assert stats["min_ms"] == 1.0
+    assert stats["max_ms"] == 100.0
+
+
+def test_compare_reports_detects_regressions():
+    """測試延遲變慢與吞吐量下降都會被回報"""
+    baseline = _report(100, 200, 10)
+    assert compare_reports(baseline, _report(105, 210, 9.5), tolerance=0.1) == []
+
+    regressions = compare_reports(baseline, _report(150, 200, 5), tolerance=0.1)
+    assert any("total.p50_ms" in r for r in regressions)
+    assert any("throughput@1" in r for r in regressions)
+
+
+def test_synthetic_fixtures_are_deterministic(tmp_path):
+    """測試沒有測試圖片時產生固定的合成圖片"""
+    first = load_fixture_images(str(tmp_path / "missing"), synthetic_count=2)
+    second = load_fixture_images(str(tmp_path / "missing"), synthetic_count=2)
+    assert [name for name, _ in first] == ["synthetic_0.jpg", "synthetic_1.jpg"]
+    assert first == second
+
+
+@pytest.mark.skipif(not os.getenv("RUN_PIPELINE_BENCHMARK"), reason="需設定 RUN_PIPELINE_BENCHMARK=1")
+def test_v2_pipeline_benchmark():
+    """完整執行 v2 流程的基準測試"""
+    images = load_fixture_images(os.getenv("BENCHMARK_IMAGES", "benchmark_images"), synthetic_count=2)
+    result = benchmark_pipeline("v2", images, repetitions=1, concurrency_levels=[1, 2])
+    assert {"detection", "segmentation", "depth", "total"} <= set(result["stages"])
+    assert [point["concurrency"] for point in result["throughput"]] == [1, 2]
+    assert result["peak_rss_mb"] > 0
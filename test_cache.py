@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+兩層式共享快取的測試，以本地的 FakeRespServer 代替 Redis
+
+用法:
+    python -m pytest test_cache.py
+"""
+
+import socket
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.cache import LRUCache, TieredCache, dumps, loads, reset_caches
+from app.models.meal_log import MealLog
+from app.services.meal_service import MealService
+from app.resp import FakeRespServer, RespClient
+
+
+def test_codec_round_trip_and_compression():
+    """測試序列化格式的各種型別，以及大型內容會被壓縮"""
+    value = {
+        "food_name": "炒飯", "calories": 238.5, "count": -3, "big": 2 ** 70, "ok": True, "missing": None,
+        "items": [1, "two", 3.0, [False]], "raw": b"\x00\xff", 7: "int key",
+    }
+    assert loads(dumps(value)) == value
+    assert loads(dumps((1, 2))) == [1, 2]
+
+    large = {"foods": ["fried rice"] * 500}
+    encoded = dumps(large)
+    assert encoded[1] == 1 and len(encoded) < 200
+    assert loads(encoded) == large
+
+
+def test_lru_eviction_and_ttl():
+    """測試超過筆數時淘汰最久未使用的項目，以及到期後未命中"""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    cache.set("short", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") == (False, None)
+
+
+def test_tiers_share_values_across_nodes():
+    """測試一個節點寫入後，另一個節點從共享快取讀到並回填行程內快取"""
+    with FakeRespServer() as server:
+        node_a = TieredCache("nutrition", RespClient.from_url(server.url), key_prefix="test")
+        node_b = TieredCache("nutrition", RespClient.from_url(server.url), key_prefix="test")
+
+        node_a.set("fried rice", {"calories": 238.0})
+        assert node_b.get("fried rice") == {"calories": 238.0}
+        gets = server.commands.count("GET")
+        assert node_b.get("fried rice") == {"calories": 238.0}
+        assert server.commands.count("GET") == gets  # 第二次由行程內快取回應
+
+        assert node_b.get("x" * 500) is None
+        assert node_a.full_key("x" * 500).startswith("test:nutrition:0:") and len(node_a.full_key("x" * 500)) < 80
+
+
+def test_clear_invalidates_namespace_on_all_nodes(monkeypatch):
+    """測試 clear() 遞增世代後，其他節點改用新的鍵"""
+    monkeypatch.setattr("app.cache.CACHE_GENERATION_TTL", 0)
+    with FakeRespServer() as server:
+        node_a = TieredCache("meal_summary", RespClient.from_url(server.url), key_prefix="test")
+        node_b = TieredCache("meal_summary", RespClient.from_url(server.url), key_prefix="test")
+        node_b.set("week", {"total_calories": 1000})
+        assert node_a.get("week") == {"total_calories": 1000}
+        node_a.clear()
+        assert node_b.get("week") is None
+        assert node_a.get("week") is None
+
+
+def test_remote_failure_falls_back_to_local():
+    """測試共享快取無法連線時只使用行程內快取，不拋出例外"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    cache = TieredCache("classification", RespClient("127.0.0.1", port, timeout=0.1), key_prefix="test")
+    cache.set("image", "Fried rice")
+    assert cache.get("image") == "Fried rice"
+    assert cache.get_or_set("other", lambda: "Sushi") == "Sushi"
+
+
+def test_fake_server_expiry():
+    """測試 FakeRespServer 的到期時間與基本指令"""
+    with FakeRespServer() as server:
+        client = RespClient.from_url(server.url)
+        assert client.ping()
+        client.set("k", b"v", ttl=0.05)
+        assert client.get("k") == b"v"
+        assert client.incr("n") == 1 and client.incr("n") == 2
+        time.sleep(0.06)
+        assert client.get("k") is None
+        assert client.delete("n") == 1
+
+
+def test_meal_summary_sees_writes_from_other_workers(tmp_path):
+    """測試沒有共享快取時，其他行程新增的用餐記錄不會讓總結停留在過期的快取"""
+    reset_caches()
+    engine = create_engine(f"sqlite:///{tmp_path / 'meals.db'}")
+    MealLog.metadata.create_all(bind=engine, tables=[MealLog.__table__])
+    service = MealService(sessionmaker(bind=engine)())
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 2)
+
+    service.create_meal_log("rice", "lunch", "medium", {"calories": 200, "protein": 4, "carbs": 44, "fat": 0.4,
+                                                        "fiber": 0.6}, datetime(2024, 1, 1, 12))
+    assert service.get_nutrition_summary(start, end)["total_calories"] == 200
+
+    # 另一個 web worker 直接寫入資料庫，本行程的快取沒有被清除
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO meal_logs (food_name, meal_type, portion_size, calories, protein, carbs, fat, fiber, meal_date)"
+            " VALUES ('egg', 'lunch', 'medium', 80, 6, 1, 5, 0, '2024-01-01 13:00:00')"
+        ))
+    assert service.get_nutrition_summary(start, end)["total_calories"] == 280
+    reset_caches()
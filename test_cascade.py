@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+V2 分析串接模式（快速路徑）的測試
+
+用法:
+    python -m pytest test_cascade.py
+"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.metrics import ANALYSIS_PATHS
+from app.services import ai_service, label_nutrition_service
+from app.services import weight_estimation_service_v2 as v2
+
+
+class FakeModelService:
+    """以固定偵測結果代替模型，並記錄分割與深度估計的呼叫次數"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = {"segment": 0, "depth": 0}
+
+    def detect_objects(self, image):
+        return self.objects
+
+    def segment_food(self, image, input_boxes):
+        self.calls["segment"] += 1
+        x1, y1, x2, y2 = [int(c) for c in input_boxes[0]]
+        mask = np.zeros((image.height, image.width), dtype=bool)
+        mask[y1:y2, x1:x2] = True
+        return [mask]
+
+    def estimate_depth(self, image):
+        self.calls["depth"] += 1
+        return np.ones((image.height, image.width), dtype=np.float32)
+
+    def get_model_info(self):
+        return {"detection": "fake"}
+
+
+PLATE = {"label": "plate", "bbox": [0, 0, 200, 200], "confidence": 0.9}
+FOOD = {"label": "food", "bbox": [50, 50, 150, 130], "confidence": 0.8}
+SIDE = {"label": "food", "bbox": [10, 150, 60, 190], "confidence": 0.7}
+
+
+def _image_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 200), (200, 120, 60)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """以假模型與固定分類結果執行分析，回傳 (執行函數, 假模型服務)"""
+    holder = {}
+
+    def run(objects, score=0.9, cascade=True):
+        model_service = FakeModelService(objects)
+        service = object.__new__(v2.WeightEstimationServiceV2)
+        service.model_config = {}
+        service.model_service = model_service
+        holder["service"] = model_service
+        monkeypatch.setattr(v2, "get_service_for_config", lambda config=None: service)
+        monkeypatch.setattr(ai_service, "classify_food_image_with_score", lambda data: ("Fried Rice", score))
+        monkeypatch.setattr(ai_service, "classify_food_image", lambda data: "Fried Rice")
+        monkeypatch.setattr(label_nutrition_service, "lookup_label_nutrition",
+                            lambda name: {"calories": 160, "protein": 4, "carbs": 30, "fat": 3, "fiber": 1})
+        return v2.analyze_food_image_v2(image_bytes=_image_bytes(), cascade=cascade), model_service
+
+    return run
+
+
+def test_single_confident_item_skips_segmentation_and_depth(pipeline):
+    """測試單一食物且分類可信時走快速路徑，不執行分割與深度估計"""
+    result, model_service = pipeline([PLATE, FOOD])
+    assert result["pipeline"] == "fast"
+    assert model_service.calls == {"segment": 0, "depth": 0}
+    assert [food["food_name"] for food in result["detected_foods"]] == ["Fried Rice"]
+    assert result["detected_foods"][0]["estimated_weight"] > 0
+    assert result["reference_object"] == "plate"
+
+
+def test_low_confidence_or_multiple_items_use_full_pipeline(pipeline):
+    """測試信心度不足、多項食物或停用串接時走完整流程"""
+    for objects, score, cascade in (([PLATE, FOOD], 0.3, True), ([PLATE, FOOD, SIDE], 0.9, True),
+                                    ([PLATE, FOOD], 0.9, False)):
+        result, model_service = pipeline(objects, score=score, cascade=cascade)
+        assert result["pipeline"] == "full"
+        assert model_service.calls["depth"] == 1
+        assert model_service.calls["segment"] == len(objects) - 1
+
+
+def test_ellipse_mask_is_inscribed_in_bbox():
+    """測試近似遮罩為邊界框的內切橢圓，面積約為框的 π/4"""
+    mask = v2.ellipse_mask([20, 40, 120, 100], 200, 200)
+    rows, cols = np.where(mask)
+    assert rows.min() >= 40 and rows.max() < 100
+    assert cols.min() >= 20 and cols.max() < 120
+    assert abs(mask.sum() / (100 * 60) - np.pi / 4) < 0.02
+    assert not v2.ellipse_mask([300, 300, 400, 400], 200, 200).any()
+
+
+def test_cascade_stats_report_fast_path_ratio():
+    """測試統計依流程計數並計算快速路徑比例"""
+    before = v2.get_cascade_stats()
+    ANALYSIS_PATHS.inc(path="fast")
+    ANALYSIS_PATHS.inc(path="fast")
+    ANALYSIS_PATHS.inc(path="full")
+    stats = v2.get_cascade_stats()
+    assert stats["fast"] == before["fast"] + 2
+    assert stats["full"] == before["full"] + 1
+    assert stats["fast_path_ratio"] == round(stats["fast"] / (stats["fast"] + stats["full"]), 4)
+    assert stats["min_confidence"] == v2.CASCADE_MIN_CONFIDENCE
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+斷路器與 USDA 降級模式的測試
+
+用法:
+    python -m pytest test_circuit_breaker.py
+"""
+
+import time
+
+import requests
+
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.services import label_nutrition_service, nutrition_api_service
+
+
+def test_state_transitions():
+    """測試連續失敗後開啟、逾時後半開試探、試探成功後恢復"""
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure("timeout")
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["short_circuited"] == 1
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # 同時只放行一個試探請求
+    breaker.record_failure("429")
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_fetch_short_circuits_to_local_data(monkeypatch):
+    """測試 USDA 連續逾時後不再呼叫，改用內建營養表"""
+    calls = []
+
+    def timeout(*args, **kwargs):
+        calls.append(kwargs.get("timeout"))
+        raise requests.exceptions.Timeout("read timed out")
+
+    breaker = CircuitBreaker("usda_test", failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(nutrition_api_service, "usda_breaker", breaker)
+    monkeypatch.setattr(nutrition_api_service, "lookup_local_nutrition", lambda name: None)
+    monkeypatch.setattr(nutrition_api_service.requests, "get", timeout)
+    monkeypatch.setattr(label_nutrition_service, "_label_map", {})
+
+    for name in ("bananas", "chiken", "sushi"):
+        result = nutrition_api_service.fetch_nutrition_data(name)
+        assert result["degraded"] is True and result["calories"] > 0
+
+    assert len(calls) == 2 and calls[0] == nutrition_api_service.USDA_TIMEOUT_SECONDS
+    assert breaker.state == OPEN
+
+    unknown = nutrition_api_service.fetch_nutrition_data("zzqx")
+    assert "error" in unknown and len(calls) == 2
+
+
+def test_half_open_trial_always_settles(monkeypatch):
+    """測試試探請求收到 4xx 或無法解析的回應時也會結束半開狀態，不會永久拒絕呼叫"""
+    class Response:
+        def __init__(self, status_code, body=None):
+            self.status_code = status_code
+            self.body = body
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+        def json(self):
+            if self.body is None:
+                raise ValueError("invalid json")
+            return self.body
+
+    responses = []
+    breaker = CircuitBreaker("usda_trial", failure_threshold=1, reset_timeout=0.05)
+    monkeypatch.setattr(nutrition_api_service, "usda_breaker", breaker)
+    monkeypatch.setattr(nutrition_api_service, "USDA_API_KEY", "test-key")
+    monkeypatch.setattr(nutrition_api_service, "lookup_local_nutrition", lambda name: None)
+    monkeypatch.setattr(nutrition_api_service.requests, "get", lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setattr(nutrition_api_service, "get_cache", lambda *args, **kwargs: _NoCache())
+
+    responses.append(Response(503))
+    nutrition_api_service._fetch_nutrition_data("apple")
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    responses.append(Response(404))
+    nutrition_api_service._fetch_nutrition_data("apple")
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure("503")
+    time.sleep(0.06)
+    responses.append(Response(200))  # 回應無法解析
+    nutrition_api_service._fetch_nutrition_data("apple")
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+class _NoCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+背景除錯輸出寫入器的測試
+
+用法:
+    python -m pytest test_debug_writer.py
+"""
+
+import os
+import threading
+
+from app.services.debug_writer import DebugArtifactWriter
+
+
+def _write_text(text):
+    def render(path):
+        with open(path, "w") as f:
+            f.write(text)
+    return render
+
+
+def test_artifacts_written_in_background(tmp_path):
+    """測試檔案由背景執行緒寫入指定的分析目錄"""
+    writer = DebugArtifactWriter(output_dir=str(tmp_path))
+    run_dir = writer.new_run_dir()
+    assert writer.submit(run_dir, "00_original.txt", _write_text("hello"))
+    writer.flush()
+    with open(os.path.join(run_dir, "00_original.txt")) as f:
+        assert f.read() == "hello"
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    """測試佇列已滿時丟棄檔案而不阻塞請求"""
+    writer = DebugArtifactWriter(output_dir=str(tmp_path), queue_size=1)
+    release = threading.Event()
+    run_dir = writer.new_run_dir()
+
+    writer.submit(run_dir, "blocking.txt", lambda path: release.wait(5))
+    # 等背景執行緒取走第一筆，再填滿佇列
+    while writer._queue.qsize():
+        pass
+    assert writer.submit(run_dir, "queued.txt", _write_text("queued"))
+    assert not writer.submit(run_dir, "dropped.txt", _write_text("dropped"))
+    release.set()
+    writer.flush()
+    assert not os.path.exists(os.path.join(run_dir, "dropped.txt"))
+
+
+def test_retention_keeps_newest_runs(tmp_path):
+    """測試超過保留數量時刪除最舊的分析目錄"""
+    writer = DebugArtifactWriter(output_dir=str(tmp_path), max_runs=2)
+    run_dirs = [os.path.join(str(tmp_path), f"2024010{i}_000000_000000") for i in range(1, 5)]
+    for run_dir in run_dirs:
+        writer.submit(run_dir, "artifact.txt", _write_text("x"))
+        writer.flush()
+
+    assert sorted(os.listdir(str(tmp_path))) == [os.path.basename(d) for d in run_dirs[-2:]]
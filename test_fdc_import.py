@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+FDC 大量匯入與本地營養檢索的測試
+
+用法:
+    python -m pytest test_fdc_import.py
+"""
+
+import csv
+import os
+
+from sqlalchemy import create_engine, text
+
+from app.fdc_import import FdcImporter
+from app.services.nutrition_search_service import lookup_local_nutrition, search_nutrition
+
+
+def _write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _fixture_dump(directory):
+    _write_csv(os.path.join(directory, "nutrient.csv"), ["id", "name", "unit_name", "nutrient_nbr", "rank"], [
+        ["1008", "Energy", "KCAL", "208", "300"],
+        ["1003", "Protein", "G", "203", "600"],
+        ["1093", "Sodium, Na", "MG", "307", "5800"],
+    ])
+    _write_csv(os.path.join(directory, "food.csv"), ["fdc_id", "data_type", "description", "food_category_id", "publication_date"], [
+        ["1001", "sr_legacy_food", "Apples, raw, with skin", "9", "2019-04-01"],
+        ["1002", "sr_legacy_food", "Apple pie, commercially prepared", "18", "2019-04-01"],
+        ["1003", "branded_food", "Fried rice", "", "2021-01-01"],
+        ["1004", "branded_food", "Fried rice", "", "2021-01-01"],  # 名稱重複，保留第一筆
+    ])
+    _write_csv(os.path.join(directory, "food_nutrient.csv"), ["id", "fdc_id", "nutrient_id", "amount"], [
+        ["1", "1001", "1008", "52"],
+        ["2", "1001", "1003", "0.26"],
+        ["3", "1002", "1008", "237"],
+        ["4", "1003", "1008", "238"],
+        ["5", "1003", "1093", "680"],
+        ["6", "1004", "1008", "999"],
+    ])
+
+
+def test_import_and_ranked_search(tmp_path):
+    """測試分批匯入後能以全文檢索依相關度查詢"""
+    _fixture_dump(tmp_path)
+    db = create_engine(f"sqlite:///{tmp_path / 'nutrition.db'}")
+
+    stats = FdcImporter(bind=db, batch_size=2).import_path(str(tmp_path))
+    assert stats["foods"] == 4
+
+    with db.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM nutrition")).scalar() == 3
+        assert conn.execute(text("SELECT count(*) FROM food_nutrients")).scalar() == 5
+
+    results = search_nutrition("apple", limit=5, bind=db)
+    assert [r["food_name"] for r in results][0].startswith("Apple")
+    assert {r["fdc_id"] for r in results} == {1001, 1002}
+
+    fried_rice = search_nutrition("FRIED RICE", limit=1, bind=db)[0]
+    assert fried_rice["fdc_id"] == 1003
+    assert fried_rice["calories"] == 238 and fried_rice["sodium"] == 680
+
+    # 重新匯入不會重複營養素
+    FdcImporter(bind=db, batch_size=2).import_path(str(tmp_path))
+    with db.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM food_nutrients")).scalar() == 5
+
+
+def test_lookup_requires_matching_name(tmp_path):
+    """測試直接取代 USDA 的本地查詢只採用名稱相符的食物，不採用只是包含查詢詞的食物"""
+    _fixture_dump(tmp_path)
+    db = create_engine(f"sqlite:///{tmp_path / 'nutrition.db'}")
+    FdcImporter(bind=db, batch_size=2).import_path(str(tmp_path))
+
+    assert lookup_local_nutrition("apple", bind=db)["food_name"] == "Apples, raw, with skin"
+    assert lookup_local_nutrition("Apple Pie", bind=db)["food_name"] == "Apple pie, commercially prepared"
+    assert lookup_local_nutrition("fried rice", bind=db)["fdc_id"] == 1003
+    assert lookup_local_nutrition("pie", bind=db) is None
+    assert lookup_local_nutrition("fried", bind=db) is None
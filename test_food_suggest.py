@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+食物名稱自動完成前綴索引的測試
+
+延遲測試依賴執行環境的速度，需設定 RUN_LATENCY_BENCHMARK=1 才執行。
+
+用法:
+    python -m pytest test_food_suggest.py
+    RUN_LATENCY_BENCHMARK=1 python -m pytest test_food_suggest.py
+"""
+
+import os
+import time
+
+import pytest
+
+from sqlalchemy import create_engine, text
+
+from app.models.nutrition import Nutrition
+from app.services import food_suggest_service
+from app.services.food_suggest_service import PrefixIndex
+
+
+def _index():
+    index = PrefixIndex()
+    index.load([
+        (1, "Rice", "米飯", []),
+        (2, "Fried rice", "炒飯", ["chahan"]),
+        (3, "Rice pudding", None, []),
+        (4, "Apple pie", "蘋果派", []),
+    ])
+    return index
+
+
+def test_prefix_ranking():
+    """測試完全相符與名稱開頭排在名稱中間的單字之前"""
+    names = [s["food_name"] for s in _index().search("rice")]
+    assert names == ["Rice", "Rice pudding", "Fried rice"]
+
+
+def test_chinese_name_and_alias():
+    """測試中文名稱與別名的前綴比對"""
+    index = _index()
+    assert index.search("炒")[0]["food_name"] == "Fried rice"
+    assert index.search("chah")[0]["food_name"] == "Fried rice"
+
+
+def test_incremental_updates():
+    """測試逐筆新增、更新與刪除"""
+    index = _index()
+    index.upsert(5, "Ricotta", "瑞可塔起司")
+    assert "Ricotta" in [s["food_name"] for s in index.search("ric")]
+    index.upsert(5, "Ricotta cheese", None)
+    assert [s["food_name"] for s in index.search("瑞可")] == []
+    index.remove(1)
+    assert "Rice" not in [s["food_name"] for s in index.search("rice")]
+    assert index.max_id == 5
+
+
+@pytest.mark.skipif(not os.getenv("RUN_LATENCY_BENCHMARK"), reason="需設定 RUN_LATENCY_BENCHMARK=1")
+def test_search_latency():
+    """測試 10 萬筆資料下單次查詢在 1 毫秒內"""
+    index = PrefixIndex()
+    index.load((i, f"food {i} item", None, []) for i in range(100000))
+    start = time.perf_counter()
+    for _ in range(200):
+        index.search("food 123")
+    assert (time.perf_counter() - start) / 200 < 0.001
+
+
+def test_changes_from_other_processes_rebuild_in_background(tmp_path, monkeypatch):
+    """測試其他連線的新增、修改與刪除都會改變資料版本，並在背景重新載入後替換索引"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'suggest.db'}")
+    Nutrition.metadata.create_all(bind=engine, tables=[Nutrition.__table__])
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO nutrition (id, food_name) VALUES (1, 'Rice'), (2, 'Ramen')"))
+    monkeypatch.setattr(food_suggest_service, "engine", engine)
+    monkeypatch.setattr(food_suggest_service, "_index", None)
+    monkeypatch.setattr(food_suggest_service, "SUGGEST_REFRESH_SECONDS", 0)
+
+    index = food_suggest_service.load_suggest_index()
+    assert food_suggest_service.get_suggest_index() is index
+    assert [s["food_name"] for s in index.search("r")] == ["Rice", "Ramen"]
+
+    versions = [index.version]
+    for statement in ("UPDATE nutrition SET food_name = 'Brown rice' WHERE id = 1",
+                      "DELETE FROM nutrition WHERE id = 2",
+                      "INSERT INTO nutrition (id, food_name) VALUES (3, 'Risotto')"):
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+            versions.append(food_suggest_service._data_version(conn))
+    assert len(set(versions)) == len(versions)
+
+    food_suggest_service.get_suggest_index()  # 觸發檢查，重新載入在背景進行
+    thread = food_suggest_service._rebuild_thread
+    if thread is not None:
+        thread.join(timeout=5)
+    index = food_suggest_service.get_suggest_index()
+    assert index.version == versions[-1]
+    assert [s["food_name"] for s in index.search("r")] == ["Risotto", "Brown rice"]
+
+
+def test_rebuild_swaps_index_and_clears_flag_under_lock(monkeypatch):
+    """測試背景重新載入在持有索引鎖時替換索引並清除執行中的標記，不會與下一次啟動交錯"""
+    old, new = _index(), PrefixIndex()
+    monkeypatch.setattr(food_suggest_service, "_index", old)
+    monkeypatch.setattr(food_suggest_service, "_build_index", lambda: new)
+
+    with food_suggest_service._index_lock:
+        food_suggest_service._rebuild_in_background()
+        thread = food_suggest_service._rebuild_thread
+        time.sleep(0.1)
+        # 載入已完成，但在取得鎖之前索引與標記都維持原狀
+        assert thread is not None and thread.is_alive()
+        assert food_suggest_service._index is old
+    thread.join(timeout=5)
+    assert food_suggest_service._rebuild_thread is None
+    assert food_suggest_service._index is new
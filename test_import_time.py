@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+匯入時間回歸測試
+
+以 `python -X importtime` 匯入 app.main，確認 torch / transformers / ultralytics / cv2
+不會在啟動時被匯入（只在第一次使用 AI 端點時才載入），並檢查總匯入時間在預算內。
+
+用法:
+    python -m pytest test_import_time.py
+    python test_import_time.py   # 印出最耗時的前 15 個模組
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 啟動時不允許匯入的重量級 ML 套件
+HEAVY_MODULES = ["torch", "transformers", "ultralytics", "cv2"]
+
+# app.main 的累積匯入時間預算（微秒），可透過環境變數調整
+IMPORT_TIME_BUDGET_US = int(os.getenv("IMPORT_TIME_BUDGET_US", "3000000"))
+
+
+def measure_import_time(module: str = "app.main"):
+    """
+    在乾淨的子行程中匯入模組並解析 -X importtime 輸出
+
+    Returns:
+        {模組名稱: 累積匯入時間（微秒）}
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"匯入 {module} 失敗:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        # 格式: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # 子模組以縮排表示層級，去除空白後即為完整模組名稱
+        timings[name.strip()] = int(cumulative_us)
+    return timings
+
+
+def test_heavy_modules_not_imported_at_startup():
+    """測試啟動時不匯入重量級 ML 套件"""
+    timings = measure_import_time()
+    imported = [name for name in timings if name.split(".")[0] in HEAVY_MODULES]
+    assert not imported, f"啟動時匯入了重量級套件: {sorted(set(n.split('.')[0] for n in imported))}"
+
+
+def test_import_time_within_budget():
+    """測試 app.main 的匯入時間在預算內"""
+    timings = measure_import_time()
+    total = timings.get("app.main", 0)
+    assert total <= IMPORT_TIME_BUDGET_US, f"app.main 匯入耗時 {total / 1000:.0f} ms，超過預算 {IMPORT_TIME_BUDGET_US / 1000:.0f} ms"
+
+
+if __name__ == "__main__":
+    timings = measure_import_time()
+    print(f"🧪 app.main 累積匯入時間: {timings.get('app.main', 0) / 1000:.1f} ms")
+    for name, cumulative in sorted(timings.items(), key=lambda item: -item[1])[:15]:
+        print(f"{cumulative / 1000:>10.1f} ms  {name}")
+    heavy = sorted({n.split(".")[0] for n in timings if n.split(".")[0] in HEAVY_MODULES})
+    print("✅ 未匯入重量級套件" if not heavy else f"❌ 匯入了重量級套件: {heavy}")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+推論 worker 池的測試：推論行程意外結束時，其處理中的任務立即失敗
+
+用法:
+    python -m pytest test_inference_worker.py
+"""
+
+import asyncio
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from app.services.inference_worker import InferenceWorkerDied, InferenceWorkerPool
+
+
+def test_in_flight_task_fails_fast_when_worker_dies():
+    """測試推論行程結束時，登記為處理中的任務以可重試的錯誤結束，不必等到逾時"""
+    pool = InferenceWorkerPool(1)
+    pool.start()
+    try:
+        process = pool._processes[0]
+        # 暫停推論行程，任務停在佇列中；再登記為該行程處理中的任務後結束行程
+        os.kill(process.pid, signal.SIGSTOP)
+
+        async def run():
+            task = asyncio.ensure_future(pool.analyze(np.zeros((8, 8, 3), np.uint8)))
+            await asyncio.sleep(0.1)
+            pool._in_flight[0], pool._in_flight[1] = 0, 0
+            os.kill(process.pid, signal.SIGKILL)
+            start = time.monotonic()
+            with pytest.raises(InferenceWorkerDied):
+                await task
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) < 10
+        assert pool._processes[0].pid != process.pid
+    finally:
+        pool.stop()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+分類標籤 → 營養資料對應表的測試
+
+用法:
+    python -m pytest test_label_nutrition.py
+"""
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.services import label_nutrition_service
+from app.services.label_nutrition_service import (
+    FOOD101_LABELS, builtin_nutrition, ensure_label_mapping, get_label_nutrition, lookup_label_nutrition,
+    normalize_label
+)
+
+
+def test_labels_and_normalization():
+    """測試 Food-101 標籤數量，以及分類輸出與原始標籤正規化為同一個鍵"""
+    assert len(FOOD101_LABELS) == 101 == len(set(FOOD101_LABELS))
+    assert normalize_label("Apple Pie") == normalize_label("apple_pie") == "apple pie"
+
+
+def test_builtin_tables_are_mapped():
+    """測試內建營養表的食物名稱都能解析"""
+    builtin = builtin_nutrition()
+    assert builtin["sushi"]["calories"] == 200
+    assert "ice cream" in builtin
+
+
+def test_lookup_uses_mapping_before_search(monkeypatch):
+    """測試有對應的標籤直接查表，沒有對應時才搜尋"""
+    monkeypatch.setattr(label_nutrition_service, "_label_map", {
+        "fried rice": {"food_name": "Fried rice", "fdc_id": 1, "source": "local", "calories": 238.0},
+    })
+    searched = []
+    monkeypatch.setattr("app.services.nutrition_api_service.fetch_nutrition_data",
+                        lambda name: searched.append(name) or {"calories": 1.0})
+
+    assert get_label_nutrition("Fried Rice")["calories"] == 238.0
+    assert lookup_label_nutrition("Fried Rice")["fdc_id"] == 1
+    assert lookup_label_nutrition("Mystery Stew") == {"calories": 1.0}
+    assert searched == ["Mystery Stew"]
+
+
+def test_mapping_built_at_startup_and_read_only_in_requests(tmp_path, monkeypatch):
+    """測試請求期間不會建立對應表，啟動時的 ensure_label_mapping 才會建立"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'labels.db'}")
+    monkeypatch.setattr(label_nutrition_service, "engine", engine)
+    monkeypatch.setattr(label_nutrition_service, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(label_nutrition_service, "lookup_local_nutrition", lambda name: None)
+    monkeypatch.setattr(label_nutrition_service, "_label_map", None)
+    builds = []
+    build = label_nutrition_service.build_label_mapping
+    monkeypatch.setattr(label_nutrition_service, "build_label_mapping",
+                        lambda *args, **kwargs: builds.append(1) or build(*args, **kwargs))
+
+    assert get_label_nutrition("sushi") is None
+    assert builds == []
+
+    assert ensure_label_mapping() > 0
+    assert get_label_nutrition("Sushi")["source"] == "builtin"
+    assert ensure_label_mapping() > 0
+    assert builds == [1]
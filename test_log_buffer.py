@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+日誌環形緩衝區的測試
+
+用法:
+    python -m pytest test_log_buffer.py
+"""
+
+import logging
+import time
+
+from app.log_buffer import RingBufferHandler
+
+
+def _make_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.handlers = [handler]
+    return logger
+
+
+def test_buffer_is_bounded():
+    """測試超過容量時丟棄最舊的紀錄"""
+    handler = RingBufferHandler(capacity=3)
+    logger = _make_logger("test.bounded", handler)
+    for i in range(5):
+        logger.info("message %d", i)
+
+    result = handler.query()
+    assert [entry["message"] for entry in result["logs"]] == ["message 2", "message 3", "message 4"]
+    assert result["buffered"] == 3
+    assert result["truncated"]
+
+
+def test_cursor_returns_only_new_records():
+    """測試以游標增量取得日誌"""
+    handler = RingBufferHandler(capacity=10)
+    logger = _make_logger("test.cursor", handler)
+    logger.info("first")
+    first = handler.query()
+    logger.info("second")
+    second = handler.query(cursor=first["next_cursor"])
+
+    assert [entry["message"] for entry in second["logs"]] == ["second"]
+    assert handler.query(cursor=second["next_cursor"])["logs"] == []
+
+
+def test_filters_by_level_logger_and_time():
+    """測試依等級、logger 與時間篩選"""
+    handler = RingBufferHandler(capacity=10)
+    service_logger = _make_logger("test.filter.service", handler)
+    other_logger = _make_logger("test.other", handler)
+    service_logger.info("info")
+    service_logger.warning("warning")
+    other_logger.error("other error")
+
+    assert [e["message"] for e in handler.query(level="WARNING")["logs"]] == ["warning", "other error"]
+    assert [e["message"] for e in handler.query(logger_name="test.filter")["logs"]] == ["info", "warning"]
+    assert handler.query(since=time.time() + 60)["logs"] == []
+
+
+def test_filtered_poll_still_advances_cursor():
+    """測試被篩掉的紀錄也會推進游標"""
+    handler = RingBufferHandler(capacity=10)
+    logger = _make_logger("test.advance", handler)
+    logger.debug("debug 1")
+    logger.debug("debug 2")
+
+    result = handler.query(level="ERROR")
+    assert result["logs"] == []
+    assert result["next_cursor"] == 2
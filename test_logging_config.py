@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+集中式日誌設定的測試
+
+用法:
+    python -m pytest test_logging_config.py
+"""
+
+import json
+import logging
+
+from app.logging_config import JsonFormatter, parse_module_levels
+
+
+def test_json_formatter_includes_extra_fields():
+    """測試 JSON 輸出包含延遲格式化後的訊息與 extra 欄位"""
+    record = logging.LogRecord("app.test", logging.INFO, __file__, 1, "重量 %.1f g", (12.345,), None)
+    record.food = "apple"
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "重量 12.3 g"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+    assert entry["food"] == "apple"
+
+
+def test_parse_module_levels():
+    """測試解析個別模組的日誌等級設定"""
+    levels = parse_module_levels("app.services.ai_service=debug, uvicorn.access=WARNING,,invalid")
+    assert levels == {"app.services.ai_service": "DEBUG", "uvicorn.access": "WARNING"}
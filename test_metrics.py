@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+執行期指標的測試
+
+用法:
+    python -m pytest test_metrics.py
+"""
+
+from app import runtime_config
+from app.metrics import (
+    ANALYSIS_PATHS, ANALYSIS_STAGE_SECONDS, Counter, Histogram, record_analysis_path, render_prometheus,
+    stage_timer, suppress_analysis_metrics, _write_target,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    """測試直方圖輸出累積區間、總和與次數"""
+    histogram = Histogram("test_stage_seconds", "Test histogram.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="detection")
+    histogram.observe(0.5, stage="detection")
+    histogram.observe(5.0, stage="detection")
+
+    lines = histogram.render()
+    assert "# TYPE test_stage_seconds histogram" in lines
+    assert 'test_stage_seconds_bucket{stage="detection",le="0.1"} 1' in lines
+    assert 'test_stage_seconds_bucket{stage="detection",le="1.0"} 2' in lines
+    assert 'test_stage_seconds_bucket{stage="detection",le="+Inf"} 3' in lines
+    assert 'test_stage_seconds_count{stage="detection"} 3' in lines
+
+
+def test_counter_and_registry():
+    """測試計數器累加並出現在 /metrics 輸出中"""
+    counter = Counter("test_cache_requests_total", "Test counter.", ["cache", "result"])
+    counter.inc(cache="nutrition", result="hit")
+    counter.inc(cache="nutrition", result="hit")
+    assert counter.get(cache="nutrition", result="hit") == 2
+    assert 'test_cache_requests_total{cache="nutrition",result="hit"} 2' in render_prometheus()
+
+
+def test_write_target_parsing():
+    """測試從 SQL 判斷寫入操作與資料表"""
+    assert _write_target("INSERT INTO meal_logs (food_name) VALUES (?)") == ("insert", "meal_logs")
+    assert _write_target('UPDATE "analysis_jobs" SET status=?') == ("update", "analysis_jobs")
+    assert _write_target("DELETE FROM nutrition") == ("delete", "nutrition")
+    assert _write_target("SELECT * FROM meal_logs") is None
+
+
+def test_suppressed_thread_does_not_record_analysis_metrics():
+    """測試模型比較的執行緒不計入線上的階段延遲與流程統計"""
+    before = ANALYSIS_PATHS.get(path="fast")
+    with suppress_analysis_metrics():
+        with stage_timer("test_suppressed"):
+            pass
+        record_analysis_path("fast")
+    assert ANALYSIS_PATHS.get(path="fast") == before
+    assert not any('stage="test_suppressed"' in line for line in ANALYSIS_STAGE_SECONDS.render())
+
+    with stage_timer("test_suppressed"):
+        pass
+    assert any('stage="test_suppressed"' in line for line in ANALYSIS_STAGE_SECONDS.render())
+
+
+def test_inference_budget_is_split_across_tasks(monkeypatch):
+    """測試未設定 TORCH_NUM_THREADS 時依任務數切分 CPU 配額，明確設定時以其為每個推論的執行緒數"""
+    monkeypatch.setattr(runtime_config, "_runtime_settings", {"cpu_affinity": list(range(8))})
+    monkeypatch.delenv("TORCH_NUM_THREADS", raising=False)
+    assert runtime_config.split_inference_budget(1) == (1, 8)
+    assert runtime_config.split_inference_budget(3) == (3, 2)
+    assert runtime_config.split_inference_budget(20) == (8, 1)
+
+    monkeypatch.setenv("TORCH_NUM_THREADS", "4")
+    assert runtime_config.split_inference_budget(3) == (2, 4)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+批次營養查詢的測試
+
+用法:
+    python -m pytest test_nutrition_batch.py
+"""
+
+import asyncio
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.services import nutrition_batch_service
+from app.services.nutrition_search_service import ensure_search_index, lookup_exact_nutrition_many
+
+
+def test_exact_many_single_query(tmp_path):
+    """測試一次查詢取得多個完全相符的名稱（不分大小寫）"""
+    db = create_engine(f"sqlite:///{tmp_path / 'nutrition.db'}")
+    ensure_search_index(db)
+    with db.begin() as conn:
+        conn.execute(text("INSERT INTO nutrition (food_name, calories) VALUES ('Fried rice', 238), ('Apple', 52)"))
+    found = lookup_exact_nutrition_many(["fried RICE", "apple", "apple", "mystery"], bind=db)
+    assert set(found) == {"fried rice", "apple"}
+    assert found["fried rice"]["calories"] == 238.0
+
+
+def test_batch_dedupes_and_bounds_concurrency(monkeypatch):
+    """測試名稱去除重複、本地與對應表優先，其餘以有上限的並行數查詢"""
+    local_calls, searched = [], []
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_fetch(name):
+        with lock:
+            searched.append(name)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        if name == "mystery stew":
+            return None
+        if name == "broken":
+            return {"calories": 0, "error": "USDA 暫時無法使用"}
+        return {"food_name": name, "calories": 100.0}
+
+    monkeypatch.setattr(nutrition_batch_service, "lookup_exact_nutrition_many",
+                        lambda names: local_calls.append(names) or {"rice": {"food_name": "Rice", "source": "local"}})
+    monkeypatch.setattr(nutrition_batch_service, "get_label_nutrition",
+                        lambda name: {"food_name": "Apple pie", "source": "builtin"} if name == "apple pie" else None)
+    monkeypatch.setattr(nutrition_batch_service, "fetch_nutrition_data", fake_fetch)
+    monkeypatch.setattr(nutrition_batch_service, "_semaphore", asyncio.Semaphore(2))
+
+    names = ["Rice", "rice ", "Apple Pie", "mystery stew", "broken", "  "] + [f"food {i}" for i in range(6)]
+    response = asyncio.run(nutrition_batch_service.lookup_nutrition_batch(names))
+    results = response["results"]
+
+    assert len(local_calls) == 1
+    assert results["Rice"] == results["rice"]
+    assert results["Rice"]["source"] == "local"
+    assert results["Apple Pie"]["source"] == "builtin"
+    assert results["mystery stew"]["status"] == "not_found"
+    assert results["broken"]["status"] == "error"
+    assert results["  "] == {"status": "error", "error": "empty name"}
+    assert results["food 3"]["status"] == "ok" and results["food 3"]["source"] == "usda"
+    assert sorted(searched) == sorted(["mystery stew", "broken"] + [f"food {i}" for i in range(6)])
+    assert peak[0] <= 2
+    assert response["stats"]["unique"] == 10 and response["stats"]["searched"] == 8
+    assert response["stats"]["errors"] == 2
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+請求剖析的測試
+
+用法:
+    python -m pytest test_profiling.py
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from app import profiling
+from app.profiling import SamplingProfiler, should_profile, _frame_category
+from app.services.debug_writer import DebugArtifactWriter
+
+
+def _busy_numpy(seconds: float):
+    end = time.perf_counter() + seconds
+    matrix = np.random.rand(200, 200)
+    while time.perf_counter() < end:
+        matrix = np.linalg.inv(matrix @ matrix.T + np.eye(200))
+
+
+def test_sampling_profiler_attributes_numpy_time():
+    """測試取樣剖析會記錄目前執行緒的堆疊並歸類到 numpy"""
+    profiler = SamplingProfiler(interval=0.002)
+    profiler.start()
+    _busy_numpy(0.3)
+    profiler.stop()
+
+    summary = profiler.summary()
+    assert summary["samples"] > 10
+    assert summary["categories"].get("numpy", 0) > 0
+    assert "_busy_numpy" in profiler.collapsed()
+
+
+def test_frame_category():
+    """測試依檔案路徑歸類函式庫"""
+    assert _frame_category("/venv/lib/python3.11/site-packages/torch/nn/modules/conv.py") == "model"
+    assert _frame_category("/venv/lib/python3.11/site-packages/numpy/linalg/linalg.py") == "numpy"
+    assert _frame_category("/venv/lib/python3.11/site-packages/PIL/Image.py") == "io"
+    assert _frame_category("/root/package/app/services/ai_service.py") is None
+
+
+def test_should_profile_requires_flag():
+    """測試未帶旗標時不啟用剖析"""
+    assert should_profile(None, False) is False
+
+
+def test_profiled_v2_analysis_samples_threadpool_worker(monkeypatch, tmp_path):
+    """測試剖析的 v2 分析在 threadpool 中執行並取樣該執行緒，且與一般分析一樣記錄排程延遲"""
+    from app.routers import ai_router_v2
+
+    threads = []
+
+    def fake_analyze(**kwargs):
+        threads.append(threading.get_ident())
+        _busy_numpy(0.2)
+        return {"pipeline": "full", "detected_foods": []}
+
+    writer = DebugArtifactWriter(output_dir=str(tmp_path))
+    latencies = []
+    monkeypatch.setattr(profiling, "get_debug_writer", lambda: writer)
+    monkeypatch.setattr(ai_router_v2, "analyze_food_image_v2", fake_analyze)
+    monkeypatch.setattr(ai_router_v2, "get_inference_pool", lambda: None)
+    monkeypatch.setattr(ai_router_v2.scheduler, "record_latency", latencies.append)
+
+    result, profile_dir = asyncio.run(
+        ai_router_v2._analyze(b"image", None, False, selected_config="balanced", profile=True)
+    )
+    writer.flush()
+
+    assert threads and threads[0] != threading.get_ident()
+    assert result["model_info"]["selected_config"] == "balanced"
+    assert len(latencies) == 1
+    with open(os.path.join(profile_dir, "profile_summary.json")) as f:
+        assert json.load(f)["samples"] > 10
+    with open(os.path.join(profile_dir, "profile_stacks.collapsed")) as f:
+        assert "fake_analyze" in f.read()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+合併進行中相同請求（single-flight）的測試
+
+用法:
+    python -m pytest test_singleflight.py
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.metrics import SINGLEFLIGHT_CALLS
+from app.singleflight import SingleFlight, content_key
+
+
+def test_threads_share_one_call():
+    """測試並行的相同鍵只執行一次，不同的鍵各自執行"""
+    flight = SingleFlight("test_sync")
+    calls = []
+    started = threading.Event()
+
+    def compute(name):
+        calls.append(name)
+        started.set()
+        time.sleep(0.1)
+        return {"food_name": name}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        leader = executor.submit(flight.do, "rice", compute, "rice")
+        started.wait()
+        followers = [executor.submit(flight.do, "rice", compute, "rice") for _ in range(5)]
+        other = executor.submit(flight.do, "noodles", compute, "noodles")
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert other.result() == {"food_name": "noodles"}
+    assert sorted(calls) == ["noodles", "rice"]
+    assert all(result == {"food_name": "rice"} for result in results)
+    assert SINGLEFLIGHT_CALLS.get(group="test_sync", role="follower") == 5
+    assert SINGLEFLIGHT_CALLS.get(group="test_sync", role="leader") == 2
+    assert flight.in_flight() == 0
+
+    # 完成後鍵即釋放，之後的呼叫重新計算
+    flight.do("rice", compute, "rice")
+    assert calls.count("rice") == 2
+
+
+def test_errors_propagate_to_followers():
+    """測試計算失敗時所有等待者都收到例外"""
+    flight = SingleFlight("test_sync_error")
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("USDA 無回應")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flight.do, "x", fail)
+        started.wait()
+        follower = executor.submit(flight.do, "x", fail)
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+
+def test_async_coalescing_survives_cancellation():
+    """測試非同步版合併相同請求，且發起的請求被取消時其他等待者仍取得結果"""
+    flight = SingleFlight("test_async")
+    runs = []
+
+    async def analyze():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"total_calories": 500}
+
+    async def main():
+        key = content_key(b"image-bytes", {"detection": "yolov8n"}, False)
+        first = asyncio.ensure_future(flight.do_async(key, analyze))
+        await asyncio.sleep(0)
+        others = [asyncio.ensure_future(flight.do_async(key, analyze)) for _ in range(3)]
+        await asyncio.sleep(0)
+        first.cancel()
+        results = await asyncio.gather(*others)
+        return results, first.cancelled()
+
+    results, cancelled = asyncio.run(main())
+    assert cancelled
+    assert results == [{"total_calories": 500}] * 3
+    assert runs == [1]
+    assert flight.in_flight() == 0
+
+
+def test_content_key():
+    """測試鍵由內容雜湊與參數組成，配置的鍵順序不影響結果"""
+    assert content_key(b"a", {"x": 1, "y": 2}) == content_key(b"a", {"y": 2, "x": 1})
+    assert content_key(b"a", {"x": 1}) != content_key(b"b", {"x": 1})
+    assert content_key(b"a", None, True) != content_key(b"a", None, False)